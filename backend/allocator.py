@@ -0,0 +1,171 @@
+import random
+import threading
+from array import array
+from collections import Counter
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from .extensions import db
+from .models import ParkingLot, ParkingSpot
+
+
+class LotFreeList:
+    """Array-backed set of free spot ids with O(1) add, discard and random pop."""
+    __slots__ = ('_ids', '_index')
+
+    def __init__(self, spot_ids=()):
+        self._ids = array('q', spot_ids)
+        self._index = {spot_id: i for i, spot_id in enumerate(self._ids)}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, spot_id):
+        return spot_id in self._index
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def add(self, spot_id):
+        if spot_id not in self._index:
+            self._index[spot_id] = len(self._ids)
+            self._ids.append(spot_id)
+
+    def discard(self, spot_id):
+        i = self._index.pop(spot_id, None)
+        if i is None:
+            return
+        last = self._ids.pop()
+        if last != spot_id:
+            # Move the tail into the hole so the array stays dense
+            self._ids[i] = last
+            self._index[last] = i
+
+    def pop_random(self):
+        if not self._ids:
+            return None
+        spot_id = self._ids[random.randrange(len(self._ids))]
+        self.discard(spot_id)
+        return spot_id
+
+
+class _AllocatorState:
+    def __init__(self):
+        self.lots = {}
+        self.lock = threading.Lock()
+        self.ready = False
+        self.stats = Counter()
+
+
+class SpotAllocator:
+    """
+    Per-process cache of the free spots of every lot. It only hints which spot
+    to claim: parking_spots.status stays the source of truth, every claim is
+    still a conditional UPDATE, and callers fall back to the SQL path when the
+    allocator is empty, not ready or out of step with the database.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['spot_allocator'] = _AllocatorState()
+        if not app.config.get('SPOT_ALLOCATOR_ENABLED', True):
+            return
+        with app.app_context():
+            try:
+                self.rebuild()
+            except SQLAlchemyError as e:
+                # Missing tables or an old schema: stay on the SQL path until rebuilt
+                db.session.rollback()
+                app.logger.warning("Spot allocator not loaded, using SQL path: %s", e)
+
+    @property
+    def _state(self):
+        return current_app.extensions['spot_allocator']
+
+    @property
+    def ready(self):
+        return self._state.ready
+
+    @property
+    def stats(self):
+        return dict(self._state.stats)
+
+    def count(self, stat):
+        self._state.stats[stat] += 1
+
+    def _load(self, lot_id=None):
+        query = db.session.query(ParkingSpot.lot_id, ParkingSpot.id)\
+            .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)\
+            .filter(ParkingSpot.status == 'A', ParkingLot.is_active.is_(True))
+        if lot_id is not None:
+            query = query.filter(ParkingSpot.lot_id == lot_id)
+        free = {}
+        for spot_lot_id, spot_id in query.order_by(ParkingSpot.lot_id, ParkingSpot.id):
+            free.setdefault(spot_lot_id, []).append(spot_id)
+        return free
+
+    def rebuild(self, lot_id=None):
+        """Reload the free sets from parking_spots (all lots, or a single lot)."""
+        state = self._state
+        free = self._load(lot_id)
+        with state.lock:
+            if lot_id is None:
+                state.lots = {lid: LotFreeList(ids) for lid, ids in free.items()}
+                state.ready = True
+            else:
+                state.lots[lot_id] = LotFreeList(free.get(lot_id, ()))
+        self.count('rebuilds')
+
+    def allocate(self, lot_id):
+        """Take a random free spot id of the lot, or None if none is known."""
+        state = self._state
+        if not state.ready:
+            return None
+        with state.lock:
+            free = state.lots.get(lot_id)
+            return free.pop_random() if free else None
+
+    def free(self, lot_id, spot_id):
+        state = self._state
+        if not state.ready:
+            return
+        with state.lock:
+            state.lots.setdefault(lot_id, LotFreeList()).add(spot_id)
+
+    def discard(self, lot_id, spot_id):
+        state = self._state
+        with state.lock:
+            free = state.lots.get(lot_id)
+            if free is not None:
+                free.discard(spot_id)
+
+    def drop_lot(self, lot_id):
+        state = self._state
+        with state.lock:
+            state.lots.pop(lot_id, None)
+
+    def check(self):
+        """
+        Compare the free sets with parking_spots.status. Returns a dict of
+        lot_id -> {"missing": [...], "stale": [...]}, where "missing" spots are
+        free in the database but unknown here and "stale" ones are no longer free.
+        """
+        state = self._state
+        actual = self._load()
+        with state.lock:
+            known = {lot_id: set(free) for lot_id, free in state.lots.items()}
+        mismatches = {}
+        for lot_id in set(actual) | set(known):
+            db_free = set(actual.get(lot_id, ()))
+            cached = known.get(lot_id, set())
+            if db_free != cached:
+                mismatches[lot_id] = {
+                    "missing": sorted(db_free - cached),
+                    "stale": sorted(cached - db_free)
+                }
+        return mismatches
+
+
+spot_allocator = SpotAllocator()
@@ -3,16 +3,54 @@ from .extensions import db, jwt, cache, mail, make_celery
 from .config import Config
 import os
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
 
+    # Serializer behind jsonify, selected by JSON_PROVIDER
+    from .json_provider import init_json_provider
+    init_json_provider(app)
+
+    # Pool sizing and per-connection PRAGMAs for the selected SQLITE_PROFILE
+    from .sqlite_profile import configure_sqlite_profile, install_sqlite_pragmas
+    sqlite_profile = configure_sqlite_profile(app)
     db.init_app(app)
+    if sqlite_profile:
+        install_sqlite_pragmas(app, sqlite_profile)
+
+    # Separate engine for the statements of @read_only views and tasks
+    from .routing import read_routing
+    read_routing.init_app(app)
+
+    # Latency and SQL statement accounting per endpoint, on both engines
+    from .metrics import request_metrics
+    request_metrics.init_app(app)
+
+    # cProfile + SQL trace of requests flagged by an admin, or sampled
+    from .profiling import request_profiler
+    request_profiler.init_app(app)
+
     jwt.init_app(app)
+
+    # Bounded pool for the password hashes of logins and registrations
+    from .passwords import password_hasher
+    password_hasher.init_app(app)
+
+    # Blocked users' tokens are rejected by every JWT check until they expire
+    from .revocation import revocations
+    revocations.init_app(app)
     cache.init_app(app)
     
     # Initialize mail
     mail.init_app(app)
+
+    # Load the in-memory free-spot sets from the database
+    from .allocator import spot_allocator
+    spot_allocator.init_app(app)
+
+    # Fan-out of lot availability changes to the live streams
+    from .live import lot_availability
+    lot_availability.init_app(app)
     
     # Register blueprints
     from .routes.admin import admin_bp
@@ -25,6 +63,13 @@ def create_app():
     app.register_blueprint(user_bp)
     app.register_blueprint(common_bp)
 
+    # Tasks run inside this app's context
+    make_celery(app)
+
+    # Maintenance commands (flask --app backend.app <command>)
+    from .commands import register_commands
+    register_commands(app)
+
     # Add static file routes
     @app.route('/')
     def index():
@@ -38,5 +83,25 @@ def create_app():
 
     return app
 
-app = create_app()
-celery = make_celery(app)
+
+def dispose_engines(app):
+    """
+    Drop the pooled connections a forked worker inherited from its parent
+    (gunicorn post_fork with preload_app), leaving them open for the parent.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+        read_engine = app.extensions['read_routing'].engine
+        if read_engine is not None:
+            read_engine.dispose(close=False)
+
+
+def __getattr__(name):
+    # The default app and Celery are built on first use (flask --app backend.app,
+    # celery -A backend.app.celery, run.py), not whenever this module is imported
+    if name in ('app', 'celery'):
+        global app, celery
+        app = create_app()
+        celery = app.extensions['celery']
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,164 @@
+import random
+from datetime import datetime
+from sqlalchemy import select, update
+from .extensions import db
+from .allocator import spot_allocator
+from .models import ParkingLot, ParkingSpot, Reservation, DashboardSnapshot, UserMonthlyStats, LotMonthlyStats
+from .rollups import bump
+
+# How many times a request re-picks a spot after losing it to a concurrent claim
+MAX_CLAIM_ATTEMPTS = 5
+
+
+class SpotClaimConflict(Exception):
+    """Raised when every claim attempt lost its spot to a concurrent request."""
+
+
+def _pick_free_spot(lot_id):
+    """Pick a random free spot of the lot so parallel claims don't all chase the lowest id."""
+    available = db.session.query(ParkingLot.available_spots).filter_by(id=lot_id, is_active=True).scalar()
+    if not available:
+        return None
+
+    free_spots = db.session.query(ParkingSpot.id).filter_by(
+        lot_id=lot_id, status='A'
+    ).order_by(ParkingSpot.id)
+    spot_id = free_spots.offset(random.randrange(available)).limit(1).scalar()
+    if spot_id is None:
+        # The counter ran ahead of the spots table; take the first free one instead
+        spot_id = free_spots.limit(1).scalar()
+    return spot_id
+
+
+def _try_claim(lot_id, spot_id):
+    """
+    Conditionally mark a spot occupied; False if another request got there
+    first or the lot has been queued for deletion in the meantime.
+    """
+    lot_is_active = select(ParkingLot.id).where(
+        ParkingLot.id == lot_id, ParkingLot.is_active.is_(True)
+    ).exists()
+    claimed = db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == spot_id, ParkingSpot.status == 'A', lot_is_active)
+        .values(status='O')
+    ).rowcount
+    if claimed:
+        ParkingLot.adjust_counters(lot_id, available=-1, occupied=1)
+    return bool(claimed)
+
+
+def _claim_from_allocator(lot_id):
+    """Claim a spot handed out by the in-memory allocator, or None if it had no usable one."""
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        spot_id = spot_allocator.allocate(lot_id)
+        if spot_id is None:
+            return None
+        try:
+            claimed = _try_claim(lot_id, spot_id)
+        except Exception:
+            # The claim never happened; the spot is still free
+            spot_allocator.free(lot_id, spot_id)
+            raise
+        if claimed:
+            spot_allocator.count('hits')
+            return spot_id
+        # Taken by another process; the allocator has already dropped it
+        spot_allocator.count('stale')
+    return None
+
+
+def claim_spot(lot_id):
+    """
+    Mark one free spot of the lot as occupied and return its id, or None when
+    the lot is full. The claim is a single conditional UPDATE, so of several
+    requests racing for the same spot exactly one wins; the losers re-pick.
+    Spots come from the in-memory allocator when it has one, otherwise from
+    parking_spots directly. Must be followed by a commit of the caller's
+    transaction.
+    """
+    spot_id = _claim_from_allocator(lot_id)
+    if spot_id is not None:
+        return spot_id
+
+    spot_allocator.count('fallbacks')
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        spot_id = _pick_free_spot(lot_id)
+        if spot_id is None:
+            return None
+        if _try_claim(lot_id, spot_id):
+            if spot_allocator.ready:
+                # The database had a free spot the allocator didn't know about
+                spot_allocator.rebuild(lot_id)
+            return spot_id
+
+    raise SpotClaimConflict(f"Could not claim a spot in lot {lot_id} after {MAX_CLAIM_ATTEMPTS} attempts")
+
+
+def release_claim(lot_id, spot_id):
+    """
+    Roll back a transaction holding a claimed spot and hand the spot back to
+    the allocator, which gave it out before the claim was committed.
+    """
+    db.session.rollback()
+    spot_allocator.free(lot_id, spot_id)
+
+
+def open_reservation(user_id, lot_id):
+    """
+    Claim a spot in the lot for the user and add the reservation. Returns the
+    new Reservation, or None when the lot is full. Must be followed by a
+    commit; if that fails, call release_claim(lot_id, reservation.spot_id).
+    """
+    spot_id = claim_spot(lot_id)
+    if spot_id is None:
+        return None
+
+    try:
+        now = datetime.utcnow()
+        reservation = Reservation(user_id=user_id, spot_id=spot_id, parking_timestamp=now)
+        db.session.add(reservation)
+        ParkingLot.adjust_counters(lot_id, reservations=1)
+        DashboardSnapshot.adjust(reservations=1)
+        bump(UserMonthlyStats, {'user_id': user_id, 'year': now.year, 'month': now.month},
+             reservation_count=1)
+        occupied_now = select(ParkingLot.occupied_spots).where(ParkingLot.id == lot_id).scalar_subquery()
+        bump(LotMonthlyStats, {'lot_id': lot_id, 'year': now.year, 'month': now.month},
+             maximums={'peak_occupied': occupied_now}, reservation_count=1)
+    except Exception:
+        release_claim(lot_id, spot_id)
+        raise
+    return reservation
+
+
+def close_reservation(res):
+    """
+    Stamp the leaving time of an active reservation, bill it and free its
+    spot. Returns False if a concurrent request already closed it. Must be
+    followed by a commit.
+    """
+    now = datetime.utcnow()
+    closed = db.session.execute(
+        update(Reservation)
+        .where(Reservation.id == res.id, Reservation.leaving_timestamp.is_(None))
+        .values(leaving_timestamp=now)
+    ).rowcount
+    if not closed:
+        return False
+
+    res.leaving_timestamp = now
+    res.spot.status = 'A'
+    ParkingLot.adjust_counters(res.spot.lot_id, available=1, occupied=-1)
+
+    duration_hours = (res.leaving_timestamp - res.parking_timestamp).total_seconds() / 3600
+    rate = res.spot.lot.price_per_hour
+
+    # Minimum billing: 1 hour, then charge for actual time if more than 1 hour
+    billable_hours = max(1.0, duration_hours)
+    res.parking_cost = round(billable_hours * rate, 2)
+    DashboardSnapshot.adjust(revenue=res.parking_cost)
+    bump(UserMonthlyStats, {'user_id': res.user_id, 'year': now.year, 'month': now.month},
+         completed_count=1, total_spent=res.parking_cost)
+    bump(LotMonthlyStats, {'lot_id': res.spot.lot_id, 'year': now.year, 'month': now.month},
+         completed_count=1, revenue=res.parking_cost)
+    return True
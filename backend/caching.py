@@ -0,0 +1,113 @@
+import hashlib
+from collections import Counter
+from functools import wraps
+from uuid import uuid4
+from flask import current_app, request
+from .extensions import cache
+
+# Cache namespaces. A cached response records the version token of every
+# namespace it was built from; bumping a namespace orphans all such entries.
+LOT_LIST = 'lots'                       # lot names, prices and sizes
+LOT_AVAILABILITY = 'lots:availability'  # per-lot free spot counts
+USER_LIST = 'users'
+DASHBOARD = 'dashboard'
+
+
+def lot_ns(lot_id):
+    return f'lot:{lot_id}'
+
+
+def user_ns(user_id):
+    return f'user:{user_id}'
+
+
+# Per-process hit/miss counters, keyed by endpoint
+cache_stats = Counter()
+
+
+def _version_key(namespace):
+    return f'ns-version:{namespace}'
+
+
+def _versions(namespaces):
+    keys = [_version_key(ns) for ns in namespaces]
+    versions = list(cache.get_many(*keys))
+    for i, version in enumerate(versions):
+        if version is None:
+            versions[i] = uuid4().hex
+            cache.set(keys[i], versions[i], timeout=0)
+    return versions
+
+
+def invalidate(*namespaces):
+    """Drop every cached response built from any of the given namespaces."""
+    try:
+        # Fresh tokens rather than deletes: some backends stop delete_many at the first missing key
+        cache.set_many({_version_key(ns): uuid4().hex for ns in namespaces}, timeout=0)
+    except Exception as e:
+        cache_stats['invalidate_errors'] += 1
+        current_app.logger.warning("Cache invalidation failed for %s: %s", namespaces, e)
+
+
+def _etag(key):
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _conditional(response, tag):
+    """Tag a response and make clients revalidate it on every use."""
+    response.set_etag(tag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_view(namespaces, timeout, etag=False):
+    """
+    Cache the JSON body of a successful view response under an explicit key.
+    `namespaces` is a callable returning the namespaces the response depends
+    on; the key combines the request path, query string and their versions.
+
+    With etag=True the response also carries an ETag derived from that key,
+    and a matching If-None-Match is answered with 304 before the cache or
+    the view is touched. Only use it on views whose body is fully determined
+    by the key (nothing time-dependent).
+    """
+    def wrapper_fn(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            endpoint = request.endpoint
+            try:
+                versions = _versions(namespaces())
+                key = 'view:{}?{}|{}'.format(
+                    request.path,
+                    '&'.join(sorted(f'{k}={v}' for k, v in request.args.items(multi=True))),
+                    ':'.join(versions)
+                )
+                tag = _etag(key) if etag else None
+                if tag and request.if_none_match.contains_weak(tag):
+                    cache_stats[f'{endpoint}.not_modified'] += 1
+                    return _conditional(current_app.response_class(status=304), tag)
+                body = cache.get(key)
+            except Exception as e:
+                cache_stats[f'{endpoint}.errors'] += 1
+                current_app.logger.warning("Cache lookup failed for %s: %s", endpoint, e)
+                return fn(*args, **kwargs)
+
+            if body is not None:
+                cache_stats[f'{endpoint}.hits'] += 1
+                response = current_app.response_class(body, mimetype='application/json')
+                return _conditional(response, tag) if tag else response
+
+            cache_stats[f'{endpoint}.misses'] += 1
+            response = current_app.make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                try:
+                    cache.set(key, response.get_data(), timeout=timeout)
+                except Exception as e:
+                    cache_stats[f'{endpoint}.errors'] += 1
+                    current_app.logger.warning("Cache store failed for %s: %s", endpoint, e)
+                if tag:
+                    _conditional(response, tag)
+            return response
+        return decorator
+    return wrapper_fn
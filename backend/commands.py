@@ -0,0 +1,223 @@
+import click
+from datetime import datetime
+from flask.cli import with_appcontext
+from sqlalchemy import extract, func, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+from .extensions import db
+from .models import User, ParkingLot, ParkingSpot, Reservation, DashboardSnapshot, UserMonthlyStats, LotMonthlyStats
+
+
+def rebuild_lot_counters():
+    """Recompute the per-lot spot and reservation counters from parking_spots and reservations."""
+    def spot_count(status):
+        return select(func.count(ParkingSpot.id)).where(
+            ParkingSpot.lot_id == ParkingLot.id,
+            ParkingSpot.status == status
+        ).scalar_subquery()
+
+    reservation_count = select(func.count(Reservation.id)).join(
+        ParkingSpot, Reservation.spot_id == ParkingSpot.id
+    ).where(ParkingSpot.lot_id == ParkingLot.id).scalar_subquery()
+
+    result = db.session.execute(
+        update(ParkingLot).values(
+            available_spots=spot_count('A'),
+            occupied_spots=spot_count('O'),
+            total_reservations=reservation_count
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def rebuild_dashboard_snapshot():
+    """Recompute the dashboard_snapshot row from users and reservations."""
+    snapshot = db.session.get(DashboardSnapshot, 1) or DashboardSnapshot(id=1)
+    snapshot.total_users = User.query.count()
+    snapshot.total_reservations = Reservation.query.count()
+    snapshot.total_revenue = float(db.session.query(
+        func.coalesce(func.sum(Reservation.parking_cost), 0)
+    ).filter(Reservation.leaving_timestamp.isnot(None)).scalar())
+    snapshot.updated_at = datetime.utcnow()
+    db.session.add(snapshot)
+    db.session.commit()
+    return snapshot
+
+
+def backfill_user_rollups():
+    """Rebuild user_monthly_stats from the reservations table."""
+    started_year = extract('year', Reservation.parking_timestamp)
+    started_month = extract('month', Reservation.parking_timestamp)
+    left_year = extract('year', Reservation.leaving_timestamp)
+    left_month = extract('month', Reservation.leaving_timestamp)
+
+    rows = {}
+    started = db.session.query(
+        Reservation.user_id, started_year, started_month, func.count(Reservation.id)
+    ).group_by(Reservation.user_id, started_year, started_month)
+    for user_id, year, month, count in started:
+        rows.setdefault((user_id, int(year), int(month)), {})['reservation_count'] = count
+
+    completed = db.session.query(
+        Reservation.user_id, left_year, left_month,
+        func.count(Reservation.id), func.coalesce(func.sum(Reservation.parking_cost), 0)
+    ).filter(Reservation.leaving_timestamp.isnot(None))\
+     .group_by(Reservation.user_id, left_year, left_month)
+    for user_id, year, month, count, spent in completed:
+        rows.setdefault((user_id, int(year), int(month)), {}).update(
+            completed_count=count, total_spent=float(spent)
+        )
+
+    UserMonthlyStats.query.delete()
+    db.session.bulk_insert_mappings(UserMonthlyStats, [
+        {
+            'user_id': user_id, 'year': year, 'month': month,
+            'reservation_count': values.get('reservation_count', 0),
+            'completed_count': values.get('completed_count', 0),
+            'total_spent': values.get('total_spent', 0.0)
+        }
+        for (user_id, year, month), values in rows.items()
+    ])
+    db.session.commit()
+    return len(rows)
+
+
+def _lot_peaks():
+    """
+    Replay each lot's reservations in time order and return
+    {(lot_id, year, month): peak occupied spots seen when a reservation opened}.
+    """
+    peaks = {}
+
+    def replay(lot_id, events):
+        # Releases sort before arrivals at the same instant
+        events.sort()
+        occupied = 0
+        for when, delta in events:
+            occupied += delta
+            if delta > 0:
+                key = (lot_id, when.year, when.month)
+                peaks[key] = max(peaks.get(key, 0), occupied)
+
+    rows = db.session.query(
+        ParkingSpot.lot_id, Reservation.parking_timestamp, Reservation.leaving_timestamp
+    ).join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+     .order_by(ParkingSpot.lot_id).yield_per(5000)
+    current_lot, events = None, []
+    for lot_id, parked, left in rows:
+        if lot_id != current_lot:
+            if events:
+                replay(current_lot, events)
+            current_lot, events = lot_id, []
+        events.append((parked, 1))
+        if left is not None:
+            events.append((left, -1))
+    if events:
+        replay(current_lot, events)
+    return peaks
+
+
+def backfill_lot_rollups():
+    """Rebuild lot_monthly_stats from the reservations table."""
+    started_year = extract('year', Reservation.parking_timestamp)
+    started_month = extract('month', Reservation.parking_timestamp)
+    left_year = extract('year', Reservation.leaving_timestamp)
+    left_month = extract('month', Reservation.leaving_timestamp)
+
+    rows = {}
+    started = db.session.query(
+        ParkingSpot.lot_id, started_year, started_month, func.count(Reservation.id)
+    ).join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+     .group_by(ParkingSpot.lot_id, started_year, started_month)
+    for lot_id, year, month, count in started:
+        rows.setdefault((lot_id, int(year), int(month)), {})['reservation_count'] = count
+
+    completed = db.session.query(
+        ParkingSpot.lot_id, left_year, left_month,
+        func.count(Reservation.id), func.coalesce(func.sum(Reservation.parking_cost), 0)
+    ).join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+     .filter(Reservation.leaving_timestamp.isnot(None))\
+     .group_by(ParkingSpot.lot_id, left_year, left_month)
+    for lot_id, year, month, count, revenue in completed:
+        rows.setdefault((lot_id, int(year), int(month)), {}).update(
+            completed_count=count, revenue=float(revenue)
+        )
+
+    for key, peak in _lot_peaks().items():
+        rows.setdefault(key, {})['peak_occupied'] = peak
+
+    LotMonthlyStats.query.delete()
+    db.session.bulk_insert_mappings(LotMonthlyStats, [
+        {
+            'lot_id': lot_id, 'year': year, 'month': month,
+            'reservation_count': values.get('reservation_count', 0),
+            'completed_count': values.get('completed_count', 0),
+            'revenue': values.get('revenue', 0.0),
+            'peak_occupied': values.get('peak_occupied', 0)
+        }
+        for (lot_id, year, month), values in rows.items()
+    ])
+    db.session.commit()
+    return len(rows)
+
+
+def upgrade_schema():
+    """Create missing tables, columns and indexes without touching existing data."""
+    engine = db.engine
+    db.create_all()
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+                added.append(f'{table.name}.{column.name}')
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    return added
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Bring an existing parkbuddy.db up to date with the models."""
+    added = upgrade_schema()
+    for name in added:
+        click.echo(f'Added column {name}')
+    rebuild_lot_counters()
+    rebuild_dashboard_snapshot()
+    backfill_user_rollups()
+    backfill_lot_rollups()
+    click.echo('Database schema is up to date.')
+
+
+@click.command('rebuild-counters')
+@with_appcontext
+def rebuild_counters_command():
+    """Reconcile the per-lot counters and the dashboard snapshot with the tables."""
+    lots = rebuild_lot_counters()
+    click.echo(f'Rebuilt spot counters for {lots} lot(s).')
+    snapshot = rebuild_dashboard_snapshot()
+    click.echo(f'Rebuilt dashboard snapshot: {snapshot.total_users} user(s), '
+               f'{snapshot.total_reservations} reservation(s), revenue {snapshot.total_revenue:.2f}.')
+
+
+@click.command('backfill-rollups')
+@with_appcontext
+def backfill_rollups_command():
+    """Rebuild the monthly rollup tables from reservations."""
+    rows = backfill_user_rollups()
+    click.echo(f'Rebuilt {rows} user monthly rollup row(s).')
+    rows = backfill_lot_rollups()
+    click.echo(f'Rebuilt {rows} lot monthly rollup row(s).')
+
+
+def register_commands(app):
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(rebuild_counters_command)
+    app.cli.add_command(backfill_rollups_command)
@@ -2,18 +2,112 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = \
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, '..', 'parkbuddy.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.environ.get('SECRET_KEY', 'SECRET1')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'SECRET2')  
     JWT_ACCESS_TOKEN_EXPIRES = 3600
+
+    # Password hashing (backend/passwords.py). The method is a werkzeug method
+    # string; stored hashes made with a weaker one are upgraded at login
+    # (stronger ones, such as scrypt hashes under a pbkdf2 setting, are kept).
+    # Hashes run on PASSWORD_HASH_WORKERS threads per process (0: on the
+    # request thread) and at most PASSWORD_HASH_QUEUE more wait before
+    # logins and registrations are answered with 503.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+
+    # SQLite connection tuning applied by backend/sqlite_profile.py. 'default'
+    # leaves SQLite's settings alone; 'production' switches to WAL so readers
+    # don't block the writer. WAL is persistent: it stays on for the file, so
+    # it is opt-in (wsgi.py selects it for production serving).
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+    SQLITE_PROFILES = {
+        'default': {},
+        'production': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 10000)),
+                'cache_size': -65536,        # KiB when negative: 64 MiB per connection
+                'mmap_size': 268435456,      # 256 MiB
+                'temp_store': 'MEMORY',
+            },
+            'engine_options': {
+                'pool_size': int(os.environ.get('SQLITE_POOL_SIZE', 10)),
+                'max_overflow': 20,
+                'pool_timeout': 30,
+            },
+        },
+    }
+
+    # Views and tasks marked @read_only (backend/routing.py) use a separate read
+    # engine: this URI when set (a replica, say), otherwise read-only
+    # connections to the same SQLite file. Other databases without a read
+    # URI stay on the primary.
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('SQLALCHEMY_READ_DATABASE_URI')
+    READ_ROUTING_ENABLED = os.environ.get('READ_ROUTING_ENABLED', 'true').lower() in ['true', '1', 't']
+
+    # Serializer behind jsonify: 'orjson' (falls back to 'default' when orjson
+    # isn't installed), 'default', or a flask.json.provider subclass
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
+
+    # Per-endpoint latency, SQL and response size accounting (backend/metrics.py),
+    # served to admins at /api/admin/metrics. A request running more SQL
+    # statements than METRICS_QUERY_WARN_THRESHOLD is logged (0 turns that off).
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', '1', 't']
+    METRICS_QUERY_WARN_THRESHOLD = int(os.environ.get('METRICS_QUERY_WARN_THRESHOLD', 0))
+
+    # On-demand profiling (backend/profiling.py): a request whose X-Profile header
+    # or ?profile= is an admin token runs under cProfile, and so does one in
+    # every PROFILE_SAMPLE_RATE requests (0 turns sampling off). Runs land in
+    # PROFILE_DIR, which keeps the newest PROFILE_MAX_FILES of them.
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(basedir, '..', 'profiles'))
+    PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+    PROFILE_MAX_STATEMENTS = int(os.environ.get('PROFILE_MAX_STATEMENTS', 1000))  # SQL kept per run
+
+    # Keep per-lot free-spot sets in memory to hand out spots without a scan.
+    # The sets are per process; gunicorn.conf.py turns them off for several workers.
+    SPOT_ALLOCATOR_ENABLED = os.environ.get('SPOT_ALLOCATOR_ENABLED', 'true').lower() in ['true', '1', 't']
+
+    # Serve dashboard totals from the dashboard_snapshot row instead of aggregating reservations
+    DASHBOARD_SNAPSHOT_ENABLED = os.environ.get('DASHBOARD_SNAPSHOT_ENABLED', 'true').lower() in ['true', '1', 't']
+
+    # CSV exports are written here as .csv.gz and emailed as signed download links
+    EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(basedir, '..', 'exports'))
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    EXPORT_LINK_MAX_AGE = int(os.environ.get('EXPORT_LINK_MAX_AGE', 7 * 24 * 3600))
+    PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', 'http://localhost:5000')
+
+    # Rows deleted per transaction by the background lot deletion task
+    LOT_DELETE_CHUNK_SIZE = int(os.environ.get('LOT_DELETE_CHUNK_SIZE', 500))
     
     # Redis Configuration
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
-    CACHE_TYPE = 'RedisCache'
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'RedisCache')
     CACHE_REDIS_URL = REDIS_URL  # Flask-Caching
     
+    # Live lot availability (GET /api/lots/availability/stream): 'redis' fans
+    # changes out across processes over REDIS_URL, 'local' within one process
+    AVAILABILITY_BROKER = os.environ.get('AVAILABILITY_BROKER', 'redis')
+    AVAILABILITY_HEARTBEAT = int(os.environ.get('AVAILABILITY_HEARTBEAT', 15))  # seconds between keepalives
+    # Every open stream holds a request thread for as long as it lasts, so a
+    # process serves at most AVAILABILITY_MAX_STREAMS of them; past that the
+    # stream answers 503 and pages poll the lot list every
+    # AVAILABILITY_RETRY_AFTER seconds before trying the stream again
+    AVAILABILITY_MAX_STREAMS = int(os.environ.get('AVAILABILITY_MAX_STREAMS', 4))
+    AVAILABILITY_RETRY_AFTER = int(os.environ.get('AVAILABILITY_RETRY_AFTER', 30))
+
+    # Subjects of blocked users, rejected by every JWT check (backend/revocation.py).
+    # 'redis' shares the set across workers, which re-check its version at most
+    # every REVOCATION_CHECK_INTERVAL seconds; 'local' keeps it in one process
+    REVOCATION_BACKEND = os.environ.get('REVOCATION_BACKEND', 'redis')
+    REVOCATION_CHECK_INTERVAL = float(os.environ.get('REVOCATION_CHECK_INTERVAL', 1.0))
+
     # Celery Configuration
     # Flask-Mail config for Mailhog
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
@@ -23,6 +117,8 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME', None)
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD', None)
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'parkbuddy@localhost')
+    # Messages sent per SMTP connection by the notification tasks
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 100))
 
     # Celery Configuration (modern, lowercase)
     CELERY_CONFIG = {
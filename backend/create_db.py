@@ -1,6 +1,6 @@
 from .app import create_app
 from .extensions import db
-from .models import Admin
+from .models import Admin, DashboardSnapshot
 
 app = create_app()
 
@@ -11,5 +11,6 @@ with app.app_context():
     admin = Admin(username='admin')
     admin.set_password('ChangeMe123')  
     db.session.add(admin)
+    db.session.add(DashboardSnapshot(id=1))
     db.session.commit()
     print("🗃  Database and tables created. Admin user seeded.")
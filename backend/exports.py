@@ -0,0 +1,117 @@
+import csv
+import gzip
+import os
+import re
+import time
+from datetime import datetime
+from uuid import uuid4
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from .extensions import db
+from .models import Reservation, ParkingSpot, ParkingLot
+
+# parking_history_<user id>_<UTC timestamp>_<random suffix>.csv.gz; files
+# written before the suffix was added have none and still match
+EXPORT_NAME_RE = re.compile(r'^parking_history_(\d+)_(\d{14})(?:_[0-9a-f]{8})?\.csv\.gz$')
+CSV_HEADER = ['Reservation ID', 'Spot ID', 'Lot Name', 'Parking Time', 'Leaving Time', 'Cost', 'Duration (hours)']
+
+
+def export_dir():
+    path = current_app.config['EXPORT_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def export_owner(filename):
+    """User id encoded in an export file name, or None if the name isn't one of ours."""
+    match = EXPORT_NAME_RE.match(filename)
+    return int(match.group(1)) if match else None
+
+
+def _signer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='csv-export')
+
+
+def export_token(filename):
+    """Signed token that lets an email link download one export without a JWT."""
+    return _signer().dumps(filename)
+
+
+def verify_export_token(token, filename):
+    try:
+        return _signer().loads(token, max_age=current_app.config['EXPORT_LINK_MAX_AGE']) == filename
+    except BadSignature:
+        return False
+
+
+def iter_export_rows(user_id, batch_size):
+    """Yield CSV rows of a user's reservations, fetched in id-ordered batches with the lot name joined in."""
+    last_id = 0
+    while True:
+        batch = db.session.query(
+            Reservation.id,
+            Reservation.spot_id,
+            ParkingLot.prime_location_name,
+            Reservation.parking_timestamp,
+            Reservation.leaving_timestamp,
+            Reservation.parking_cost
+        ).join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+         .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)\
+         .filter(Reservation.user_id == user_id, Reservation.id > last_id)\
+         .order_by(Reservation.id)\
+         .limit(batch_size).all()
+        if not batch:
+            return
+
+        for res in batch:
+            duration = 0
+            if res.leaving_timestamp:
+                duration = (res.leaving_timestamp - res.parking_timestamp).total_seconds() / 3600
+            yield [
+                res.id,
+                res.spot_id,
+                res.prime_location_name,
+                res.parking_timestamp.strftime("%Y-%m-%d %H:%M"),
+                res.leaving_timestamp.strftime("%Y-%m-%d %H:%M") if res.leaving_timestamp else "Active",
+                res.parking_cost or 0,
+                round(duration, 2)
+            ]
+        last_id = batch[-1].id
+        # Drop the batch from the session so memory stays flat
+        db.session.expunge_all()
+
+
+def write_user_export(user_id):
+    """Write the user's history to a gzip-compressed CSV in EXPORT_DIR and return its file name."""
+    directory = export_dir()
+    # The suffix keeps two exports started within the same second apart
+    filename = f"parking_history_{user_id}_{datetime.utcnow():%Y%m%d%H%M%S}_{uuid4().hex[:8]}.csv.gz"
+    path = os.path.join(directory, filename)
+    partial = path + '.part'
+
+    with gzip.open(partial, 'wt', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(CSV_HEADER)
+        for row in iter_export_rows(user_id, current_app.config['EXPORT_BATCH_SIZE']):
+            writer.writerow(row)
+    # Only complete files ever carry the final name
+    os.replace(partial, path)
+
+    prune_exports(user_id, keep=filename)
+    return filename
+
+
+def prune_exports(user_id, keep=None):
+    """Delete a user's exports whose download links have expired."""
+    cutoff = time.time() - current_app.config['EXPORT_LINK_MAX_AGE']
+    directory = export_dir()
+    for name in os.listdir(directory):
+        if name != keep and export_owner(name) == user_id:
+            path = os.path.join(directory, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+
+def list_exports(user_id):
+    directory = export_dir()
+    return sorted((name for name in os.listdir(directory) if export_owner(name) == user_id), reverse=True)
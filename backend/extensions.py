@@ -1,24 +1,34 @@
+from flask import has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_caching import Cache
 from flask_mail import Mail
-from celery import Celery
+from celery import Celery, Task
+from .routing import RoutingSession
 
-db  = SQLAlchemy()
+db  = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 cache = Cache()
 mail = Mail()
 
-def make_celery(app):
-    celery = Celery(
-        app.import_name,
-    )
-    celery.conf.update(app.config["CELERY_CONFIG"])
 
-    class ContextTask(celery.Task):
-        def __call__(self, *args, **kwargs):
-            with app.app_context():
-                return self.run(*args, **kwargs)
+class ContextTask(Task):
+    """Runs each task inside the app context of the Flask app bound by make_celery."""
+
+    def __call__(self, *args, **kwargs):
+        flask_app = getattr(self.app, 'flask_app', None)
+        if flask_app is None or has_app_context():
+            return self.run(*args, **kwargs)
+        with flask_app.app_context():
+            return self.run(*args, **kwargs)
+
 
-    celery.Task = ContextTask
+# Tasks register on this instance at import time; make_celery configures it
+# from an app, so importing backend.tasks never builds one
+celery = Celery('backend', task_cls=ContextTask)
+
+def make_celery(app):
+    celery.conf.update(app.config["CELERY_CONFIG"])
+    celery.flask_app = app
+    app.extensions['celery'] = celery
     return celery
@@ -0,0 +1,71 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: without it the app keeps Flask's json module provider
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson. Dates, Decimals and anything else
+    orjson doesn't handle natively go through Flask's default hook, so the
+    output matches DefaultJSONProvider apart from whitespace.
+    """
+
+    def _dumps_bytes(self, obj, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Explicit json.dumps options (cls=, indent=, ...) only the stdlib understands
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._dumps_bytes(obj).decode()
+        except TypeError:
+            # orjson.JSONEncodeError: e.g. integers beyond 64 bits
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        try:
+            body = self._dumps_bytes(obj, indent=indent)
+        except TypeError:
+            return super().response(obj)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+JSON_PROVIDERS = {
+    'default': DefaultJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+
+def init_json_provider(app):
+    """
+    Install the JSON provider named by JSON_PROVIDER (a JSON_PROVIDERS key or
+    a DefaultJSONProvider subclass). 'orjson' falls back to the default
+    provider when orjson isn't installed.
+    """
+    provider = app.config.get('JSON_PROVIDER', 'default')
+    if isinstance(provider, str):
+        if provider == 'orjson' and orjson is None:
+            app.logger.warning("JSON_PROVIDER is 'orjson' but orjson is not installed; using the default provider")
+            provider = 'default'
+        try:
+            provider = JSON_PROVIDERS[provider]
+        except KeyError:
+            raise ValueError(f"Unknown JSON_PROVIDER {provider!r}; expected one of {sorted(JSON_PROVIDERS)}")
+    app.json = provider(app)
+    return app.json
@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from flask import current_app
+from .extensions import db
+from .models import ParkingLot
+
+# Redis channel carrying availability changes between processes
+CHANNEL = 'parkbuddy:lot-availability'
+
+
+class Subscription:
+    """
+    Mailbox of one open stream. Events are keyed by lot and a newer event
+    replaces a pending one, so a slow client holds at most one event per lot
+    instead of an ever-growing queue.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def put(self, key, data):
+        with self._cond:
+            self._pending.pop(key, None)  # re-insert so events keep arrival order
+            self._pending[key] = data
+            self._cond.notify()
+
+    def get(self, timeout):
+        """Pending events (raw JSON strings), waiting up to `timeout` seconds for the first one."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            events, self._pending = list(self._pending.values()), {}
+        return events
+
+
+class LocalBroker:
+    """In-process fan-out: every subscription of this process gets every message."""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def subscribe(self, limit=None):
+        """A new subscription, or None when `limit` subscriptions are already open."""
+        subscription = Subscription()
+        with self._lock:
+            if limit is not None and len(self._subscriptions) >= limit:
+                self.stats['rejected'] += 1
+                return None
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscribers(self):
+        return len(self._subscriptions)
+
+    def publish(self, data):
+        self._deliver(data)
+
+    def _deliver(self, data):
+        event = json.loads(data)
+        key = event.get('lot_id', 'resync')
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(key, data)
+        self.stats['delivered'] += len(subscriptions)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Redis pub/sub between processes. Each process keeps one subscriber
+    connection, read by a daemon thread started with the first stream, and
+    fans its messages out to the local subscriptions. After a lost
+    connection the streams are told to resync, since messages sent in
+    between are gone.
+    """
+
+    def __init__(self, url, logger, channel=CHANNEL):
+        super().__init__()
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._channel = channel
+        self._logger = logger
+        self._listener_pid = None
+
+    def subscribe(self, limit=None):
+        subscription = super().subscribe(limit)
+        if subscription is None:
+            return None
+        with self._lock:
+            # A forked worker inherits the flag but not the thread
+            if self._listener_pid != os.getpid():
+                self._listener_pid = os.getpid()
+                threading.Thread(target=self._listen, name='lot-availability', daemon=True).start()
+        return subscription
+
+    def publish(self, data):
+        self._redis.publish(self._channel, data)
+
+    def _listen(self):
+        lost = False
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                if lost:
+                    self._deliver(json.dumps({'resync': True}))
+                    lost = False
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._deliver(message['data'].decode())
+            except Exception as e:
+                lost = True
+                self.stats['listener_errors'] += 1
+                self._logger.warning("Availability listener lost Redis (%s); reconnecting", e)
+                time.sleep(1.0)
+
+
+def availability_rows(lot_ids=None):
+    """Current spot counts of the given lots (all active lots when None) as event dicts."""
+    query = db.session.query(
+        ParkingLot.id,
+        ParkingLot.is_active,
+        ParkingLot.number_of_spots,
+        ParkingLot.available_spots,
+        ParkingLot.occupied_spots
+    )
+    if lot_ids is None:
+        query = query.filter(ParkingLot.is_active.is_(True))
+    else:
+        query = query.filter(ParkingLot.id.in_(lot_ids))
+    rows = {
+        lot.id: {
+            'lot_id': lot.id,
+            'number_of_spots': lot.number_of_spots,
+            'available_spots': lot.available_spots,
+            'occupied_spots': lot.occupied_spots,
+        } if lot.is_active else {'lot_id': lot.id, 'closed': True}
+        for lot in query.order_by(ParkingLot.id)
+    }
+    # Lots deleted outright are closed as far as the streams are concerned
+    for lot_id in lot_ids or ():
+        rows.setdefault(lot_id, {'lot_id': lot_id, 'closed': True})
+    return list(rows.values())
+
+
+class LotAvailability:
+    """
+    Pushes per-lot spot counts to open availability streams. Call publish()
+    after a commit that changed a lot's counters; AVAILABILITY_BROKER picks
+    'redis' (across processes, on REDIS_URL) or 'local' (this process only).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('AVAILABILITY_BROKER', 'local')
+        if kind == 'redis':
+            broker = RedisBroker(app.config['REDIS_URL'], app.logger)
+        elif kind == 'local':
+            broker = LocalBroker()
+        else:
+            raise ValueError(f"Unknown AVAILABILITY_BROKER {kind!r}; expected 'redis' or 'local'")
+        app.extensions['lot_availability'] = broker
+
+    @property
+    def broker(self):
+        return current_app.extensions['lot_availability']
+
+    def publish(self, *lot_ids):
+        """Send the committed counts of `lot_ids`. Failures are logged, never raised."""
+        broker = self.broker
+        try:
+            for row in availability_rows(lot_ids):
+                broker.publish(current_app.json.dumps(row))
+            broker.stats['published'] += len(lot_ids)
+        except Exception as e:
+            broker.stats['publish_errors'] += 1
+            current_app.logger.warning("Availability publish failed for lots %s: %s", lot_ids, e)
+
+    def snapshot(self):
+        """Counts of every active lot, sent when a stream opens."""
+        return current_app.json.dumps(availability_rows())
+
+
+lot_availability = LotAvailability()
@@ -0,0 +1,108 @@
+import smtplib
+import time
+from flask import current_app
+from flask_mail import BadHeaderError
+from .extensions import mail
+
+# SMTP errors that mean the session is gone; the message is retried on a fresh
+# connection. Every other SMTPException (a subclass of OSError) is about the
+# message itself, and plain OSErrors are socket failures, retried as well.
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+MAX_SEND_ATTEMPTS = 2
+
+
+class DeliveryReport:
+    """Totals for one send_messages() run."""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.reconnects = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        return self.sent / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.sent} sent, {self.failed} failed in {self.batches} batch(es), "
+                f"{self.reconnects} reconnect(s), {self.rate:.1f} msg/s")
+
+
+def _connect():
+    conn = mail.connect()
+    return conn.__enter__()
+
+
+def _close(conn):
+    if conn is None:
+        return
+    try:
+        conn.__exit__(None, None, None)
+    except (smtplib.SMTPException, OSError):
+        # QUIT on a dead session; just drop the socket
+        if conn.host is not None:
+            conn.host.close()
+
+
+def _send_batch(batch, report):
+    logger = current_app.logger
+    conn = None
+    sent = failed = 0
+    started = time.perf_counter()
+    try:
+        for msg in batch:
+            for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+                try:
+                    if conn is None:
+                        conn = _connect()
+                    conn.send(msg)
+                    sent += 1
+                    break
+                except RECONNECT_ERRORS as e:
+                    lost = e
+                except (smtplib.SMTPException, BadHeaderError) as e:
+                    # Refused recipient or malformed message: retrying on a new session won't help
+                    failed += 1
+                    logger.warning("Mail to %s rejected: %s", msg.recipients, e)
+                    break
+                except OSError as e:
+                    # Socket reset, timeout or refused connect
+                    lost = e
+                _close(conn)
+                conn = None
+                report.reconnects += 1
+                if attempt == MAX_SEND_ATTEMPTS:
+                    failed += 1
+                    logger.warning("Mail to %s failed after reconnect: %s", msg.recipients, lost)
+    finally:
+        _close(conn)
+
+    elapsed = time.perf_counter() - started
+    report.batches += 1
+    report.sent += sent
+    report.failed += failed
+    report.seconds += elapsed
+    logger.info("Mail batch %d: %d sent, %d failed in %.2fs (%.1f msg/s)",
+                report.batches, sent, failed, elapsed, sent / elapsed if elapsed else 0.0)
+
+
+def send_messages(messages, batch_size=None):
+    """
+    Deliver an iterable of flask_mail.Message objects, opening one SMTP
+    connection per batch of MAIL_BATCH_SIZE messages instead of one per
+    message. A dropped connection is reopened and the message retried once.
+    Messages are consumed lazily, so a generator keeps memory flat.
+    """
+    batch_size = batch_size or current_app.config.get('MAIL_BATCH_SIZE', 100)
+    report = DeliveryReport()
+    batch = []
+    for msg in messages:
+        batch.append(msg)
+        if len(batch) >= batch_size:
+            _send_batch(batch, report)
+            batch = []
+    if batch:
+        _send_batch(batch, report)
+    return report
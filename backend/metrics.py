@@ -0,0 +1,199 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from .extensions import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense (each bucket counts values <= its bound)."""
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def buckets(self):
+        running = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            running += count
+            yield bound, running
+
+
+class EndpointStats:
+    __slots__ = ('latency', 'statements', 'sql_seconds', 'response_bytes', 'statuses')
+
+    def __init__(self, latency_buckets):
+        self.latency = Histogram(latency_buckets)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.sql_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+
+class _MetricsState:
+    def __init__(self, latency_buckets, query_warn_threshold):
+        self.latency_buckets = latency_buckets
+        self.query_warn_threshold = query_warn_threshold
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+
+class _RequestTally:
+    __slots__ = ('started', 'statements', 'sql_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not has_app_context():
+        return
+    tally = g.get('_request_tally')
+    if tally is not None:
+        tally.statements += 1
+        tally.sql_seconds += time.perf_counter() - context._metrics_started
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetrics:
+    """
+    Per-endpoint request accounting for this worker: a latency histogram,
+    SQL statement counts and time (from cursor events on the primary and
+    read engines), status codes and response bytes. render() writes them
+    in the Prometheus text format. Latency covers the view up to the
+    response object, so for a streamed response (the availability stream)
+    it is the time to the first byte. With METRICS_QUERY_WARN_THRESHOLD set,
+    a request running more statements than that is logged as a warning.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = _MetricsState(
+            tuple(app.config.get('METRICS_LATENCY_BUCKETS', LATENCY_BUCKETS)),
+            app.config.get('METRICS_QUERY_WARN_THRESHOLD', 0)
+        )
+        app.extensions['request_metrics'] = state
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+
+        with app.app_context():
+            engines = [db.engine]
+        read_engine = app.extensions.get('read_routing') and app.extensions['read_routing'].engine
+        if read_engine is not None:
+            engines.append(read_engine)
+        for engine in engines:
+            if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self._start)
+        app.after_request(self._record)
+
+    @staticmethod
+    def _start():
+        g._request_tally = _RequestTally()
+
+    @staticmethod
+    def _record(response):
+        tally = g.pop('_request_tally', None)
+        if tally is None:
+            return response
+        elapsed = time.perf_counter() - tally.started
+        endpoint = request.endpoint or 'unmatched'
+        # Streamed bodies have no length yet; don't buffer them to find out
+        size = response.content_length or 0
+
+        state = current_app.extensions['request_metrics']
+        with state.lock:
+            stats = state.endpoints.get(endpoint)
+            if stats is None:
+                stats = state.endpoints[endpoint] = EndpointStats(state.latency_buckets)
+            stats.latency.observe(elapsed)
+            stats.statements.observe(tally.statements)
+            stats.sql_seconds += tally.sql_seconds
+            stats.response_bytes += size
+            stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+
+        threshold = state.query_warn_threshold
+        if threshold and tally.statements > threshold:
+            current_app.logger.warning(
+                "%s %s ran %d SQL statements (%.1f ms SQL, %.1f ms total)",
+                request.method, request.path, tally.statements,
+                tally.sql_seconds * 1000, elapsed * 1000
+            )
+        return response
+
+    def render(self):
+        """This worker's metrics in the Prometheus text exposition format."""
+        state = current_app.extensions['request_metrics']
+        with state.lock:
+            endpoints = sorted(state.endpoints.items())
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+            def histogram(name, pick):
+                for endpoint, stats in endpoints:
+                    hist = pick(stats)
+                    label = f'endpoint="{_label(endpoint)}"'
+                    for bound, count in hist.buckets():
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{label}}} {_number(hist.total)}')
+                    lines.append(f'{name}_count{{{label}}} {hist.count}')
+
+            family('parkbuddy_request_duration_seconds', 'histogram', 'Time spent producing the response.')
+            histogram('parkbuddy_request_duration_seconds', lambda stats: stats.latency)
+
+            family('parkbuddy_request_sql_statements', 'histogram', 'SQL statements executed per request.')
+            histogram('parkbuddy_request_sql_statements', lambda stats: stats.statements)
+
+            family('parkbuddy_request_sql_seconds_total', 'counter', 'Time spent executing SQL statements.')
+            for endpoint, stats in endpoints:
+                lines.append(f'parkbuddy_request_sql_seconds_total{{endpoint="{_label(endpoint)}"}} '
+                             f'{_number(stats.sql_seconds)}')
+
+            family('parkbuddy_response_bytes_total', 'counter', 'Response body bytes sent (streams excluded).')
+            for endpoint, stats in endpoints:
+                lines.append(f'parkbuddy_response_bytes_total{{endpoint="{_label(endpoint)}"}} '
+                             f'{stats.response_bytes}')
+
+            family('parkbuddy_requests_total', 'counter', 'Requests by endpoint and status code.')
+            for endpoint, stats in endpoints:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'parkbuddy_requests_total{{endpoint="{_label(endpoint)}",status="{status}"}} '
+                                 f'{count}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
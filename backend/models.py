@@ -1,34 +1,37 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from .extensions import db
+from .passwords import password_hasher
 
-class User(db.Model):
+class PasswordMixin:
+    """set_password/check_password of a model with a pwd_hash column."""
+
+    def set_password(self, pw):
+        self.pwd_hash = password_hasher.hash(pw)
+
+    def check_password(self, pw):
+        """Verify `pw`; a hash weaker than PASSWORD_HASH_METHOD is replaced (the caller commits)."""
+        if not password_hasher.verify(self.pwd_hash, pw):
+            return False
+        if password_hasher.needs_rehash(self.pwd_hash):
+            self.pwd_hash = password_hasher.hash(pw)
+        return True
+
+
+class User(PasswordMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    pwd_hash = db.Column(db.String(128), nullable=False)
+    pwd_hash = db.Column(db.String(255), nullable=False)
     full_name= db.Column(db.String(100))
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     reservations = db.relationship('Reservation', back_populates='user')
 
-    def set_password(self, pw):
-        self.pwd_hash = generate_password_hash(pw)
-
-    def check_password(self, pw):
-        return check_password_hash(self.pwd_hash, pw)
-
 
-class Admin(db.Model):
+class Admin(PasswordMixin, db.Model):
     __tablename__ = 'admins'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
-    pwd_hash = db.Column(db.String(128), nullable=False)
-
-    def set_password(self, pw):
-        self.pwd_hash = generate_password_hash(pw)
-    
-    def check_password(self, pw):
-        return check_password_hash(self.pwd_hash, pw)
+    pwd_hash = db.Column(db.String(255), nullable=False)
 
 
 class ParkingLot(db.Model):
@@ -39,11 +42,36 @@ class ParkingLot(db.Model):
     address = db.Column(db.String(200))
     pin_code = db.Column(db.String(20))
     number_of_spots = db.Column(db.Integer, nullable=False)
+    # Denormalised spot counters, kept in step with parking_spots.status by
+    # every write that claims, frees, adds or removes a spot.
+    available_spots = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    occupied_spots = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    total_reservations = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Cleared when the lot is queued for deletion; inactive lots are hidden and can't be booked
+    is_active = db.Column(db.Boolean, default=True, server_default=db.true(), nullable=False)
     spots = db.relationship('ParkingSpot', back_populates='lot', cascade='all, delete-orphan')
 
+    @classmethod
+    def active(cls):
+        """Query over the lots that are open for booking."""
+        return cls.query.filter(cls.is_active.is_(True))
+
+    @classmethod
+    def adjust_counters(cls, lot_id, available=0, occupied=0, reservations=0):
+        """Shift the stored counters of a lot inside the current transaction."""
+        db.session.query(cls).filter_by(id=lot_id).update({
+            cls.available_spots: cls.available_spots + available,
+            cls.occupied_spots: cls.occupied_spots + occupied,
+            cls.total_reservations: cls.total_reservations + reservations,
+        })
+
 
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spots'
+    __table_args__ = (
+        # Free/occupied spots of a lot: claims, counters, the allocator and the spot grid
+        db.Index('ix_parking_spots_lot_status', 'lot_id', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     lot_id  = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), nullable=False)
     status  = db.Column(db.String(1), default='A', nullable=False)
@@ -54,6 +82,20 @@ class ParkingSpot(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        # A user's open reservations
+        db.Index('ix_reservations_user_leaving', 'user_id', 'leaving_timestamp'),
+        # A spot's open reservation (lot details) and its history (spot removal)
+        db.Index('ix_reservations_spot_leaving', 'spot_id', 'leaving_timestamp'),
+        # A user's history, newest first, paged by (parking_timestamp, id)
+        db.Index('ix_reservations_user_parked', 'user_id', 'parking_timestamp', 'id'),
+        # Recent reservations across all users (dashboard)
+        db.Index('ix_reservations_parking_timestamp', 'parking_timestamp'),
+        # Only the open reservations, for jobs that visit all of them (daily reminders)
+        db.Index('ix_reservations_open', 'user_id',
+                 sqlite_where=db.text('leaving_timestamp IS NULL'),
+                 postgresql_where=db.text('leaving_timestamp IS NULL')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -63,3 +105,69 @@ class Reservation(db.Model):
 
     spot = db.relationship('ParkingSpot', back_populates='reservations')
     user = db.relationship('User', back_populates='reservations')
+
+
+class DashboardSnapshot(db.Model):
+    """Single row of running totals behind the admin dashboard."""
+    __tablename__ = 'dashboard_snapshot'
+    id = db.Column(db.Integer, primary_key=True)
+    total_users = db.Column(db.Integer, default=0, nullable=False)
+    total_reservations = db.Column(db.Integer, default=0, nullable=False)
+    total_revenue = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def adjust(cls, users=0, reservations=0, revenue=0.0):
+        """Shift the running totals inside the current transaction (no-op until the row is built)."""
+        db.session.query(cls).filter_by(id=1).update({
+            cls.total_users: cls.total_users + users,
+            cls.total_reservations: cls.total_reservations + reservations,
+            cls.total_revenue: cls.total_revenue + revenue,
+            cls.updated_at: datetime.utcnow(),
+        })
+
+
+class UserMonthlyStats(db.Model):
+    """
+    Per-user, per-calendar-month rollup of reservations. Reservations count
+    toward the month they started in; completions and spend toward the month
+    they were released in. History deleted together with a lot stays counted
+    until `flask backfill-rollups` is run.
+    """
+    __tablename__ = 'user_monthly_stats'
+    __table_args__ = (db.UniqueConstraint('user_id', 'year', 'month'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    reservation_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    total_spent = db.Column(db.Float, default=0.0, nullable=False)
+
+
+class LotMonthlyStats(db.Model):
+    """
+    Per-lot, per-calendar-month rollup of activity. Reservations count toward
+    the month they started in; completions and revenue toward the month they
+    were released in. peak_occupied is the highest occupied-spot count seen
+    when a reservation opened during the month. Rows are removed with the lot;
+    history of spots removed by shrinking a lot stays counted until
+    `flask backfill-rollups` is run.
+    """
+    __tablename__ = 'lot_monthly_stats'
+    __table_args__ = (db.UniqueConstraint('lot_id', 'year', 'month'),)
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    reservation_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    peak_occupied = db.Column(db.Integer, default=0, nullable=False)
+
+    @classmethod
+    def for_month(cls, year, month):
+        """(lot, stats) pairs for every active lot, ordered by lot id; stats is None for lots without activity."""
+        return db.session.query(ParkingLot, cls).outerjoin(cls, db.and_(
+            cls.lot_id == ParkingLot.id, cls.year == year, cls.month == month
+        )).filter(ParkingLot.is_active.is_(True)).order_by(ParkingLot.id).all()
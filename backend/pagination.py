@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+from flask import request
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class BadPageRequest(ValueError):
+    """Raised for malformed cursors, limits or filter values."""
+
+
+def encode_cursor(*values):
+    """Opaque cursor for the sort key of the last row on a page."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise BadPageRequest("Invalid cursor")
+
+
+def page_limit():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise BadPageRequest("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadPageRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def date_arg(name):
+    """Parse an optional YYYY-MM-DD query argument."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise BadPageRequest(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def keyset_page(query, limit, cursor_of):
+    """
+    Run a query that is already filtered past the cursor and ordered by its
+    sort key. Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_of(rows[-1]))
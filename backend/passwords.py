@@ -0,0 +1,143 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """More password hashes are waiting than PASSWORD_HASH_QUEUE allows."""
+
+
+# Stronger families rank higher; unknown or legacy methods rank lowest
+_METHOD_RANK = {'pbkdf2': 1, 'scrypt': 2}
+
+
+def _method_strength(prefix):
+    """
+    (rank, variant, cost parameters) of the method part of a werkzeug
+    hash, e.g. 'pbkdf2:sha256:600000' -> (1, 'sha256', (600000,)) and
+    'scrypt:32768:8:1' -> (2, '', (32768, 8, 1)).
+    """
+    kind, *args = prefix.split(':')
+    try:
+        if kind == 'pbkdf2':
+            return _METHOD_RANK[kind], args[0], tuple(int(a) for a in args[1:])
+        if kind == 'scrypt':
+            return _METHOD_RANK[kind], '', tuple(int(a) for a in args)
+    except (IndexError, ValueError):
+        pass
+    return 0, kind, ()
+
+
+def _weaker(stored, configured):
+    """True when method `stored` is weaker than `configured`."""
+    stored_rank, stored_variant, stored_cost = stored
+    rank, variant, cost = configured
+    if stored_rank != rank:
+        return stored_rank < rank
+    if stored_variant != variant or len(stored_cost) != len(cost):
+        # Same family with another digest: neither is clearly weaker
+        return stored_rank == 0
+    # Weaker only if no cost parameter is higher and at least one is lower
+    return all(s <= c for s, c in zip(stored_cost, cost)) and stored_cost != cost
+
+
+class _HasherState:
+    def __init__(self, method, salt_length, workers, queue_limit):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.strength = None
+        self.executor = None
+        self.executor_pid = None
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+
+class PasswordHasher:
+    """
+    Password hashing off the request threads. Hashes run on a pool of
+    PASSWORD_HASH_WORKERS threads (hashlib releases the GIL while it works),
+    so logins can't take more CPU than that however many arrive; once
+    PASSWORD_HASH_QUEUE more are waiting, new ones fail with HashingBusy,
+    answered as 503. PASSWORD_HASH_WORKERS = 0 hashes on the request thread.
+
+    PASSWORD_HASH_METHOD is a werkzeug method string such as
+    'pbkdf2:sha256:600000' or 'scrypt:32768:8:1'; stored hashes made with a
+    weaker method (scrypt beats pbkdf2, then higher cost parameters win)
+    are upgraded by check_password on the next login, stronger ones are
+    left alone.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = _HasherState(
+            app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'),
+            app.config.get('PASSWORD_SALT_LENGTH', 16),
+            app.config.get('PASSWORD_HASH_WORKERS', 2),
+            app.config.get('PASSWORD_HASH_QUEUE', 32)
+        )
+        app.register_error_handler(HashingBusy, _busy_response)
+
+    @property
+    def _state(self):
+        return current_app.extensions['password_hasher']
+
+    @property
+    def stats(self):
+        state = self._state
+        return {**state.stats, 'pending': state.pending}
+
+    def _run(self, fn, *args):
+        state = self._state
+        if state.workers <= 0:
+            state.stats['inline'] += 1
+            return fn(*args)
+        with state.lock:
+            if state.pending >= state.workers + state.queue_limit:
+                state.stats['rejected'] += 1
+                raise HashingBusy()
+            state.pending += 1
+            # A forked worker inherits the executor but not its threads
+            if state.executor_pid != os.getpid():
+                state.executor = ThreadPoolExecutor(state.workers, thread_name_prefix='password-hash')
+                state.executor_pid = os.getpid()
+            executor = state.executor
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            with state.lock:
+                state.pending -= 1
+            state.stats['hashed'] += 1
+
+    def hash(self, password):
+        state = self._state
+        return self._run(generate_password_hash, password, state.method, state.salt_length)
+
+    def verify(self, pwd_hash, password):
+        return self._run(check_password_hash, pwd_hash, password)
+
+    def needs_rehash(self, pwd_hash):
+        """True when `pwd_hash` was made with a weaker method than PASSWORD_HASH_METHOD."""
+        state = self._state
+        if state.strength is None:
+            # werkzeug fills in default parameters, so ask it what the configured method stores
+            state.strength = _method_strength(generate_password_hash('', state.method, 1).split('$', 1)[0])
+        return _weaker(_method_strength(pwd_hash.split('$', 1)[0]), state.strength)
+
+
+password_hasher = PasswordHasher()
+
+
+def _busy_response(e):
+    response = jsonify(msg="Too many sign-ins in progress, please retry in a moment.")
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
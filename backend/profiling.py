@@ -0,0 +1,252 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+from uuid import uuid4
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from .extensions import db
+from .routes.decorators import token_role
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ARG = 'profile'
+PROFILE_ID_RE = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+# Query arguments that carry access tokens; left out of stored request paths
+TOKEN_ARGS = (PROFILE_ARG, 'jwt')
+
+# cProfile allows one active profiler per process from Python 3.12 on, so
+# only one request is profiled at a time; others arriving meanwhile run normally
+_active_run = threading.Lock()
+
+
+class _ProfilerState:
+    def __init__(self, directory, sample_rate, max_files, max_statements):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.max_statements = max_statements
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class _ProfileRun:
+    __slots__ = ('profile_id', 'trigger', 'profiler', 'started', 'statements', 'dropped')
+
+    def __init__(self, trigger):
+        self.profile_id = f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid4().hex[:8]}'
+        self.trigger = trigger
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.statements = []
+        self.dropped = 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not has_app_context():
+        return
+    run = g.get('_profile_run')
+    if run is None:
+        return
+    if len(run.statements) >= current_app.extensions['request_profiler'].max_statements:
+        run.dropped += 1
+        return
+    run.statements.append({
+        'sql': statement,
+        'parameters': repr(parameters)[:500],
+        'engine': 'read' if conn.engine is not db.engine else 'primary',
+        'ms': round((time.perf_counter() - context._profile_started) * 1000, 3),
+    })
+
+
+def _is_admin_trigger(value):
+    """
+    True when `value` authorises profiling: an admin access token, or '1'
+    on a request that itself carries an admin token. Both go through
+    token_role, the check role_required('admin') makes.
+    """
+    try:
+        return token_role(None if value == '1' else value) == 'admin'
+    except Exception:
+        return False
+
+
+def _stored_path(req):
+    """The request path and query string without any access tokens."""
+    args = [(key, value) for key, value in req.args.items(multi=True) if key not in TOKEN_ARGS]
+    return req.path + ('?' + urlencode(args) if args else '')
+
+
+class RequestProfiler:
+    """
+    Runs single requests under cProfile and keeps the profile with the SQL
+    they issued. A request is profiled when its X-Profile header or
+    ?profile= argument is an admin access token (or '1' on a request made
+    with an admin token), or, with PROFILE_SAMPLE_RATE = N, once every N
+    requests of this worker. One request per process is profiled at a
+    time; a trigger arriving while another run is active is ignored. Each
+    run is written to PROFILE_DIR as
+    <id>.prof (pstats) and <id>.json (request details and SQL trace); only
+    the newest PROFILE_MAX_FILES runs are kept. The response carries the
+    run id in X-Profile-Id.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = _ProfilerState(
+            app.config['PROFILE_DIR'],
+            app.config.get('PROFILE_SAMPLE_RATE', 0),
+            app.config.get('PROFILE_MAX_FILES', 200),
+            app.config.get('PROFILE_MAX_STATEMENTS', 1000)
+        )
+        app.extensions['request_profiler'] = state
+
+        with app.app_context():
+            engines = [db.engine]
+        read_engine = app.extensions.get('read_routing') and app.extensions['read_routing'].engine
+        if read_engine is not None:
+            engines.append(read_engine)
+        for engine in engines:
+            if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._discard)
+
+    @staticmethod
+    def _trigger():
+        value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_ARG)
+        if value and _is_admin_trigger(value):
+            return 'admin'
+        state = current_app.extensions['request_profiler']
+        if state.sample_rate > 0:
+            with state.lock:
+                state.requests += 1
+                if state.requests % state.sample_rate == 0:
+                    return 'sampled'
+        return None
+
+    def _start(self):
+        trigger = self._trigger()
+        if trigger is None or not _active_run.acquire(blocking=False):
+            return
+        try:
+            run = _ProfileRun(trigger)
+            run.profiler.enable()
+        except ValueError as e:
+            # Some other profiler is active in this process
+            _active_run.release()
+            current_app.logger.warning("Request not profiled: %s", e)
+            return
+        g._profile_run = run
+
+    @staticmethod
+    def _stop(run):
+        try:
+            run.profiler.disable()
+        finally:
+            _active_run.release()
+
+    def _finish(self, response):
+        run = g.pop('_profile_run', None)
+        if run is None:
+            return response
+        self._stop(run)
+        try:
+            self._store(run, response)
+            response.headers['X-Profile-Id'] = run.profile_id
+        except Exception as e:
+            current_app.logger.warning("Could not store profile %s: %s", run.profile_id, e)
+        return response
+
+    def _discard(self, exc):
+        # after_request was skipped; make sure the profiler doesn't outlive the request
+        run = g.pop('_profile_run', None)
+        if run is not None:
+            self._stop(run)
+
+    def _store(self, run, response):
+        state = current_app.extensions['request_profiler']
+        os.makedirs(state.directory, exist_ok=True)
+        base = os.path.join(state.directory, run.profile_id)
+        run.profiler.dump_stats(base + '.prof')
+        details = {
+            'id': run.profile_id,
+            'trigger': run.trigger,
+            'method': request.method,
+            'path': _stored_path(request),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'ms': round((time.perf_counter() - run.started) * 1000, 3),
+            'created_at': datetime.utcnow().isoformat(),
+            'sql_count': len(run.statements) + run.dropped,
+            'sql_ms': round(sum(s['ms'] for s in run.statements), 3),
+            'sql_dropped': run.dropped,
+            'sql': run.statements,
+        }
+        with open(base + '.json', 'w') as f:
+            json.dump(details, f)
+        self._prune(state)
+
+    @staticmethod
+    def _prune(state):
+        ids = sorted(name[:-5] for name in os.listdir(state.directory)
+                     if name.endswith('.json') and PROFILE_ID_RE.match(name[:-5]))
+        for profile_id in ids[:max(0, len(ids) - state.max_files)]:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(state.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    @property
+    def directory(self):
+        return current_app.extensions['request_profiler'].directory
+
+    def list(self):
+        """Stored runs, newest first, without their SQL traces."""
+        if not os.path.isdir(self.directory):
+            return []
+        runs = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith('.json') and PROFILE_ID_RE.match(name[:-5]):
+                details = self.load(name[:-5])
+                if details is not None:
+                    details.pop('sql', None)
+                    runs.append(details)
+        return runs
+
+    def load(self, profile_id):
+        """Details and SQL trace of one run, or None."""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + '.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def summary(self, profile_id, sort='cumulative', limit=40):
+        """The top `limit` functions of one run as pstats prints them."""
+        out = io.StringIO()
+        stats = pstats.Stats(os.path.join(self.directory, profile_id + '.prof'), stream=out)
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,98 @@
+from sqlalchemy import delete, func, insert, literal, select
+from .extensions import db
+from .models import ParkingLot, ParkingSpot, Reservation, DashboardSnapshot
+
+
+def add_spots(lot_id, count):
+    """
+    Append `count` free spots to a lot with one INSERT ... SELECT over a
+    recursive counter, so a lot's new spots get one contiguous id range.
+    Adjusts the lot counters; must be followed by a commit.
+    """
+    if count <= 0:
+        return 0
+    seq = select(literal(1).label('n')).cte('seq', recursive=True)
+    seq = seq.union_all(select(seq.c.n + 1).where(seq.c.n < count))
+    db.session.execute(
+        insert(ParkingSpot).from_select(
+            ['lot_id', 'status'],
+            select(literal(lot_id), literal('A')).select_from(seq)
+        )
+    )
+    ParkingLot.adjust_counters(lot_id, available=count)
+    return count
+
+
+def remove_free_spots(lot_id, count):
+    """
+    Delete up to `count` free spots of a lot, highest ids first so the ids
+    that remain stay contiguous, together with their (completed)
+    reservations. Adjusts the lot counters and the dashboard snapshot and
+    returns the number of spots removed; must be followed by a commit.
+    Callers should write the lot row first so that, on SQLite, the
+    transaction already holds the write lock and no spot in the tail can be
+    claimed in between.
+    """
+    if count <= 0:
+        return 0
+    tail = select(ParkingSpot.id).where(
+        ParkingSpot.lot_id == lot_id,
+        ParkingSpot.status == 'A'
+    ).order_by(ParkingSpot.id.desc()).limit(count).scalar_subquery()
+
+    removed_reservations, removed_revenue = db.session.query(
+        func.count(Reservation.id),
+        func.coalesce(func.sum(Reservation.parking_cost), 0)
+    ).filter(Reservation.spot_id.in_(tail)).one()
+    db.session.execute(
+        delete(Reservation).where(Reservation.spot_id.in_(tail)).execution_options(synchronize_session=False)
+    )
+    removed = db.session.execute(
+        delete(ParkingSpot).where(ParkingSpot.id.in_(tail)).execution_options(synchronize_session=False)
+    ).rowcount
+
+    ParkingLot.adjust_counters(lot_id, available=-removed, reservations=-removed_reservations)
+    DashboardSnapshot.adjust(reservations=-removed_reservations, revenue=-removed_revenue)
+    return removed
+
+
+def lot_history_size(lot_id):
+    """(reservations, spots) still stored for a lot."""
+    reservations = db.session.query(func.count(Reservation.id))\
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+        .filter(ParkingSpot.lot_id == lot_id).scalar()
+    spots = db.session.query(func.count(ParkingSpot.id)).filter(ParkingSpot.lot_id == lot_id).scalar()
+    return reservations, spots
+
+
+def delete_reservation_chunk(lot_id, size):
+    """
+    Delete up to `size` of a lot's reservations, selected through a join on
+    parking_spots rather than an id list, and take them out of the dashboard
+    totals. Returns the number deleted; must be followed by a commit.
+    """
+    chunk = select(Reservation.id)\
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+        .where(ParkingSpot.lot_id == lot_id)\
+        .order_by(Reservation.id).limit(size).scalar_subquery()
+
+    count, revenue = db.session.query(
+        func.count(Reservation.id),
+        func.coalesce(func.sum(Reservation.parking_cost), 0)
+    ).filter(Reservation.id.in_(chunk)).one()
+    if not count:
+        return 0
+    db.session.execute(
+        delete(Reservation).where(Reservation.id.in_(chunk)).execution_options(synchronize_session=False)
+    )
+    DashboardSnapshot.adjust(reservations=-count, revenue=-revenue)
+    return count
+
+
+def delete_spot_chunk(lot_id, size):
+    """Delete up to `size` spots of a lot; returns the number deleted. Must be followed by a commit."""
+    chunk = select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id)\
+        .order_by(ParkingSpot.id).limit(size).scalar_subquery()
+    return db.session.execute(
+        delete(ParkingSpot).where(ParkingSpot.id.in_(chunk)).execution_options(synchronize_session=False)
+    ).rowcount
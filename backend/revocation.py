@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import Counter
+from flask import current_app, jsonify
+from sqlalchemy.exc import SQLAlchemyError
+from .extensions import db, jwt
+from .models import User
+
+# Redis keys: the revoked subjects, and a counter bumped on every change
+REVOKED_KEY = 'parkbuddy:revoked'
+VERSION_KEY = 'parkbuddy:revoked:version'
+
+
+class RevocationUnavailable(Exception):
+    """A revocation could not be written to the shared (Redis) set."""
+
+
+def subject(role, identity):
+    """Revocation entry of a token's role and identity claims."""
+    return f'{role}:{identity}'
+
+
+class _RevocationState:
+    def __init__(self, redis_client, check_interval):
+        self.redis = redis_client
+        self.check_interval = check_interval
+        self.subjects = frozenset()
+        self.version = None
+        self.next_check = 0.0
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+
+class RevocationSet:
+    """
+    Subjects whose tokens are rejected before they expire (blocked users).
+    Every token check reads a frozenset held in this process; with
+    REVOCATION_BACKEND = 'redis' the set lives in Redis and each worker
+    compares a version counter at most every REVOCATION_CHECK_INTERVAL
+    seconds, fetching the members only when it changed. 'local' keeps the
+    set in this process only. The users table stays the source of truth:
+    the set is rebuilt from it when the app starts, and a worker that
+    can't reach Redis keeps rejecting what it last knew. revoke() and
+    restore() raise RevocationUnavailable (answered as 503) when Redis
+    can't be written, so the caller can undo the change in the table.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('REVOCATION_BACKEND', 'local')
+        if kind == 'redis':
+            import redis
+            # Short timeouts: the check runs inside every authenticated request
+            client = redis.Redis.from_url(app.config['REDIS_URL'], socket_timeout=0.5, socket_connect_timeout=0.5)
+        elif kind == 'local':
+            client = None
+        else:
+            raise ValueError(f"Unknown REVOCATION_BACKEND {kind!r}; expected 'redis' or 'local'")
+        app.extensions['revocation'] = _RevocationState(client, app.config.get('REVOCATION_CHECK_INTERVAL', 1.0))
+
+        jwt.token_in_blocklist_loader(_token_revoked)
+        jwt.revoked_token_loader(_revoked_response)
+        app.register_error_handler(RevocationUnavailable, _unavailable_response)
+
+        with app.app_context():
+            try:
+                self.rebuild()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                app.logger.warning("Revocation set not loaded from the users table: %s", e)
+
+    @property
+    def _state(self):
+        return current_app.extensions['revocation']
+
+    @property
+    def stats(self):
+        return dict(self._state.stats)
+
+    def rebuild(self):
+        """Reload the set from the blocked users in the database."""
+        subjects = frozenset(
+            subject('user', user_id)
+            for (user_id,) in db.session.query(User.id).filter(User.is_active.is_(False))
+        )
+        state = self._state
+        with state.lock:
+            state.subjects = subjects
+        if state.redis is not None:
+            try:
+                pipe = state.redis.pipeline()
+                pipe.delete(REVOKED_KEY)
+                if subjects:
+                    pipe.sadd(REVOKED_KEY, *subjects)
+                pipe.incr(VERSION_KEY)
+                state.version = pipe.execute()[-1]
+            except Exception as e:
+                state.stats['redis_errors'] += 1
+                current_app.logger.warning("Revocation set not written to Redis: %s", e)
+        state.stats['rebuilds'] += 1
+
+    def revoke(self, role, identity):
+        self._change(subject(role, identity), revoked=True)
+
+    def restore(self, role, identity):
+        self._change(subject(role, identity), revoked=False)
+
+    def _change(self, entry, revoked):
+        state = self._state
+        if state.redis is not None:
+            # Written to Redis first: a change the other workers won't see isn't applied here either
+            for attempt in range(2):
+                try:
+                    pipe = state.redis.pipeline()
+                    if revoked:
+                        pipe.sadd(REVOKED_KEY, entry)
+                    else:
+                        pipe.srem(REVOKED_KEY, entry)
+                    pipe.incr(VERSION_KEY)
+                    pipe.execute()
+                    break
+                except Exception as e:
+                    state.stats['redis_errors'] += 1
+                    current_app.logger.warning("Revocation of %s not written to Redis: %s", entry, e)
+            else:
+                raise RevocationUnavailable(entry)
+        with state.lock:
+            state.subjects = state.subjects | {entry} if revoked else state.subjects - {entry}
+
+    def _refresh(self, state, now):
+        state.next_check = now + state.check_interval
+        try:
+            version = state.redis.get(VERSION_KEY)
+            if version is None:
+                # Redis lost the set (flushed or restarted empty): restore it from the table
+                self.rebuild()
+                return
+            if int(version) == state.version:
+                return
+            pipe = state.redis.pipeline()
+            pipe.smembers(REVOKED_KEY)
+            pipe.get(VERSION_KEY)
+            members, version = pipe.execute()
+        except Exception as e:
+            state.stats['redis_errors'] += 1
+            current_app.logger.warning("Revocation set not refreshed: %s", e)
+            return
+        with state.lock:
+            state.subjects = frozenset(m.decode() for m in members)
+            state.version = int(version) if version is not None else None
+        state.stats['refreshes'] += 1
+
+    def is_revoked(self, role, identity):
+        state = self._state
+        if state.redis is not None:
+            now = time.monotonic()
+            if now >= state.next_check:
+                self._refresh(state, now)
+        return subject(role, identity) in state.subjects
+
+
+revocations = RevocationSet()
+
+
+def _token_revoked(jwt_header, jwt_payload):
+    return revocations.is_revoked(jwt_payload.get('role'), jwt_payload.get('sub'))
+
+
+def _revoked_response(jwt_header, jwt_payload):
+    return jsonify(msg="Your account has been blocked by the admin. Please contact support."), 401
+
+
+def _unavailable_response(e):
+    response = jsonify(msg="Could not reach the revocation store; nothing was changed, please retry.")
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
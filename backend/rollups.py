@@ -0,0 +1,46 @@
+from sqlalchemy import and_, case, update
+from sqlalchemy.dialects import postgresql, sqlite
+from .extensions import db
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _greatest(a, b):
+    return case((a > b, a), else_=b)
+
+
+def bump(model, keys, maximums=None, **increments):
+    """
+    Add `increments` to the rollup row of `model` identified by `keys`,
+    creating the row if it doesn't exist yet. Columns in `maximums` are raised
+    to the given value (which may be a SQL expression) instead of added to.
+    Runs in the current transaction.
+    """
+    maximums = maximums or {}
+    insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        stmt = insert(model).values(**keys, **increments, **maximums)
+        set_ = {name: getattr(model, name) + stmt.excluded[name] for name in increments}
+        set_.update({name: _greatest(getattr(model, name), stmt.excluded[name]) for name in maximums})
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=set_)
+        db.session.execute(stmt)
+        return
+
+    # Portable fallback: update first, insert when there was nothing to update
+    match = and_(*(getattr(model, name) == value for name, value in keys.items()))
+    values = {name: getattr(model, name) + value for name, value in increments.items()}
+    values.update({name: _greatest(getattr(model, name), value) for name, value in maximums.items()})
+    updated = db.session.execute(update(model).where(match).values(values)).rowcount
+    if not updated:
+        db.session.add(model(**keys, **increments, **maximums))
+        db.session.flush()
+
+
+def recent_months(now, count):
+    """The last `count` calendar months up to `now`, oldest first, as (year, month)."""
+    year, month = now.year, now.month
+    months = []
+    for _ in range(count):
+        months.insert(0, (year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months
@@ -1,18 +1,31 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import User, ParkingLot, ParkingSpot, Reservation, Admin
-from ..extensions import db, cache
+from ..models import User, ParkingLot, ParkingSpot, Reservation, Admin, DashboardSnapshot, UserMonthlyStats, LotMonthlyStats
+from ..extensions import db
+from ..caching import (cached_view, invalidate, cache_stats, lot_ns, user_ns,
+                       LOT_LIST, LOT_AVAILABILITY, USER_LIST, DASHBOARD)
 from .decorators import role_required
+from ..routing import read_only
+from ..allocator import spot_allocator
+from ..live import lot_availability
+from ..metrics import request_metrics
+from ..profiling import request_profiler
+from ..revocation import RevocationUnavailable, revocations
+from ..provisioning import add_spots, remove_free_spots
+from ..pagination import BadPageRequest, decode_cursor, keyset_page, page_limit
 from datetime import datetime, timedelta
-from sqlalchemy import func, case
+from sqlalchemy import func, case, and_
 
 admin_bp = Blueprint('admin', __name__)
 
+# Upper bound on the spot grid page size of lot_details
+MAX_SPOTS_PER_PAGE = 500
+
 @admin_bp.route('/api/lots', methods=['GET'])
 @role_required('admin')
-# @cache.cached(timeout=1, key_prefix="admin_lots")
+@cached_view(lambda: [LOT_LIST], timeout=300, etag=True)
 def get_all_lots():
-    lots = ParkingLot.query.all()
+    lots = ParkingLot.active().all()
     return jsonify([
         {
             "id": lot.id,
@@ -28,7 +41,7 @@ def get_all_lots():
 @admin_bp.route('/api/lots/<int:lot_id>', methods=['GET'])
 @role_required('admin')
 def get_lot(lot_id):
-    lot = ParkingLot.query.get_or_404(lot_id)
+    lot = ParkingLot.active().filter_by(id=lot_id).first_or_404()
     return jsonify({
         "id": lot.id,
         "prime_location_name": lot.prime_location_name,
@@ -41,34 +54,77 @@ def get_lot(lot_id):
 @admin_bp.route('/api/lots/<int:lot_id>', methods=['DELETE'])
 @role_required('admin')
 def delete_lot_api(lot_id):
-    lot = ParkingLot.query.get_or_404(lot_id)
-    
-    # Check for any active reservations in this lot, which is a more robust check
-    active_reservations = Reservation.query.join(ParkingSpot).filter(
-        ParkingSpot.lot_id == lot_id, 
-        Reservation.leaving_timestamp == None
-    ).count()
+    """
+    Close the lot to bookings right away and queue a background job that
+    deletes its reservations and spots in chunks. Progress is reported by
+    GET /api/admin/lot-deletions/<task_id>. A lot already closed for
+    deletion (say, by a run that failed partway) is queued again; the job
+    carries on from whatever is left.
+    """
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is None:
+        return jsonify(msg="Lot not found"), 404
 
-    if active_reservations > 0:
-        return jsonify(msg="Cannot delete lot with active reservations"), 400
+    closing = lot.is_active
+    if closing:
+        # Mark the lot first: claims re-check the flag, so no booking can slip in after the check below
+        lot.is_active = False
+        db.session.flush()
 
-    # If no active reservations, proceed with deletion
-    try:
-        # Delete associated reservations first
-        spot_ids = [spot.id for spot in lot.spots]
-        Reservation.query.filter(Reservation.spot_id.in_(spot_ids)).delete(synchronize_session=False)
+        # Check for any active reservations in this lot, which is a more robust check
+        active_reservations = Reservation.query.join(ParkingSpot).filter(
+            ParkingSpot.lot_id == lot_id,
+            Reservation.leaving_timestamp == None
+        ).count()
 
-        # Delete associated spots
-        ParkingSpot.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
+        if active_reservations > 0:
+            db.session.rollback()
+            return jsonify(msg="Cannot delete lot with active reservations"), 400
 
-        # Finally, delete the lot
-        db.session.delete(lot)
         db.session.commit()
-        return jsonify(msg="Lot and all associated data deleted successfully"), 200
+        spot_allocator.drop_lot(lot_id)
+        invalidate(LOT_LIST, LOT_AVAILABILITY, DASHBOARD, lot_ns(lot_id))
+        lot_availability.publish(lot_id)
+
+    # Import tasks here to avoid circular import
+    from ..tasks import delete_lot
+    try:
+        task = delete_lot.delay(lot_id)
     except Exception as e:
-        db.session.rollback()
+        if not closing:
+            # Closed by an earlier request, possibly half deleted: leave it closed to retry later
+            return jsonify(msg=f"Error queueing lot deletion: {str(e)}"), 500
+        # Nothing was queued; reopen the lot
+        lot.is_active = True
+        db.session.commit()
+        if spot_allocator.ready:
+            spot_allocator.rebuild(lot_id)
+        invalidate(LOT_LIST, LOT_AVAILABILITY, DASHBOARD, lot_ns(lot_id))
+        lot_availability.publish(lot_id)
         return jsonify(msg=f"Error deleting lot: {str(e)}"), 500
 
+    return jsonify(
+        msg="Lot deletion started",
+        task_id=task.id,
+        status_url=f"/api/admin/lot-deletions/{task.id}"
+    ), 202
+
+@admin_bp.route('/api/admin/lot-deletions/<task_id>', methods=['GET'])
+@role_required('admin')
+def lot_deletion_status(task_id):
+    """State and progress of a background lot deletion."""
+    from ..tasks import delete_lot
+    result = delete_lot.AsyncResult(task_id)
+    body = {"task_id": task_id, "state": result.state}
+    if result.state == 'FAILURE':
+        body["error"] = str(result.info)
+    elif isinstance(result.info, dict):
+        body.update(result.info)
+        total = body.get("reservations_total", 0) + body.get("spots_total", 0)
+        done = body.get("reservations_deleted", 0) + body.get("spots_deleted", 0)
+        body["progress"] = round(done / total, 3) if total else 1.0
+    return jsonify(body)
+
 @admin_bp.route('/api/lots', methods=['POST'])
 @role_required('admin')
 def create_lot():
@@ -95,14 +151,19 @@ def create_lot():
             price_per_hour=price,
             address=data['address'],
             pin_code=data['pincode'],
-            number_of_spots=spots
+            number_of_spots=spots,
+            available_spots=0,
+            occupied_spots=0
         )
         db.session.add(lot)
         db.session.flush()
 
-        for _ in range(spots):
-            db.session.add(ParkingSpot(lot_id=lot.id))
+        add_spots(lot.id, spots)
         db.session.commit()
+        if spot_allocator.ready:
+            spot_allocator.rebuild(lot.id)
+        invalidate(LOT_LIST, LOT_AVAILABILITY)
+        lot_availability.publish(lot.id)
         return jsonify(msg="Created"), 201
     except Exception as e:
         db.session.rollback()
@@ -110,29 +171,52 @@ def create_lot():
 
 @admin_bp.route('/api/admin/users', methods=['GET'])
 @role_required('admin')
-# @cache.cached(timeout=30, key_prefix="admin_users")
+@cached_view(lambda: [USER_LIST], timeout=30, etag=True)
 def list_users():
-    users = User.query.all()
-    return jsonify([
-        {"id": u.id, "email": u.email, "name": u.full_name, "is_active": u.is_active}
-        for u in users
-    ])
+    """
+    Registered users by id, one page at a time. Query args: limit, cursor
+    (next_cursor of the previous page) and status (active|blocked).
+    """
+    try:
+        limit = page_limit()
+        status = request.args.get('status')
+        if status not in (None, 'active', 'blocked'):
+            raise BadPageRequest("status must be 'active' or 'blocked'")
+
+        query = User.query
+        if status:
+            query = query.filter(User.is_active == (status == 'active'))
+        if 'cursor' in request.args:
+            (cursor_id,) = decode_cursor(request.args['cursor'])
+            query = query.filter(User.id > int(cursor_id))
+    except BadPageRequest as e:
+        return jsonify(msg=str(e)), 400
+    except (ValueError, TypeError):
+        # A cursor that decodes but doesn't hold the expected values
+        return jsonify(msg="Invalid cursor"), 400
+
+    users, next_cursor = keyset_page(query.order_by(User.id), limit, lambda u: (u.id,))
+    return jsonify({
+        "items": [
+            {"id": u.id, "email": u.email, "name": u.full_name, "is_active": u.is_active}
+            for u in users
+        ],
+        "next_cursor": next_cursor
+    })
 
 @admin_bp.route('/api/admin/user-details/<int:user_id>', methods=['GET'])
 @role_required('admin')
-@cache.cached(timeout=200, key_prefix=lambda: f"admin_user_details_{request.view_args['user_id']}")
+@read_only
+@cached_view(lambda: [user_ns(request.view_args['user_id']), LOT_LIST], timeout=200)
 def get_user_details(user_id):
     user = User.query.get_or_404(user_id)
     
-    # Get user's reservation statistics
-    total_reservations = Reservation.query.filter_by(user_id=user_id).count()
-    completed_reservations = Reservation.query.filter_by(
-        user_id=user_id
-    ).filter(Reservation.leaving_timestamp.isnot(None)).count()
-    
-    total_spent = db.session.query(func.sum(Reservation.parking_cost)).filter_by(
-        user_id=user_id
-    ).scalar() or 0
+    # Get user's reservation statistics from the monthly rollup rows
+    total_reservations, completed_reservations, total_spent = db.session.query(
+        func.coalesce(func.sum(UserMonthlyStats.reservation_count), 0),
+        func.coalesce(func.sum(UserMonthlyStats.completed_count), 0),
+        func.coalesce(func.sum(UserMonthlyStats.total_spent), 0)
+    ).filter(UserMonthlyStats.user_id == user_id).one()
     
     # Get recent reservations
     recent_reservations = Reservation.query.filter_by(user_id=user_id).join(
@@ -182,8 +266,27 @@ def block_user(user_id):
             return jsonify(msg="Cannot block user with active reservations. Please ask them to release their spots first."), 400
     
     # Toggle user active status
-    user.is_active = not user.is_active
-    db.session.commit()
+    blocking = user.is_active
+    user.is_active = not blocking
+    # Takes effect on tokens already issued, not just at the next login. The set
+    # is written before the commit, so a failed write (RevocationUnavailable,
+    # answered as 503) leaves the user as they were
+    change, undo = (revocations.revoke, revocations.restore) if blocking else (revocations.restore, revocations.revoke)
+    try:
+        change('user', user_id)
+    except RevocationUnavailable:
+        db.session.rollback()
+        raise
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        try:
+            undo('user', user_id)
+        except RevocationUnavailable:
+            pass  # the set is rebuilt from the table on the next start
+        raise
+    invalidate(USER_LIST, user_ns(user_id))
     
     action = "unblocked" if user.is_active else "blocked"
     return jsonify(msg=f"User {action} successfully"), 200
@@ -191,53 +294,80 @@ def block_user(user_id):
 @admin_bp.route('/api/admin/stats', methods=['GET'])
 @admin_bp.route('/api/admin/dashboard-stats', methods=['GET'])
 @role_required('admin')
-# @cache.cached(timeout=60)
+@read_only
+@cached_view(lambda: [DASHBOARD, LOT_LIST, USER_LIST], timeout=60)
 def dashboard_stats():
     try:
-        # Quick Stats
-        total_lots = ParkingLot.query.count()
-        total_spots = ParkingSpot.query.count()
-        total_users = User.query.count()
+        # One pass over parking_lots gives the spot totals and the distribution
+        lots = db.session.query(
+            ParkingLot.id,
+            ParkingLot.prime_location_name,
+            ParkingLot.available_spots,
+            ParkingLot.occupied_spots,
+            ParkingLot.total_reservations
+        ).filter(ParkingLot.is_active.is_(True)).order_by(ParkingLot.id).all()
+
+        available_spots = sum(lot.available_spots for lot in lots)
+        occupied_spots = sum(lot.occupied_spots for lot in lots)
+        spot_distribution = [
+            {
+                "id": lot.id,
+                "name": lot.prime_location_name,
+                "total": lot.available_spots + lot.occupied_spots,
+                "occupied": lot.occupied_spots,
+                "available": lot.available_spots
+            }
+            for lot in lots
+        ]
 
-        occupied_spots = ParkingSpot.query.filter_by(status='O').count()
-        available_spots = ParkingSpot.query.filter_by(status='A').count()
+        snapshot = None
+        if current_app.config.get('DASHBOARD_SNAPSHOT_ENABLED', True):
+            snapshot = db.session.get(DashboardSnapshot, 1)
 
-        # Total Revenue: sum of parking_cost for all completed reservations
-        total_revenue = db.session.query(func.sum(Reservation.parking_cost)).filter(
-            Reservation.leaving_timestamp.isnot(None)
-        ).scalar() or 0
+        if snapshot:
+            # Running totals maintained by register, reserve and release
+            total_users = snapshot.total_users
+            total_reservations = snapshot.total_reservations
+            total_revenue = snapshot.total_revenue
+            reservations_by_lot = {lot.id: lot.total_reservations for lot in lots}
+        else:
+            total_users = User.query.count()
+            # Reservation count and completed revenue per lot in a single grouped scan
+            per_lot = db.session.query(
+                ParkingSpot.lot_id,
+                func.count(Reservation.id),
+                func.sum(case((Reservation.leaving_timestamp.isnot(None), Reservation.parking_cost), else_=0))
+            ).join(Reservation, ParkingSpot.id == Reservation.spot_id)\
+             .group_by(ParkingSpot.lot_id).all()
+            total_reservations = sum(count for _, count, _ in per_lot)
+            total_revenue = sum(revenue or 0 for _, _, revenue in per_lot)
+            reservations_by_lot = {lot_id: count for lot_id, count, _ in per_lot}
 
         # Most popular lot (by total reservations)
-        popular_lot_query = db.session.query(
-            ParkingLot.prime_location_name,
-            func.count(Reservation.id).label('reservation_count')
-        ).join(ParkingSpot, ParkingLot.id == ParkingSpot.lot_id)\
-         .join(Reservation, ParkingSpot.id == Reservation.spot_id)\
-         .group_by(ParkingLot.id)\
-         .order_by(func.count(Reservation.id).desc())
-        popular_lot = popular_lot_query.first()
-
-        # Spot distribution by lot
-        lots = ParkingLot.query.all()
-        spot_distribution = []
-        for lot in lots:
-            total = ParkingSpot.query.filter_by(lot_id=lot.id).count()
-            occupied = ParkingSpot.query.filter_by(lot_id=lot.id, status='O').count()
-            available = total - occupied
-            spot_distribution.append({
-                "name": lot.prime_location_name,
-                "total": total,
-                "occupied": occupied,
-                "available": available
-            })
+        popular_lot = max(
+            (lot for lot in lots if reservations_by_lot.get(lot.id)),
+            key=lambda lot: reservations_by_lot[lot.id],
+            default=None
+        )
 
-        # Recent reservations (last 5)
-        recent_reservations_query = Reservation.query.order_by(Reservation.parking_timestamp.desc()).limit(5)
+        # Recent reservations (last 5), with user and lot joined in
+        recent_reservations_query = db.session.query(
+            Reservation.id,
+            User.full_name,
+            ParkingLot.prime_location_name,
+            Reservation.spot_id,
+            Reservation.parking_timestamp,
+            Reservation.parking_cost
+        ).join(User, Reservation.user_id == User.id)\
+         .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+         .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)\
+         .order_by(Reservation.parking_timestamp.desc())\
+         .limit(5)
         recent_reservations = [
             {
                 "id": res.id,
-                "user": res.user.full_name,
-                "lot": res.spot.lot.prime_location_name,
+                "user": res.full_name,
+                "lot": res.prime_location_name,
                 "spot_id": res.spot_id,
                 "parked_at": res.parking_timestamp.strftime("%Y-%m-%d %H:%M"),
                 "cost": res.parking_cost or 0
@@ -246,13 +376,14 @@ def dashboard_stats():
         ]
 
         return jsonify({
-            "total_lots": total_lots,
-            "total_spots": total_spots,
+            "total_lots": len(lots),
+            "total_spots": available_spots + occupied_spots,
             "occupied_spots": occupied_spots,
             "available_spots": available_spots,
             "total_users": total_users,
+            "total_reservations": total_reservations,
             "total_revenue": float(total_revenue),
-            "most_popular_lot": popular_lot[0] if popular_lot else "None",
+            "most_popular_lot": popular_lot.prime_location_name if popular_lot else "None",
             "spot_distribution": spot_distribution,
             "recent_reservations": recent_reservations
         })
@@ -262,28 +393,93 @@ def dashboard_stats():
         print(f"Error in dashboard_stats: {str(e)}")
         return jsonify(msg=f"Error loading dashboard statistics: {str(e)}"), 500
 
+@admin_bp.route('/api/admin/lot-activity', methods=['GET'])
+@role_required('admin')
+@read_only
+@cached_view(lambda: [DASHBOARD, LOT_LIST], timeout=300)
+def lot_activity():
+    """Per-lot reservations, revenue and peak occupancy for one month (?year=&month=, default current)."""
+    now = datetime.utcnow()
+    try:
+        year = int(request.args.get('year', now.year))
+        month = int(request.args.get('month', now.month))
+    except ValueError:
+        return jsonify(msg="year and month must be integers"), 400
+    if not 1 <= month <= 12:
+        return jsonify(msg="month must be between 1 and 12"), 400
+
+    lots = [
+        {
+            "lot_id": lot.id,
+            "name": lot.prime_location_name,
+            "reservations": stats.reservation_count if stats else 0,
+            "completed": stats.completed_count if stats else 0,
+            "revenue": round(stats.revenue, 2) if stats else 0.0,
+            "peak_occupied": stats.peak_occupied if stats else 0,
+            "total_spots": lot.number_of_spots
+        }
+        for lot, stats in LotMonthlyStats.for_month(year, month)
+    ]
+    return jsonify(
+        year=year,
+        month=month,
+        lots=lots,
+        totals={
+            "reservations": sum(lot["reservations"] for lot in lots),
+            "revenue": round(sum(lot["revenue"] for lot in lots), 2)
+        }
+    )
+
 @admin_bp.route('/api/admin/lot-details/<int:lot_id>', methods=['GET'])
 @role_required('admin')
-@cache.cached(timeout=200, key_prefix=lambda: f"admin_lot_details_{request.view_args['lot_id']}")
+@cached_view(lambda: [lot_ns(request.view_args['lot_id'])], timeout=200)
 def lot_details(lot_id):
-    lot = ParkingLot.query.get_or_404(lot_id)
-    spots = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-    
-    spot_details = []
-    for spot in spots:
-        active_reservation = Reservation.query.filter_by(
-            spot_id=spot.id, 
-            leaving_timestamp=None
-        ).first()
-        
-        spot_details.append({
+    """
+    Spot grid of a lot with the current occupant of each occupied spot.
+    Optional query args: status=A|O to filter, page and per_page to page
+    through large lots (ordered by spot id).
+    """
+    lot = ParkingLot.active().filter_by(id=lot_id).first_or_404()
+
+    status = request.args.get('status')
+    if status not in (None, 'A', 'O'):
+        return jsonify(msg="status must be 'A' or 'O'"), 400
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args['per_page']) if 'per_page' in request.args else None
+    except ValueError:
+        return jsonify(msg="page and per_page must be integers"), 400
+    if page < 1 or (per_page is not None and not 1 <= per_page <= MAX_SPOTS_PER_PAGE):
+        return jsonify(msg=f"page must be >= 1 and per_page between 1 and {MAX_SPOTS_PER_PAGE}"), 400
+
+    # Spots, their active reservation (if any) and its user in one outer join
+    spots = db.session.query(
+        ParkingSpot.id,
+        ParkingSpot.status,
+        User.email,
+        Reservation.parking_timestamp
+    ).outerjoin(Reservation, and_(
+        Reservation.spot_id == ParkingSpot.id,
+        Reservation.leaving_timestamp.is_(None)
+    )).outerjoin(User, Reservation.user_id == User.id)\
+     .filter(ParkingSpot.lot_id == lot_id)
+    if status:
+        spots = spots.filter(ParkingSpot.status == status)
+    spots = spots.order_by(ParkingSpot.id)
+    if per_page:
+        spots = spots.offset((page - 1) * per_page).limit(per_page)
+
+    spot_details = [
+        {
             "id": spot.id,
             "status": spot.status,
-            "occupied_by": active_reservation.user.email if active_reservation else None,
-            "parking_since": active_reservation.parking_timestamp.strftime("%Y-%m-%d %H:%M") if active_reservation else None
-        })
-    
-    return jsonify({
+            "occupied_by": spot.email,
+            "parking_since": spot.parking_timestamp.strftime("%Y-%m-%d %H:%M") if spot.parking_timestamp else None
+        }
+        for spot in spots
+    ]
+
+    response = {
         "lot": {
             "id": lot.id,
             "name": lot.prime_location_name,
@@ -292,13 +488,28 @@ def lot_details(lot_id):
             "pin_code": lot.pin_code,
             "total_spots": lot.number_of_spots
         },
+        "counts": {
+            "available": lot.available_spots,
+            "occupied": lot.occupied_spots
+        },
         "spots": spot_details
-    })
+    }
+    if per_page:
+        matching = {'A': lot.available_spots, 'O': lot.occupied_spots}.get(
+            status, lot.available_spots + lot.occupied_spots
+        )
+        response["pagination"] = {
+            "page": page,
+            "per_page": per_page,
+            "total": matching,
+            "pages": -(-matching // per_page)
+        }
+    return jsonify(response)
 
 @admin_bp.route('/api/admin/edit-lot/<int:lot_id>', methods=['PUT'])
 @role_required('admin')
 def edit_lot(lot_id):
-    lot = ParkingLot.query.get_or_404(lot_id)
+    lot = ParkingLot.active().filter_by(id=lot_id).first_or_404()
     data = request.get_json()
     
     # Check if we can reduce spots (no occupied spots in excess)
@@ -317,21 +528,85 @@ def edit_lot(lot_id):
     # Handle spot count changes
     if new_spot_count != lot.number_of_spots:
         current_spots = ParkingSpot.query.filter_by(lot_id=lot_id).count()
-        
-        if new_spot_count > current_spots:
-            # Add more spots
-            for _ in range(new_spot_count - current_spots):
-                new_spot = ParkingSpot(lot_id=lot_id)
-                db.session.add(new_spot)
-        else:
-            # Remove excess available spots
-            available_spots = ParkingSpot.query.filter_by(lot_id=lot_id, status='A').limit(
-                current_spots - new_spot_count
-            ).all()
-            for spot in available_spots:
-                db.session.delete(spot)
-        
         lot.number_of_spots = new_spot_count
-    
+        # Write the lot row first so the spot changes run under the writer lock
+        db.session.flush()
+
+        if new_spot_count > current_spots:
+            add_spots(lot_id, new_spot_count - current_spots)
+        elif new_spot_count < current_spots:
+            # Free spots with the highest ids go first, along with their reservations
+            removed = remove_free_spots(lot_id, current_spots - new_spot_count)
+            lot.number_of_spots = current_spots - removed
+
     db.session.commit()
+    if spot_allocator.ready:
+        spot_allocator.rebuild(lot_id)
+    invalidate(LOT_LIST, LOT_AVAILABILITY, lot_ns(lot_id))
+    lot_availability.publish(lot_id)
     return jsonify(msg="Lot updated successfully"), 200
+
+@admin_bp.route('/api/admin/cache-stats', methods=['GET'])
+@role_required('admin')
+def get_cache_stats():
+    """Hit/miss counters of the response cache for this worker."""
+    return jsonify(dict(cache_stats))
+
+@admin_bp.route('/api/admin/metrics', methods=['GET'])
+@role_required('admin')
+def get_metrics():
+    """Per-endpoint latency, SQL and response size metrics of this worker, in Prometheus text format."""
+    return current_app.response_class(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/api/admin/profiles', methods=['GET'])
+@role_required('admin')
+def list_profiles():
+    """Profiled requests stored by this host, newest first."""
+    return jsonify(profiles=request_profiler.list())
+
+@admin_bp.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@role_required('admin')
+def get_profile(profile_id):
+    """
+    One profiled request: its details, SQL trace and the top functions
+    (`sort=cumulative|tottime|ncalls`, `limit`). `format=prof` downloads the
+    raw pstats file instead.
+    """
+    details = request_profiler.load(profile_id)
+    if details is None:
+        return jsonify(msg="Profile not found"), 404
+    if request.args.get('format') == 'prof':
+        return send_from_directory(request_profiler.directory, profile_id + '.prof',
+                                   mimetype='application/octet-stream', as_attachment=True)
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        return jsonify(msg="sort must be one of cumulative, tottime, ncalls"), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 40)), 1), 500)
+    except ValueError:
+        return jsonify(msg="limit must be an integer"), 400
+    details['functions'] = request_profiler.summary(profile_id, sort=sort, limit=limit)
+    return jsonify(details)
+
+@admin_bp.route('/api/admin/allocator', methods=['GET'])
+@role_required('admin')
+def allocator_status():
+    """Compare this worker's in-memory free-spot sets with parking_spots."""
+    if not spot_allocator.ready:
+        return jsonify(ready=False, stats=spot_allocator.stats, mismatches={})
+    mismatches = spot_allocator.check()
+    return jsonify(
+        ready=True,
+        stats=spot_allocator.stats,
+        mismatches={str(lot_id): diff for lot_id, diff in mismatches.items()}
+    )
+
+@admin_bp.route('/api/admin/allocator/rebuild', methods=['POST'])
+@role_required('admin')
+def allocator_rebuild():
+    # A disabled allocator must stay off: once ready, bookings would use it
+    if not current_app.config.get('SPOT_ALLOCATOR_ENABLED', True):
+        return jsonify(msg="Spot allocator is disabled (SPOT_ALLOCATOR_ENABLED)", stats=spot_allocator.stats), 409
+    spot_allocator.rebuild()
+    return jsonify(msg="Allocator rebuilt from parking_spots", stats=spot_allocator.stats), 200
@@ -6,7 +6,8 @@ from flask_jwt_extended import (
     get_jwt
 )
 from ..extensions import db
-from ..models import User, Admin
+from ..caching import invalidate, USER_LIST
+from ..models import User, Admin, DashboardSnapshot
 from .decorators import role_required
 
 auth_bp = Blueprint('auth', __name__)
@@ -27,7 +28,9 @@ def register():
     u = User(email=email, full_name=full_name)
     u.set_password(password)
     db.session.add(u)
+    DashboardSnapshot.adjust(users=1)
     db.session.commit()
+    invalidate(USER_LIST)
 
     return jsonify(msg="user registered"), 201
 
@@ -44,6 +47,8 @@ def login():
         return jsonify(msg="bad credentials"), 401
     if not user.is_active:
         return jsonify(msg="Your account has been blocked by the admin. Please contact support."), 403
+    if db.session.is_modified(user):
+        db.session.commit()  # password hash upgraded by check_password
 
     additional_claims = {"role": "user"}
     access_token = create_access_token(identity=str(user.id), additional_claims=additional_claims)
@@ -60,6 +65,8 @@ def admin_login():
     admin = Admin.query.filter_by(username=username).first()
     if not admin or not admin.check_password(password):
         return jsonify(msg="bad credentials"), 401
+    if db.session.is_modified(admin):
+        db.session.commit()  # password hash upgraded by check_password
 
     claims = {"role": "admin"}
     token = create_access_token(identity=str(admin.id), additional_claims=claims)
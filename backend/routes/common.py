@@ -1,15 +1,17 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, current_app
 from ..models import ParkingLot
-from ..extensions import db, cache
-from flask_jwt_extended import jwt_required
+from ..extensions import db
+from ..caching import cached_view, LOT_LIST
+from ..live import lot_availability
+from flask_jwt_extended import jwt_required, get_jwt, verify_jwt_in_request
 
 common_bp = Blueprint('common', __name__)
 
 @common_bp.route('/api/lots', methods=['GET'])
-# @cache.cached(timeout=60)  # Cache available lots for 1 minute
 @jwt_required()
+@cached_view(lambda: [LOT_LIST], timeout=300, etag=True)
 def get_all_lots():
-    lots = ParkingLot.query.all()
+    lots = ParkingLot.active().all()
     return jsonify([
         {
             "id": lot.id,
@@ -21,3 +23,53 @@ def get_all_lots():
         }
         for lot in lots
     ])
+
+@common_bp.route('/api/lots/availability/stream', methods=['GET'])
+def availability_stream():
+    """
+    Server-sent events with the spot counts of every active lot: one
+    'snapshot' event on connect, then one message per lot whenever a
+    booking, release or lot edit changes them ({"lot_id", "number_of_spots",
+    "available_spots", "occupied_spots"}, or {"lot_id", "closed": true}).
+    A {"resync": true} message means updates were lost; reload the lots.
+    EventSource can't send headers, so the access token comes as ?jwt=.
+    A process with AVAILABILITY_MAX_STREAMS streams open answers 503 with
+    Retry-After; poll GET /api/lots (or the dashboard) until then.
+    """
+    verify_jwt_in_request(locations=['query_string'])
+    if get_jwt().get("role") not in ('user', 'admin'):
+        return jsonify(msg="Forbidden: insufficient privileges"), 403
+
+    # Subscribe before reading the snapshot so no change falls in between
+    broker = lot_availability.broker
+    subscription = broker.subscribe(current_app.config.get('AVAILABILITY_MAX_STREAMS'))
+    if subscription is None:
+        # Each stream holds a request thread; more would starve ordinary requests
+        retry_after = current_app.config.get('AVAILABILITY_RETRY_AFTER', 30)
+        response = jsonify(msg="Too many live streams; poll for updates instead", retry_after=retry_after)
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 503
+    try:
+        snapshot = lot_availability.snapshot()
+    except Exception:
+        broker.unsubscribe(subscription)
+        raise
+    heartbeat = current_app.config.get('AVAILABILITY_HEARTBEAT', 15)
+
+    def stream():
+        try:
+            yield f"retry: 3000\nevent: snapshot\ndata: {snapshot}\n\n"
+            while True:
+                events = subscription.get(heartbeat)
+                if not events:
+                    # Keeps proxies from closing the connection and notices closed clients
+                    yield ": keepalive\n\n"
+                for data in events:
+                    yield f"data: {data}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return current_app.response_class(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -1,18 +1,34 @@
-from flask_jwt_extended import jwt_required, get_jwt
+from flask_jwt_extended import decode_token, get_jwt, get_unverified_jwt_headers, verify_jwt_in_request
+from flask_jwt_extended.internal_utils import verify_token_not_blocklisted, verify_token_type
 from functools import wraps
 from flask import jsonify
 
+def token_role(encoded_token=None):
+    """
+    The "role" claim of the request's access token, checked as
+    jwt_required checks it (signature, expiry, type and the revocation
+    set), or of `encoded_token` when one is given. Raises the
+    flask_jwt_extended error for a missing, invalid or revoked token.
+    """
+    if encoded_token is None:
+        verify_jwt_in_request()
+        return get_jwt().get("role")
+    claims = decode_token(encoded_token)
+    verify_token_type(claims, refresh=False)
+    verify_token_not_blocklisted(get_unverified_jwt_headers(encoded_token), claims)
+    return claims.get("role")
+
 def role_required(required_role):
     """
     Decorator to protect endpoints so that only tokens
     with JWT claim "role" == required_role may access.
+    Tokens of blocked users are rejected by token_role
+    through the revocation set (backend/revocation.py).
     """
     def wrapper_fn(fn):
         @wraps(fn)
-        @jwt_required()
         def decorator(*args, **kwargs):
-            claims = get_jwt()
-            if claims.get("role") != required_role:
+            if token_role() != required_role:
                 return jsonify(msg="Forbidden: insufficient privileges"), 403
             return fn(*args, **kwargs)
         return decorator
@@ -1,17 +1,27 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity
-from ..models import ParkingLot, ParkingSpot, Reservation, User
-from ..extensions import db, cache
+from flask import Blueprint, request, jsonify, send_from_directory
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from ..models import ParkingLot, ParkingSpot, Reservation, User, UserMonthlyStats
+from ..extensions import db
+from ..caching import (cached_view, invalidate, lot_ns, user_ns,
+                       LOT_LIST, LOT_AVAILABILITY, DASHBOARD)
 from .decorators import role_required
+from ..routing import read_only
+from ..booking import open_reservation, close_reservation, release_claim, SpotClaimConflict
+from ..allocator import spot_allocator
+from ..live import lot_availability
+from ..rollups import recent_months
+from ..exports import export_dir, export_owner, list_exports, verify_export_token
+from ..pagination import BadPageRequest, date_arg, decode_cursor, keyset_page, page_limit
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/api/user/lots', methods=['GET'])
 @role_required('user')
+@cached_view(lambda: [LOT_LIST, LOT_AVAILABILITY], timeout=60, etag=True)
 def get_lots():
-    lots = ParkingLot.query.all()
+    lots = ParkingLot.active().all()
     return jsonify([
         {
             "id": lot.id,
@@ -19,7 +29,7 @@ def get_lots():
             "address": lot.address,
             "pin_code": lot.pin_code,
             "price_per_hour": lot.price_per_hour,
-            "available_spots": len([s for s in lot.spots if s.status == 'A'])
+            "available_spots": lot.available_spots
         }
         for lot in lots
     ])
@@ -28,53 +38,105 @@ def get_lots():
 @role_required('user')
 def reserve_api(lot_id):
     user_id = int(get_jwt_identity())
-    spot = ParkingSpot.query.filter_by(lot_id=lot_id, status='A').first()
-    if not spot:
+    try:
+        reservation = open_reservation(user_id, lot_id)
+    except SpotClaimConflict:
+        db.session.rollback()
+        return jsonify(msg="Lot is busy, please try again"), 409
+    if not reservation:
         return jsonify(msg="No available spots"), 404
 
-    spot.status = 'O'
-    reservation = Reservation(user_id=user_id, spot_id=spot.id)
-    db.session.add(reservation)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except Exception:
+        release_claim(lot_id, reservation.spot_id)
+        raise
+    invalidate(LOT_AVAILABILITY, DASHBOARD, lot_ns(lot_id), user_ns(user_id))
+    lot_availability.publish(lot_id)
     return jsonify(msg="Reserved", reservation_id=reservation.id), 200
 
 @user_bp.route('/api/user/release/<int:res_id>', methods=['POST'])
 @role_required('user')
 def release(res_id):
     res = Reservation.query.get_or_404(res_id)
-    if res.leaving_timestamp:
+    if res.leaving_timestamp or not close_reservation(res):
+        db.session.rollback()
         return jsonify(msg="Already released"), 400
-
-    res.leaving_timestamp = datetime.utcnow()
-    res.spot.status = 'A'
-
-    duration_hours = (res.leaving_timestamp - res.parking_timestamp).total_seconds() / 3600
-    rate = res.spot.lot.price_per_hour
-    
-    # Minimum billing: 1 hour, then charge for actual time if more than 1 hour
-    billable_hours = max(1.0, duration_hours)
-    res.parking_cost = round(billable_hours * rate, 2)
+    lot_id, spot_id = res.spot.lot_id, res.spot_id
 
     db.session.commit()
+    spot_allocator.free(lot_id, spot_id)
+    invalidate(LOT_AVAILABILITY, DASHBOARD, lot_ns(lot_id), user_ns(res.user_id))
+    lot_availability.publish(lot_id)
     return jsonify(msg="Spot released", cost=res.parking_cost), 200
 
 @user_bp.route('/api/user/reservations', methods=['GET'])
 @role_required('user')
+@cached_view(lambda: [user_ns(get_jwt_identity()), LOT_LIST], timeout=60, etag=True)
 def history():
+    """
+    Parking history, newest first, one page at a time. Query args: limit,
+    cursor (next_cursor of the previous page), from/to (YYYY-MM-DD, on the
+    parking time), status (active|completed) and lot_id.
+    """
     user_id = int(get_jwt_identity())
-    reservations = Reservation.query.filter_by(user_id=user_id).all()
-    return jsonify([
-        {
-            "id": res.id,
-            "spot_id": res.spot_id,
-            "lot": res.spot.lot.prime_location_name,
-            "start": res.parking_timestamp.strftime("%Y-%m-%d %H:%M"),
-            "end": res.leaving_timestamp.strftime("%Y-%m-%d %H:%M") if res.leaving_timestamp else None,
-            "cost": res.parking_cost,
-            "status": "Active" if not res.leaving_timestamp else "Completed"
-        }
-        for res in reservations
-    ])
+    try:
+        limit = page_limit()
+        date_from, date_to = date_arg('from'), date_arg('to')
+        status = request.args.get('status')
+        if status not in (None, 'active', 'completed'):
+            raise BadPageRequest("status must be 'active' or 'completed'")
+        lot_id = request.args.get('lot_id', type=int)
+
+        query = db.session.query(
+            Reservation.id,
+            Reservation.spot_id,
+            ParkingLot.prime_location_name,
+            Reservation.parking_timestamp,
+            Reservation.leaving_timestamp,
+            Reservation.parking_cost
+        ).join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+         .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)\
+         .filter(Reservation.user_id == user_id)
+
+        if date_from:
+            query = query.filter(Reservation.parking_timestamp >= date_from)
+        if date_to:
+            query = query.filter(Reservation.parking_timestamp < date_to + timedelta(days=1))
+        if status == 'active':
+            query = query.filter(Reservation.leaving_timestamp.is_(None))
+        elif status == 'completed':
+            query = query.filter(Reservation.leaving_timestamp.isnot(None))
+        if lot_id:
+            query = query.filter(ParkingSpot.lot_id == lot_id)
+
+        if 'cursor' in request.args:
+            cursor_ts, cursor_id = decode_cursor(request.args['cursor'])
+            query = query.filter(tuple_(Reservation.parking_timestamp, Reservation.id)
+                                 < (datetime.fromisoformat(cursor_ts), cursor_id))
+    except BadPageRequest as e:
+        return jsonify(msg=str(e)), 400
+    except (ValueError, TypeError):
+        # A cursor that decodes but doesn't hold the expected values
+        return jsonify(msg="Invalid cursor"), 400
+
+    query = query.order_by(Reservation.parking_timestamp.desc(), Reservation.id.desc())
+    reservations, next_cursor = keyset_page(query, limit, lambda res: (res.parking_timestamp, res.id))
+    return jsonify({
+        "items": [
+            {
+                "id": res.id,
+                "spot_id": res.spot_id,
+                "lot": res.prime_location_name,
+                "start": res.parking_timestamp.strftime("%Y-%m-%d %H:%M"),
+                "end": res.leaving_timestamp.strftime("%Y-%m-%d %H:%M") if res.leaving_timestamp else None,
+                "cost": res.parking_cost,
+                "status": "Active" if not res.leaving_timestamp else "Completed"
+            }
+            for res in reservations
+        ],
+        "next_cursor": next_cursor
+    })
 
 @user_bp.route('/api/user/active-reservations', methods=['GET'])
 @role_required('user')
@@ -106,38 +168,64 @@ def trigger_csv_export():
     task = export_user_csv.delay(user_id)
     return jsonify(msg="CSV export started", task_id=task.id), 200
 
+@user_bp.route('/api/user/exports', methods=['GET'])
+@role_required('user')
+def my_exports():
+    user_id = int(get_jwt_identity())
+    return jsonify([
+        {"name": name, "url": f"/api/user/exports/{name}"}
+        for name in list_exports(user_id)
+    ])
+
+@user_bp.route('/api/user/exports/<filename>', methods=['GET'])
+def download_export(filename):
+    """
+    Serve a finished export. Accepts either the owner's JWT or the signed
+    ?token= from the export email; Range and conditional requests are honoured.
+    """
+    owner = export_owner(filename)
+    if owner is None:
+        return jsonify(msg="Export not found"), 404
+
+    token = request.args.get('token')
+    if token:
+        if not verify_export_token(token, filename):
+            return jsonify(msg="Download link is invalid or has expired"), 403
+    else:
+        verify_jwt_in_request()
+        if get_jwt().get("role") != 'user' or int(get_jwt_identity()) != owner:
+            return jsonify(msg="Forbidden: insufficient privileges"), 403
+
+    return send_from_directory(
+        export_dir(), filename,
+        mimetype='application/gzip',
+        as_attachment=True,
+        conditional=True,
+        max_age=0
+    )
+
 @user_bp.route('/api/user/stats', methods=['GET'])
 @role_required('user')
+@read_only
 def user_stats():
     user_id = int(get_jwt_identity())
     try:
-        # General Stats
-        total_reservations = Reservation.query.filter_by(user_id=user_id).count()
-        completed_reservations = Reservation.query.filter_by(user_id=user_id).filter(Reservation.leaving_timestamp.isnot(None)).count()
+        # General stats and monthly spend come from the user's monthly rollup rows
+        rollups = UserMonthlyStats.query.filter_by(user_id=user_id).all()
+        total_reservations = sum(row.reservation_count for row in rollups)
+        completed_reservations = sum(row.completed_count for row in rollups)
         active_reservations = total_reservations - completed_reservations
-        total_cost = db.session.query(func.sum(Reservation.parking_cost)).filter_by(user_id=user_id).scalar() or 0
-
-        # Monthly spending data for the last 6 months
-        from datetime import datetime, timedelta
-        from sqlalchemy import extract
-        
-        monthly_spending = []
-        current_date = datetime.now()
-        
-        for i in range(6):
-            # Calculate the month and year for each of the last 6 months
-            month_date = current_date - timedelta(days=30 * i)
-            month_cost = db.session.query(func.sum(Reservation.parking_cost)).filter(
-                Reservation.user_id == user_id,
-                extract('month', Reservation.leaving_timestamp) == month_date.month,
-                extract('year', Reservation.leaving_timestamp) == month_date.year,
-                Reservation.leaving_timestamp.isnot(None)
-            ).scalar() or 0
-            
-            monthly_spending.insert(0, {
-                "month": month_date.strftime("%b %Y"),
-                "amount": float(month_cost)
-            })
+        total_cost = sum(row.total_spent for row in rollups)
+
+        # Monthly spending data for the last 6 calendar months
+        spent_by_month = {(row.year, row.month): row.total_spent for row in rollups}
+        monthly_spending = [
+            {
+                "month": datetime(year, month, 1).strftime("%b %Y"),
+                "amount": float(spent_by_month.get((year, month), 0))
+            }
+            for year, month in recent_months(datetime.utcnow(), 6)
+        ]
 
         # Most used parking lots
         lot_usage = db.session.query(
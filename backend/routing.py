@@ -0,0 +1,96 @@
+import os
+from functools import wraps
+from urllib.parse import quote
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+
+class RoutingSession(Session):
+    """
+    db.session class that sends the statements of views and tasks marked
+    @read_only to the read engine. ORM flushes still go to the primary;
+    UPDATE/DELETE statements executed directly do not, and fail on the
+    query_only SQLite read connections.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('read_only'):
+            engine = current_app.extensions['read_routing'].engine
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(fn):
+    """Run a view or task on the read engine (see ReadRouting)."""
+    @wraps(fn)
+    def decorator(*args, **kwargs):
+        if not has_app_context():
+            return fn(*args, **kwargs)
+        previous = g.get('read_only', False)
+        g.read_only = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            g.read_only = previous
+    return decorator
+
+
+class _RoutingState:
+    def __init__(self, engine=None, uri=None):
+        self.engine = engine
+        self.uri = uri
+
+
+def sqlite_read_uri(uri):
+    """Read-only URI for a SQLite file database, or None for anything else."""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    path = quote(os.path.abspath(url.database))
+    return f'sqlite:///file:{path}?mode=ro&uri=true'
+
+
+class ReadRouting:
+    """
+    Owns the engine behind @read_only. SQLALCHEMY_READ_DATABASE_URI names it
+    explicitly (a replica, say); otherwise a SQLite file database gets a
+    separate pool of read-only connections to the same file, which under
+    WAL never block or wait for the writer. Any other database without a
+    read URI keeps everything on the primary engine.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = _RoutingState()
+        app.extensions['read_routing'] = state
+        if not app.config.get('READ_ROUTING_ENABLED', True):
+            return
+
+        primary = app.config['SQLALCHEMY_DATABASE_URI']
+        uri = app.config.get('SQLALCHEMY_READ_DATABASE_URI') or sqlite_read_uri(primary)
+        if uri is None:
+            return
+
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        state.engine = create_engine(uri, **options)
+        state.uri = uri
+        if state.engine.dialect.name == 'sqlite':
+            from .sqlite_profile import listen_pragmas
+            profile = app.config.get('SQLITE_PROFILES', {}).get(app.config.get('SQLITE_PROFILE'), {})
+            # journal_mode is a property of the file and can't be set from a read-only connection
+            pragmas = {k: v for k, v in profile.get('pragmas', {}).items() if k != 'journal_mode'}
+            pragmas['query_only'] = 1
+            listen_pragmas(state.engine, pragmas)
+
+    @property
+    def engine(self):
+        return current_app.extensions['read_routing'].engine
+
+
+read_routing = ReadRouting()
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from .extensions import db
+
+
+def _sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def configure_sqlite_profile(app):
+    """
+    Select the SQLITE_PROFILES entry named by SQLITE_PROFILE and merge its
+    engine options (pool sizing, connect args) under SQLALCHEMY_ENGINE_OPTIONS;
+    options set there explicitly win. Call before db.init_app. Returns the
+    profile, or None when the database isn't a SQLite file.
+    """
+    if not _sqlite_file(app.config['SQLALCHEMY_DATABASE_URI']):
+        return None
+    name = app.config.get('SQLITE_PROFILE', 'default')
+    try:
+        profile = app.config['SQLITE_PROFILES'][name]
+    except KeyError:
+        raise ValueError(f"Unknown SQLITE_PROFILE {name!r}; expected one of {sorted(app.config['SQLITE_PROFILES'])}")
+
+    explicit = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options = {**profile.get('engine_options', {}), **explicit}
+    connect_args = {**profile.get('engine_options', {}).get('connect_args', {}), **explicit.get('connect_args', {})}
+    if connect_args:
+        options['connect_args'] = connect_args
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    return profile
+
+
+def listen_pragmas(engine, pragmas):
+    """Run `pragmas` (a name -> value dict) on every new connection of `engine`."""
+    pragmas = list(pragmas.items())
+    if not pragmas:
+        return
+
+    def apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    event.listen(engine, 'connect', apply)
+
+
+def install_sqlite_pragmas(app, profile):
+    """Run the profile's PRAGMAs on every new connection of the app's engine. Call after db.init_app."""
+    with app.app_context():
+        listen_pragmas(db.engine, profile.get('pragmas', {}))
@@ -1,208 +1,284 @@
 from celery import current_task
-from .extensions import db, mail
-from .models import User, Admin, Reservation, ParkingLot, ParkingSpot
+from .extensions import db, celery
+from .models import User, Admin, Reservation, ParkingLot, ParkingSpot, LotMonthlyStats
+from .provisioning import delete_reservation_chunk, delete_spot_chunk, lot_history_size
+from .caching import invalidate, lot_ns, LOT_LIST, LOT_AVAILABILITY, DASHBOARD
+from .exports import export_token, write_user_export
+from .mailer import send_messages
+from .routing import read_only
 from datetime import datetime, timedelta
-import csv
-import io
 from flask_mail import Message
-from flask import current_app
+from flask import current_app, render_template
+from sqlalchemy.exc import OperationalError
 import requests
 
-# Import celery from app context
-from .app import celery
+# Recipients loaded per query by the reminder task
+REMINDER_BATCH_SIZE = 1000
+
+
+def iter_user_batches(query, batch_size=None):
+    """
+    Yield the rows of `query` (ordered by User.id first, with an `id` column)
+    in lists of up to `batch_size`, each loaded in full by its own keyset
+    query, so no cursor stays open while the caller works through a batch.
+    """
+    batch_size = batch_size or REMINDER_BATCH_SIZE
+    last_id = 0
+    while True:
+        batch = query.filter(User.id > last_id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
 
 @celery.task(name='backend.tasks.send_daily_reminders')
+@read_only
 def send_daily_reminders():
     """Send daily reminders to users: reservation reminder or lot suggestion"""
     try:
-        users = User.query.all()
-        for user in users:
-            active_res = Reservation.query.filter_by(user_id=user.id, leaving_timestamp=None).first()
-            if active_res:
-                # Remind about reservation
-                send_active_reservation_reminder(user.email, user.full_name, active_res)
-            else:
-                # Suggest a lot to book (pick lot with most available spots)
-                lots = ParkingLot.query.all()
-                best_lot = None
-                max_available = -1
-                for lot in lots:
-                    available = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-                    if available > max_available:
-                        max_available = available
-                        best_lot = lot
-                if best_lot:
-                    send_lot_suggestion_email(user.email, user.full_name, best_lot.prime_location_name)
-        return f"Sent daily reminders to {len(users)} users"
+        active_user = User.is_active.is_(True)
+
+        # Users with an open reservation, with the spot's lot joined in
+        reminders = db.session.query(
+            User.id, User.email, User.full_name,
+            ParkingLot.prime_location_name, Reservation.spot_id, Reservation.parking_timestamp
+        ).join(Reservation, Reservation.user_id == User.id)\
+         .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+         .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)\
+         .filter(active_user, Reservation.leaving_timestamp.is_(None))\
+         .order_by(User.id, Reservation.id)
+
+        # Everyone else gets the same suggestion, so pick the lot once per run
+        has_open_reservation = db.session.query(Reservation.id).filter(
+            Reservation.user_id == User.id,
+            Reservation.leaving_timestamp.is_(None)
+        ).exists()
+        suggestions = db.session.query(User.id, User.email, User.full_name)\
+            .filter(active_user, ~has_open_reservation)\
+            .order_by(User.id)
+        best_lot = ParkingLot.active().order_by(
+            ParkingLot.available_spots.desc(), ParkingLot.id
+        ).first()
+
+        counts = {'reminders': 0, 'suggestions': 0}
+
+        def reminder_messages():
+            # Recipients come in fully loaded batches: a cursor left open over
+            # the SMTP run would keep SQLite writers locked out (or stall WAL
+            # checkpoints) until the last mail was sent
+            last_user_id = None
+            for batch in iter_user_batches(reminders):
+                for row in batch:
+                    # One reminder per user, for their oldest open reservation
+                    if row.id == last_user_id:
+                        continue
+                    last_user_id = row.id
+                    counts['reminders'] += 1
+                    yield active_reservation_reminder_message(
+                        row.email, row.full_name, row.prime_location_name, row.spot_id, row.parking_timestamp
+                    )
+            if best_lot:
+                for batch in iter_user_batches(suggestions):
+                    for row in batch:
+                        counts['suggestions'] += 1
+                        yield lot_suggestion_message(row.email, row.full_name, best_lot.prime_location_name)
+
+        report = send_messages(reminder_messages())
+        return (f"Sent daily reminders to {counts['reminders'] + counts['suggestions']} users "
+                f"({counts['reminders']} reservation reminders, {counts['suggestions']} lot suggestions): {report}")
     except Exception as e:
         return f"Error sending reminders: {str(e)}"
 
 @celery.task(name='backend.tasks.send_monthly_reports')
+@read_only
 def send_monthly_reports():
     """Send monthly activity summary to all admins"""
     try:
         admins = Admin.query.all()
         current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        lots = ParkingLot.query.all()
-        # Gather stats per lot
+        # One rollup row per lot, so the cost doesn't depend on the reservation history
         lot_stats = []
-        for lot in lots:
-            reservations = Reservation.query.join(ParkingSpot).filter(
-                ParkingSpot.lot_id == lot.id,
-                Reservation.parking_timestamp >= current_month
-            ).all()
-            total_res = len(reservations)
-            total_rev = sum(r.parking_cost or 0 for r in reservations)
-            occupied = ParkingSpot.query.filter_by(lot_id=lot.id, status='O').count()
-            available = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
+        for lot, stats in LotMonthlyStats.for_month(current_month.year, current_month.month):
             lot_stats.append({
                 'name': lot.prime_location_name,
-                'total_reservations': total_res,
-                'total_revenue': total_rev,
-                'occupied_spots': occupied,
-                'available_spots': available
+                'total_reservations': stats.reservation_count if stats else 0,
+                'total_revenue': stats.revenue if stats else 0.0,
+                'peak_occupied': stats.peak_occupied if stats else 0,
+                'occupied_spots': lot.occupied_spots,
+                'available_spots': lot.available_spots
             })
         # Generate HTML report
         report_html = generate_admin_monthly_report(lot_stats, current_month)
-        for admin in admins:
-            send_monthly_report_email(admin.username, admin.username, report_html)
-        return f"Sent monthly report to {len(admins)} admin(s)"
+        report = send_messages(
+            monthly_report_message(admin.username, admin.username, report_html) for admin in admins
+        )
+        return f"Sent monthly report to {len(admins)} admin(s): {report}"
     except Exception as e:
         return f"Error sending monthly reports: {str(e)}"
 
 @celery.task
+@read_only
 def export_user_csv(user_id):
-    """Export user's parking history as CSV"""
+    """
+    Export user's parking history as a compressed CSV and email a download
+    link. Errors, an undelivered email included, are raised so the task ends
+    in FAILURE; a written file still shows up under /api/user/exports.
+    """
     try:
         user = User.query.get(user_id)
         if not user:
             return "User not found"
-            
-        reservations = Reservation.query.filter_by(user_id=user_id).all()
-        
-        # Create CSV content
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Reservation ID', 'Spot ID', 'Lot Name', 'Parking Time', 'Leaving Time', 'Cost', 'Duration (hours)'])
-        
-        for res in reservations:
-            duration = 0
-            if res.leaving_timestamp:
-                duration = (res.leaving_timestamp - res.parking_timestamp).total_seconds() / 3600
-                
-            writer.writerow([
-                res.id,
-                res.spot_id,
-                res.spot.lot.prime_location_name,
-                res.parking_timestamp.strftime("%Y-%m-%d %H:%M"),
-                res.leaving_timestamp.strftime("%Y-%m-%d %H:%M") if res.leaving_timestamp else "Active",
-                res.parking_cost or 0,
-                round(duration, 2)
-            ])
-        
-        csv_content = output.getvalue()
-        output.close()
-        
-        # Send CSV via email
-        send_csv_email(user.email, user.full_name, csv_content)
-        
-        return f"CSV exported for user {user.email}"
-    except Exception as e:
-        return f"Error exporting CSV: {str(e)}"
+        email, name = user.email, user.full_name
 
-def send_active_reservation_reminder(email, name, reservation):
-    """Send reminder email to user with active reservation details"""
-    try:
-        msg = Message(
-            "ParkBuddy - Reservation Reminder",
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[email]
+        filename = write_user_export(user_id)
+        link = "{}/api/user/exports/{}?token={}".format(
+            current_app.config['PUBLIC_BASE_URL'].rstrip('/'), filename, export_token(filename)
         )
-        msg.body = f"""
-        Hi {name},
-        
-        This is a reminder that you have an active parking reservation:
-        Lot: {reservation.spot.lot.prime_location_name}
-        Spot ID: {reservation.spot_id}
-        Parked At: {reservation.parking_timestamp.strftime('%Y-%m-%d %H:%M')}
-        
-        Have a great day!
-        ParkBuddy Team
-        """
-        mail.send(msg)
-    except Exception as e:
-        print(f"Error sending reservation reminder email: {e}")
+        send_csv_email(email, name, link)
 
-def send_lot_suggestion_email(email, name, lot_name):
-    """Suggest a lot to book to user"""
-    try:
-        msg = Message(
-            "ParkBuddy - Book a Spot!",
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[email]
-        )
-        msg.body = f"""
-        Hi {name},
-        
-        Looking for parking? We recommend booking a spot at our {lot_name} lot, which currently has the most availability!
-        
-        See you soon,
-        ParkBuddy Team
-        """
-        mail.send(msg)
-    except Exception as e:
-        print(f"Error sending lot suggestion email: {e}")
+        return f"CSV exported for user {email}"
+    except Exception:
+        current_app.logger.exception("CSV export for user %s failed", user_id)
+        raise
 
-def send_monthly_report_email(email, name, report_html):
-    """Send monthly report email to admin"""
-    try:
-        msg = Message(
-            "ParkBuddy - Monthly Lot Activity Summary",
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[email]
-        )
-        msg.html = report_html
-        mail.send(msg)
-    except Exception as e:
-        print(f"Error sending monthly report email: {e}")
+# Every chunk commits on its own and a rerun picks up what is left, so the task
+# can be retried after a locked or lost database (OperationalError) and its
+# message is only acknowledged once it finished (a crashed worker's run is redelivered)
+@celery.task(bind=True, name='backend.tasks.delete_lot', acks_late=True, reject_on_worker_lost=True,
+             autoretry_for=(OperationalError,), retry_backoff=5, retry_backoff_max=300,
+             retry_kwargs={'max_retries': 8})
+def delete_lot(self, lot_id):
+    """Delete a lot queued for deletion, its reservations and spots in bounded chunks"""
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is None:
+        return {'lot_id': lot_id, 'msg': "Lot already deleted"}
+    if lot.is_active:
+        return {'lot_id': lot_id, 'msg': "Lot is active; it must be queued for deletion first"}
+
+    chunk_size = current_app.config['LOT_DELETE_CHUNK_SIZE']
+    reservations, spots = lot_history_size(lot_id)
+    progress = {
+        'lot_id': lot_id,
+        'reservations_total': reservations,
+        'reservations_deleted': 0,
+        'spots_total': spots,
+        'spots_deleted': 0
+    }
+
+    def report():
+        # Only a queued task has a result to update; a direct call has no id
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta=progress)
 
-def send_csv_email(email, name, csv_content):
-    """Send CSV export email to user"""
     try:
-        msg = Message(
-            "ParkBuddy - Your Parking History Export",
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[email]
-        )
-        msg.body = f"""
-        Hi {name},
-        
-        Please find your parking history export attached.
-        
-        Best regards,
-        ParkBuddy Team
-        """
-        msg.attach("parking_history.csv", "text/csv", csv_content)
-        mail.send(msg)
-    except Exception as e:
-        print(f"Error sending CSV email: {e}")
+        # Each chunk is its own short transaction so bookings elsewhere aren't blocked
+        while True:
+            deleted = delete_reservation_chunk(lot_id, chunk_size)
+            db.session.commit()
+            if not deleted:
+                break
+            progress['reservations_deleted'] += deleted
+            report()
 
-def generate_admin_monthly_report(lot_stats, current_month):
-    """Generate HTML summary report for all lots for admins"""
-    html = f"""
-    <html>
-    <body>
-        <h2>ParkBuddy Monthly Lot Activity Summary</h2>
-        <p>Report for: {current_month.strftime('%B %Y')}</p>
-        <table border='1' cellpadding='5' cellspacing='0'>
-            <tr><th>Lot Name</th><th>Total Reservations</th><th>Total Revenue</th><th>Occupied Spots</th><th>Available Spots</th></tr>
+        while True:
+            deleted = delete_spot_chunk(lot_id, chunk_size)
+            db.session.commit()
+            if not deleted:
+                break
+            progress['spots_deleted'] += deleted
+            report()
+
+        LotMonthlyStats.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
+        db.session.delete(lot)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    invalidate(LOT_LIST, DASHBOARD, LOT_AVAILABILITY, lot_ns(lot_id))
+    progress['msg'] = "Lot and all associated data deleted successfully"
+    return progress
+
+def active_reservation_reminder_message(email, name, lot_name, spot_id, parked_at):
+    """Reminder email for a user with an active reservation"""
+    msg = Message(
+        "ParkBuddy - Reservation Reminder",
+        sender=current_app.config['MAIL_USERNAME'],
+        recipients=[email]
+    )
+    msg.body = f"""
+    Hi {name},
+    
+    This is a reminder that you have an active parking reservation:
+    Lot: {lot_name}
+    Spot ID: {spot_id}
+    Parked At: {parked_at.strftime('%Y-%m-%d %H:%M')}
+    
+    Have a great day!
+    ParkBuddy Team
+    """
+    return msg
+
+def lot_suggestion_message(email, name, lot_name):
+    """Email suggesting a lot to book"""
+    msg = Message(
+        "ParkBuddy - Book a Spot!",
+        sender=current_app.config['MAIL_USERNAME'],
+        recipients=[email]
+    )
+    msg.body = f"""
+    Hi {name},
+    
+    Looking for parking? We recommend booking a spot at our {lot_name} lot, which currently has the most availability!
+    
+    See you soon,
+    ParkBuddy Team
     """
-    for lot in lot_stats:
-        html += f"<tr><td>{lot['name']}</td><td>{lot['total_reservations']}</td><td>₹{lot['total_revenue']:.2f}</td><td>{lot['occupied_spots']}</td><td>{lot['available_spots']}</td></tr>"
-    html += """
-        </table>
-        <p>Thank you for managing ParkBuddy!</p>
-    </body>
-    </html>
+    return msg
+
+def monthly_report_message(email, name, report_html):
+    """Monthly report email for an admin"""
+    msg = Message(
+        "ParkBuddy - Monthly Lot Activity Summary",
+        sender=current_app.config['MAIL_USERNAME'],
+        recipients=[email]
+    )
+    msg.html = report_html
+    return msg
+
+def csv_export_message(email, name, link):
+    """Email with the download link of a CSV export"""
+    msg = Message(
+        "ParkBuddy - Your Parking History Export",
+        sender=current_app.config['MAIL_USERNAME'],
+        recipients=[email]
+    )
+    msg.body = f"""
+    Hi {name},
+    
+    Your parking history export is ready. Download it here:
+    {link}
+    
+    The link expires in {current_app.config['EXPORT_LINK_MAX_AGE'] // 3600} hours.
+    
+    Best regards,
+    ParkBuddy Team
     """
-    return html
\ No newline at end of file
+    return msg
+
+def send_csv_email(email, name, link):
+    """Send CSV export download link to user; raises when it wasn't delivered"""
+    report = send_messages([csv_export_message(email, name, link)])
+    if report.failed:
+        raise RuntimeError(f"CSV export mail to {email} not delivered: {report}")
+
+def generate_admin_monthly_report(lot_stats, current_month):
+    """Generate HTML summary report for all lots for admins"""
+    return render_template(
+        'monthly_report_email.html',
+        lot_stats=lot_stats,
+        current_month=current_month,
+        total_reservations=sum(lot['total_reservations'] for lot in lot_stats),
+        total_revenue=sum(lot['total_revenue'] for lot in lot_stats)
+    )
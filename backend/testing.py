@@ -0,0 +1,71 @@
+"""
+Throwaway apps for the test suite and the benchmarks: an app on a scratch
+SQLite file with in-process cache and brokers, plus seeding and token
+helpers. Nothing here is used by the running application.
+"""
+from flask_jwt_extended import create_access_token
+from .allocator import spot_allocator
+from .app import create_app
+from .config import Config
+from .extensions import db
+from .models import User, ParkingLot, ParkingSpot, DashboardSnapshot
+
+
+def scratch_config(db_path, **overrides):
+    """Config subclass pointing at a scratch SQLite file with an in-process cache and broker."""
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}},
+        'CACHE_TYPE': 'SimpleCache',
+        'AVAILABILITY_BROKER': 'local',
+        'REVOCATION_BACKEND': 'local',
+        'TESTING': True,
+    }
+    attrs.update(overrides)
+    return type('ScratchConfig', (Config,), attrs)
+
+
+def make_app(db_path, create=False, **overrides):
+    """App on the SQLite file `db_path`; create=True (re)creates its tables and the snapshot row."""
+    if not create:
+        return create_app(scratch_config(db_path, **overrides))
+
+    # Load the spot allocator only once the tables exist
+    allocator_enabled = overrides.pop('SPOT_ALLOCATOR_ENABLED', True)
+    app = create_app(scratch_config(db_path, SPOT_ALLOCATOR_ENABLED=False, **overrides))
+    app.config['SPOT_ALLOCATOR_ENABLED'] = allocator_enabled
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(DashboardSnapshot(id=1))
+        db.session.commit()
+        if allocator_enabled:
+            spot_allocator.rebuild()
+    return app
+
+
+def seed_lot(spots, name='Bench Lot', price=10.0):
+    """Create a lot with `spots` free spots; call inside an app context."""
+    lot = ParkingLot(prime_location_name=name, price_per_hour=price, address='-', pin_code='000000',
+                     number_of_spots=spots, available_spots=spots, occupied_spots=0)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.bulk_insert_mappings(ParkingSpot, [{'lot_id': lot.id, 'status': 'A'}] * spots)
+    db.session.commit()
+    return lot.id
+
+
+def seed_users(count, prefix='bench'):
+    """Create `count` users with a dummy password hash and return their ids."""
+    db.session.bulk_insert_mappings(User, [
+        {'email': f'{prefix}{i}@example.com', 'pwd_hash': '-', 'full_name': f'Bench User {i}', 'is_active': True}
+        for i in range(count)
+    ])
+    db.session.commit()
+    return [uid for (uid,) in db.session.query(User.id).filter(User.email.like(f'{prefix}%')).order_by(User.id)]
+
+
+def auth_header(identity, role='user'):
+    """Bearer header for `identity`; call inside an app context."""
+    token = create_access_token(identity=str(identity), additional_claims={'role': role})
+    return {'Authorization': f'Bearer {token}'}
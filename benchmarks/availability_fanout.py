@@ -0,0 +1,96 @@
+"""
+Live availability fan-out benchmark. Opens N subscriptions on the in-process
+broker (as N open dashboards would in one worker), drains them from a few
+reader threads and books/releases spots through the API. Reports the SQL
+issued per booking, the delivery latency from commit to every subscriber
+and the events each subscriber received. Checks that every subscriber saw
+the final counts.
+
+    python -m benchmarks.availability_fanout --subscribers 2000 --bookings 200
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from sqlalchemy import event
+from backend.extensions import db
+from backend.live import lot_availability
+from .common import auth_header, make_app, percentile, scratch_db_path, seed_lot, seed_users
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=4, help='threads draining the subscriptions')
+    parser.add_argument('--bookings', type=int, default=200, help='reserve + release pairs')
+    args = parser.parse_args(argv)
+
+    app = make_app(scratch_db_path(), create=True, AVAILABILITY_BROKER='local')
+    client = app.test_client()
+    with app.app_context():
+        lot = seed_lot(50)
+        headers = auth_header(seed_users(1)[0])
+        broker = lot_availability.broker
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(1))
+
+    subscriptions = [broker.subscribe() for _ in range(args.subscribers)]
+    latest = [None] * args.subscribers
+    received = [0] * args.subscribers
+    delivery = []
+    sent_at = {}
+    stop = threading.Event()
+
+    def drain(indexes):
+        while not stop.is_set():
+            for i in indexes:
+                for data in subscriptions[i].get(0):
+                    received[i] += 1
+                    latest[i] = json.loads(data)
+                    stamp = sent_at.get(data)
+                    if stamp:
+                        delivery.append(time.perf_counter() - stamp)
+            time.sleep(0.01)
+
+    readers = [threading.Thread(target=drain, args=(range(r, args.subscribers, args.readers),))
+               for r in range(args.readers)]
+    for reader in readers:
+        reader.start()
+
+    # Stamp each message as it is published so readers can time delivery
+    publish = broker.publish
+
+    def stamped(data):
+        sent_at[data] = time.perf_counter()
+        publish(data)
+    broker.publish = stamped
+
+    per_booking = []
+    started = time.perf_counter()
+    for _ in range(args.bookings):
+        before = len(statements)
+        res_id = client.post(f'/api/user/reserve/{lot}', headers=headers).get_json()['reservation_id']
+        client.post(f'/api/user/release/{res_id}', headers=headers)
+        per_booking.append(len(statements) - before)
+    elapsed = time.perf_counter() - started
+    time.sleep(0.5)
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    with app.app_context():
+        final = next(row for row in json.loads(lot_availability.snapshot()) if row['lot_id'] == lot)
+    stale = sum(1 for row in latest if row != final)
+    delivery.sort()
+    print(f"{args.subscribers} subscribers, {args.bookings} reserve + release pairs in {elapsed:.2f}s")
+    print(f"  SQL per reserve + release: {sum(per_booking) / len(per_booking):.1f} (no per-subscriber queries)")
+    print(f"  events published: {broker.stats['published']}, deliveries: {broker.stats['delivered']}")
+    print(f"  events received per subscriber: min {min(received)}, max {max(received)} (coalesced when behind)")
+    print(f"  delivery latency p50 {percentile(delivery, 50) * 1000:.2f}ms  p95 {percentile(delivery, 95) * 1000:.2f}ms")
+    print("PASS" if not stale else f"FAIL: {stale} subscriber(s) missed the final counts")
+    return 1 if stale else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,18 @@
+"""
+Helpers shared by the benchmark scripts. The throwaway app, seeding and
+token helpers come from backend/testing.py, which the tests use as well.
+"""
+import os
+import tempfile
+from backend.testing import auth_header, make_app, seed_lot, seed_users
+
+
+def scratch_db_path(name='bench.db'):
+    return os.path.join(tempfile.mkdtemp(prefix='parkbuddy-bench-'), name)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
@@ -0,0 +1,233 @@
+"""
+Synthetic dataset generator. Builds a ParkBuddy database with the given
+numbers of lots, spots, users and historical reservations, writing the rows
+with plain sqlite3 executemany (secondary indexes are dropped for the load
+and rebuilt afterwards). Lot counters, the dashboard snapshot and the
+monthly rollups are then rebuilt with the same functions as
+`flask rebuild-counters` / `flask backfill-rollups`, so every endpoint sees a
+consistent database.
+
+Each spot gets a back-to-back history spread over the last --months months;
+a share of the spots (--occupied) is currently taken by an open reservation.
+Every user and the 'admin' account get the password given by --password.
+
+    python -m benchmarks.generate_data --scale large --db /tmp/parkbuddy-large.db
+    python -m benchmarks.generate_data --lots 50 --spots 20000 --users 5000 --reservations 200000
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from backend.commands import (backfill_lot_rollups, backfill_user_rollups,
+                              rebuild_dashboard_snapshot, rebuild_lot_counters)
+from backend.extensions import db
+from .common import make_app, scratch_db_path
+
+SCALES = {
+    'small': {'lots': 20, 'spots': 10_000, 'users': 2_000, 'reservations': 50_000},
+    'medium': {'lots': 200, 'spots': 100_000, 'users': 20_000, 'reservations': 1_000_000},
+    'large': {'lots': 1_000, 'spots': 500_000, 'users': 100_000, 'reservations': 5_000_000},
+}
+
+CHUNK = 50_000
+AREAS = ['Central', 'Station', 'Airport', 'Harbour', 'Market', 'Stadium', 'Campus', 'Mall', 'Park', 'Tech Park']
+
+
+def _timestamp(moment):
+    # The format SQLAlchemy's SQLite DateTime type writes and parses
+    return moment.isoformat(' ', timespec='microseconds')
+
+
+def insert_chunks(conn, sql, rows):
+    """executemany `rows` (any iterable) in chunks; returns the number written."""
+    total = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK))
+        if not chunk:
+            return total
+        conn.executemany(sql, chunk)
+        total += len(chunk)
+
+
+def lot_rows(count, rng):
+    for lot_id in range(1, count + 1):
+        area = AREAS[lot_id % len(AREAS)]
+        yield (lot_id, f'{area} Lot {lot_id}', rng.choice([10.0, 20.0, 30.0, 40.0, 50.0]),
+               f'{lot_id} {area} Road', f'{560000 + lot_id % 1000:06d}')
+
+
+def spot_layout(lots, spots):
+    """[(lot_id, first_spot_id, spot_count)]: spots split as evenly as possible, contiguous ids per lot."""
+    layout, next_id = [], 1
+    for lot_id in range(1, lots + 1):
+        count = spots // lots + (1 if lot_id <= spots % lots else 0)
+        layout.append((lot_id, next_id, count))
+        next_id += count
+    return layout
+
+
+def user_rows(count, pwd_hash, blocked_share, rng):
+    for user_id in range(1, count + 1):
+        yield (user_id, f'user{user_id}@example.com', pwd_hash, f'User {user_id}', rng.random() >= blocked_share)
+
+
+def reservation_rows(layout, prices, occupied_spots, reservations, users, months, rng):
+    """
+    Back-to-back history per spot. A spot in `occupied_spots` ends with an
+    open reservation that started in the last few hours.
+    """
+    now = datetime.utcnow()
+    start = now - timedelta(days=30 * months)
+    span = (now - start).total_seconds()
+    spots = sum(count for _, _, count in layout)
+    per_spot, extra = divmod(reservations, spots)
+    res_id = 0
+    for lot_id, first_spot, count in layout:
+        rate = prices[lot_id]
+        for spot_id in range(first_spot, first_spot + count):
+            n = per_spot + (1 if spot_id <= extra else 0)
+            if not n:
+                continue
+            is_open = spot_id in occupied_spots
+            # Leave the last few hours free for the open reservation
+            slot = (span - 12 * 3600) / n
+            for i in range(n):
+                res_id += 1
+                user_id = rng.randint(1, users)
+                if is_open and i == n - 1:
+                    parked = now - timedelta(seconds=rng.uniform(600, 8 * 3600))
+                    yield (res_id, spot_id, user_id, _timestamp(parked), None, None)
+                    continue
+                offset = i * slot + rng.uniform(0, slot * 0.3)
+                hours = rng.uniform(0.25, min(12.0, slot * 0.6 / 3600))
+                parked = start + timedelta(seconds=offset)
+                left = parked + timedelta(hours=hours)
+                cost = round(max(1.0, hours) * rate, 2)
+                yield (res_id, spot_id, user_id, _timestamp(parked), _timestamp(left), cost)
+
+
+def generate(db_path, lots, spots, users, reservations, months=12, occupied=0.3, blocked=0.02,
+             password='password', seed=1, log=print):
+    """Build the dataset at `db_path` (replacing any file there). Returns a dict of row counts."""
+    if spots < lots:
+        raise ValueError('need at least one spot per lot')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    rng = random.Random(seed)
+    app = make_app(db_path, create=True, SPOT_ALLOCATOR_ENABLED=False, CACHE_TYPE='NullCache')
+    with app.app_context():
+        db.engine.dispose()
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-262144')
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+    # Secondary indexes are cheaper to build once over the full tables
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX {name}')
+
+    conn.execute('BEGIN')
+    pwd_hash = generate_password_hash(password)
+    conn.execute('INSERT INTO admins (username, pwd_hash) VALUES (?, ?)', ('admin', pwd_hash))
+
+    lot_data = list(lot_rows(lots, rng))
+    prices = {row[0]: row[2] for row in lot_data}
+    insert_chunks(conn, 'INSERT INTO parking_lots (id, prime_location_name, price_per_hour, address, pin_code, '
+                        'number_of_spots, available_spots, occupied_spots, total_reservations, is_active) '
+                        'VALUES (?, ?, ?, ?, ?, 0, 0, 0, 0, 1)', lot_data)
+    layout = spot_layout(lots, spots)
+    conn.executemany('UPDATE parking_lots SET number_of_spots = ? WHERE id = ?',
+                     [(count, lot_id) for lot_id, _, count in layout])
+
+    # Only spots with some history (the first `reservations` ids when there are fewer) can be taken
+    occupied_spots = set()
+    if users and reservations:
+        with_history = min(spots, reservations)
+        occupied_spots = set(rng.sample(range(1, with_history + 1), min(with_history, int(spots * occupied))))
+    insert_chunks(conn, 'INSERT INTO parking_spots (id, lot_id, status) VALUES (?, ?, ?)', (
+        (spot_id, lot_id, 'O' if spot_id in occupied_spots else 'A')
+        for lot_id, first, count in layout
+        for spot_id in range(first, first + count)
+    ))
+    log(f'  {lots} lots, {spots} spots ({time.perf_counter() - started:.1f}s)')
+
+    insert_chunks(conn, 'INSERT INTO users (id, email, pwd_hash, full_name, is_active) VALUES (?, ?, ?, ?, ?)',
+                  user_rows(users, pwd_hash, blocked, rng))
+    log(f'  {users} users ({time.perf_counter() - started:.1f}s)')
+
+    written = 0
+    if users and reservations:
+        written = insert_chunks(
+            conn,
+            'INSERT INTO reservations (id, spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            reservation_rows(layout, prices, occupied_spots, reservations, users, months, rng)
+        )
+    log(f'  {written} reservations ({time.perf_counter() - started:.1f}s)')
+    conn.execute('COMMIT')
+
+    for _, sql in indexes:
+        conn.execute(sql)
+    log(f'  indexes rebuilt ({time.perf_counter() - started:.1f}s)')
+    conn.close()
+
+    with app.app_context():
+        rebuild_lot_counters()
+        rebuild_dashboard_snapshot()
+        backfill_user_rollups()
+        backfill_lot_rollups()
+        db.session.remove()
+        db.engine.dispose()
+    log(f'  counters and rollups rebuilt ({time.perf_counter() - started:.1f}s)')
+    return {'lots': lots, 'spots': spots, 'users': users, 'reservations': written,
+            'occupied': len(occupied_spots) if written else 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='output database (default: a new scratch file)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--lots', type=int)
+    parser.add_argument('--spots', type=int)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--reservations', type=int)
+    parser.add_argument('--months', type=int, default=12, help='length of the reservation history')
+    parser.add_argument('--occupied', type=float, default=0.3, help='share of spots taken right now')
+    parser.add_argument('--blocked', type=float, default=0.02, help='share of blocked users')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+    db_path = os.path.abspath(args.db or scratch_db_path('dataset.db'))
+    if os.path.abspath(db_path) == os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'parkbuddy.db')):
+        parser.error('refusing to overwrite parkbuddy.db')
+
+    print(f"Generating {sizes} into {db_path}")
+    started = time.perf_counter()
+    counts = generate(db_path, months=args.months, occupied=args.occupied, blocked=args.blocked,
+                      password=args.password, seed=args.seed, **sizes)
+    print(f"Done in {time.perf_counter() - started:.1f}s: {counts}")
+    print(f"Load test it with: python -m benchmarks.load_test --db {db_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
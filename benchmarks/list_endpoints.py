@@ -0,0 +1,105 @@
+"""
+List endpoint benchmark: JSON providers and conditional GET.
+
+Seeds lots, users and parking history, then for each JSON_PROVIDER times
+full responses of the list endpoints with the response cache disabled (so
+every request queries and serializes), and checks that every provider
+returns the same documents. Finally, with the cache enabled, replays each
+request with the ETag it returned and times the 304 answers.
+
+    python -m benchmarks.list_endpoints --lots 300 --requests 200
+    python -m benchmarks.list_endpoints --providers default orjson
+"""
+import argparse
+import json
+import sys
+import time
+from .common import auth_header, make_app, percentile, scratch_db_path, seed_lot, seed_users
+
+
+def endpoints(user, admin):
+    return [
+        ('/api/lots', admin),
+        ('/api/user/lots', user),
+        ('/api/user/reservations?limit=100', user),
+        ('/api/admin/users?limit=100', admin),
+    ]
+
+
+def seed(db_path, args):
+    app = make_app(db_path, create=True, SPOT_ALLOCATOR_ENABLED=False)
+    client = app.test_client()
+    with app.app_context():
+        lots = [seed_lot(args.spots, name=f'Lot {i}') for i in range(args.lots)]
+        users = seed_users(200)
+        user = auth_header(users[0])
+    for i in range(args.history):
+        res_id = client.post(f'/api/user/reserve/{lots[i % len(lots)]}', headers=user).get_json()['reservation_id']
+        client.post(f'/api/user/release/{res_id}', headers=user)
+    return users[0]
+
+
+def timed(client, url, headers, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code in (200, 304), (url, response.status_code)
+    latencies.sort()
+    return latencies
+
+
+def report(label, url, latencies):
+    total = sum(latencies)
+    print(f"  {label:<10}{url:<36}{len(latencies) / total:>9.0f} req/s"
+          f"{percentile(latencies, 50) * 1000:>8.2f}ms p50{percentile(latencies, 95) * 1000:>8.2f}ms p95")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--providers', nargs='+', default=['default', 'orjson'])
+    parser.add_argument('--lots', type=int, default=300)
+    parser.add_argument('--spots', type=int, default=10)
+    parser.add_argument('--history', type=int, default=100, help='completed reservations of the benchmark user')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    args = parser.parse_args(argv)
+
+    db_path = scratch_db_path()
+    user_id = seed(db_path, args)
+
+    documents = {}
+    for provider in args.providers:
+        app = make_app(db_path, JSON_PROVIDER=provider, CACHE_TYPE='NullCache', SPOT_ALLOCATOR_ENABLED=False)
+        client = app.test_client()
+        with app.app_context():
+            user, admin = auth_header(user_id), auth_header('bench-admin', role='admin')
+        print(f"{provider} ({type(app.json).__name__}), no response cache:")
+        for url, headers in endpoints(user, admin):
+            documents.setdefault(url, []).append(json.loads(client.get(url, headers=headers).get_data()))
+            report(provider, url, timed(client, url, headers, args.requests))
+
+    mismatched = [url for url, docs in documents.items() if any(doc != docs[0] for doc in docs[1:])]
+
+    app = make_app(db_path, JSON_PROVIDER=args.providers[-1], SPOT_ALLOCATOR_ENABLED=False)
+    client = app.test_client()
+    with app.app_context():
+        user, admin = auth_header(user_id), auth_header('bench-admin', role='admin')
+    print("conditional GET (If-None-Match), cache enabled:")
+    missing_etag = []
+    for url, headers in endpoints(user, admin):
+        etag = client.get(url, headers=headers).headers.get('ETag')
+        if not etag:
+            missing_etag.append(url)
+            continue
+        report('304', url, timed(client, url, {**headers, 'If-None-Match': etag}, args.requests))
+
+    if mismatched:
+        print(f"FAIL: providers disagree on {', '.join(mismatched)}")
+    if missing_etag:
+        print(f"FAIL: no ETag on {', '.join(missing_etag)}")
+    return 1 if mismatched or missing_etag else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,401 @@
+"""
+Endpoint load test. Drives every route of the auth, admin, user and common
+blueprints against a dataset from benchmarks.generate_data (a small one is
+generated when --db is not given), either in process through the Flask test
+client or over HTTP against a running server (--url). Reports p50/p95/p99
+latency and requests per second per endpoint.
+
+--save-baseline writes the results to a JSON file; --baseline compares a run
+with one and exits 1 when an endpoint's p95 (the median for endpoints run
+fewer than 50 times) or throughput regresses by more than --tolerance, or
+when it starts failing.
+
+In process, each run works on a fresh copy of --db, so runs stay
+comparable, and Celery uses an in-memory broker and result backend: lot
+deletions and CSV exports are queued but never run.
+
+    python -m benchmarks.generate_data --scale medium --db /tmp/parkbuddy-medium.db
+    python -m benchmarks.load_test --db /tmp/parkbuddy-medium.db --save-baseline baseline.json
+    python -m benchmarks.load_test --db /tmp/parkbuddy-medium.db --baseline baseline.json
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --concurrency 8
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from uuid import uuid4
+from .common import make_app, percentile, scratch_db_path
+
+# Blueprint endpoints that are not driven, with the reason
+NOT_DRIVEN = {
+    'common.get_all_lots': "GET /api/lots resolves to admin.get_all_lots, registered first",
+}
+
+
+class FlaskClient:
+    """In-process client: a Flask test client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, url, headers=None, json=None, stream=False):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        if stream:
+            response = client.open(url, method=method, headers=headers, buffered=False)
+            body = next(iter(response.response), b'') if response.status_code == 200 else response.get_data()
+            response.close()
+            return response.status_code, body if isinstance(body, bytes) else body.encode()
+        response = client.open(url, method=method, headers=headers, json=json)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """Client for a running server: a requests.Session per thread."""
+
+    def __init__(self, base_url):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+
+    def request(self, method, url, headers=None, json=None, stream=False):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, self.base_url + url, headers=headers, json=json,
+                                   stream=stream, timeout=60)
+        if stream:
+            body = next(response.iter_content(chunk_size=None), b'')
+            response.close()
+            return response.status_code, body
+        return response.status_code, response.content
+
+
+class Scenario:
+    """
+    One endpoint. `build(state, i)` returns (url, json body) for the i-th
+    request; `setup(state, client)` runs once before them and `record(state,
+    body)` sees every successful response. `share` scales the request count
+    for expensive routes (password hashing, allocator rebuilds); `warmup`
+    untimed requests go first (by default 5 for GETs, none for writes).
+    """
+
+    def __init__(self, endpoint, method, build, token=None, expect=(200,), share=1.0,
+                 stream=False, setup=None, record=None, warmup=None):
+        self.endpoint = endpoint
+        self.method = method
+        self.build = build
+        self.token = token
+        self.expect = expect
+        self.share = share
+        self.stream = stream
+        self.setup = setup
+        self.record = record
+        self.warmup = (5 if method == 'GET' else 0) if warmup is None else warmup
+
+
+def _json(body):
+    return json.loads(body) if body else {}
+
+
+def login(client, state, password):
+    """
+    Log in the admin and the first active generated user (state['tokens'])
+    and pick another active user without open reservations to block.
+    """
+    status, body = client.request('POST', '/api/auth/admin/login', json={'username': 'admin', 'password': password})
+    if status != 200:
+        raise SystemExit(f"admin login failed ({status}); generate the dataset with the same --password")
+    state['tokens'] = {'admin': _json(body)['access_token']}
+    for user_id in range(1, 101):
+        status, body = client.request('POST', '/api/auth/login',
+                                      json={'email': f'user{user_id}@example.com', 'password': password})
+        if status == 200:
+            state['tokens']['user'] = _json(body)['access_token']
+            state['user_id'] = user_id
+            break
+    else:
+        raise SystemExit("no active user among user1..user100 could log in")
+
+    # block_user refuses users with open reservations
+    for user_id in range(state['user_id'] + 1, state['user_id'] + 201):
+        status, body = client.request('GET', f'/api/admin/user-details/{user_id}', headers=_auth(state, 'admin'))
+        details = _json(body) if status == 200 else {}
+        if details and details['user']['is_active'] and \
+                details['stats']['total_reservations'] == details['stats']['completed_reservations']:
+            state['victim_id'] = user_id
+            return
+    raise SystemExit("no active user without open reservations to block")
+
+
+def _prepare_lots(state, client):
+    status, body = client.request('GET', '/api/lots', headers=_auth(state, 'admin'))
+    lots = _json(body)
+    state['lot_id'] = lots[0]['id']
+    state['load_test_lots'] = [lot['id'] for lot in lots if lot['prime_location_name'].startswith('Load Test')]
+
+
+def _prepare_exports(state, client):
+    status, body = client.request('GET', '/api/user/exports', headers=_auth(state, 'user'))
+    exports = _json(body) if status == 200 else []
+    if not exports and state.get('write_export'):
+        state['write_export'](state['user_id'])
+        status, body = client.request('GET', '/api/user/exports', headers=_auth(state, 'user'))
+        exports = _json(body)
+    state['export_url'] = exports[0]['url'] if exports else None
+
+
+def _prepare_profiles(state, client):
+    # One admin-flagged request leaves a stored profile to fetch
+    client.request('GET', '/api/admin/cache-stats?profile=1', headers=_auth(state, 'admin'))
+    status, body = client.request('GET', '/api/admin/profiles', headers=_auth(state, 'admin'))
+    state['profiles'] = [run['id'] for run in _json(body)['profiles']] if status == 200 else []
+
+
+def _auth(state, role):
+    return {'Authorization': f"Bearer {state['tokens'][role]}"}
+
+
+def scenarios(password):
+    def const(url, body=None):
+        return lambda state, i: (url.format(**state), body)
+
+    def keep(key, field):
+        return lambda state, body: state.setdefault(key, []).append(_json(body)[field])
+
+    def take(key, url):
+        return lambda state, i: (url.format(state[key][i % len(state[key])]) if state.get(key) else None, None)
+
+    return [
+        # auth
+        Scenario('auth.register', 'POST', lambda state, i: ('/api/auth/register', {
+            'email': f'load-{uuid4().hex}@example.com', 'password': password, 'full_name': 'Load Test'}),
+            expect=(201,), share=0.1),
+        Scenario('auth.login', 'POST', lambda state, i: ('/api/auth/login', {
+            'email': f"user{state['user_id']}@example.com", 'password': password}), share=0.1),
+        Scenario('auth.admin_login', 'POST', const('/api/auth/admin/login', {'username': 'admin', 'password': password}),
+                 share=0.1),
+        Scenario('auth.who_am_i', 'GET', const('/api/auth/me'), token='user'),
+        Scenario('auth.example_reserve', 'POST', const('/api/auth/reserve-example'), token='user'),
+        Scenario('auth.example_create_lot', 'POST', const('/api/auth/lot-example'), token='admin'),
+        # user
+        Scenario('user.get_lots', 'GET', const('/api/user/lots'), token='user'),
+        Scenario('user.reserve_api', 'POST', const('/api/user/reserve/{lot_id}'), token='user',
+                 record=keep('reservations', 'reservation_id')),
+        Scenario('user.release', 'POST', take('reservations', '/api/user/release/{}'), token='user'),
+        Scenario('user.history', 'GET', const('/api/user/reservations?limit=20'), token='user'),
+        Scenario('user.active_reservations', 'GET', const('/api/user/active-reservations'), token='user'),
+        Scenario('user.user_stats', 'GET', const('/api/user/stats'), token='user'),
+        Scenario('user.trigger_csv_export', 'POST', const('/api/user/export-csv'), token='user', share=0.1,
+                 warmup=2),
+        Scenario('user.my_exports', 'GET', const('/api/user/exports'), token='user'),
+        Scenario('user.download_export', 'GET', lambda state, i: (state['export_url'], None), token='user',
+                 setup=_prepare_exports),
+        # admin
+        Scenario('admin.get_all_lots', 'GET', const('/api/lots'), token='admin'),
+        Scenario('admin.get_lot', 'GET', const('/api/lots/{lot_id}'), token='admin'),
+        Scenario('admin.create_lot', 'POST', lambda state, i: ('/api/lots', {
+            'name': f'Load Test {i}', 'price': 10, 'address': '-', 'pincode': '000000', 'spots': 20}),
+            token='admin', expect=(201,), share=0.1),
+        Scenario('admin.delete_lot_api', 'DELETE', take('load_test_lots', '/api/lots/{}'), token='admin',
+                 expect=(202,), share=0.1, setup=_prepare_lots, record=keep('deletions', 'task_id')),
+        Scenario('admin.lot_deletion_status', 'GET', take('deletions', '/api/admin/lot-deletions/{}'), token='admin'),
+        Scenario('admin.list_users', 'GET', const('/api/admin/users?limit=50'), token='admin'),
+        Scenario('admin.get_user_details', 'GET', const('/api/admin/user-details/{user_id}'), token='admin'),
+        # Every request toggles the account; an even count leaves it as it was
+        Scenario('admin.block_user', 'POST', const('/api/admin/block-user/{victim_id}'), token='admin'),
+        Scenario('admin.dashboard_stats', 'GET', const('/api/admin/dashboard-stats'), token='admin'),
+        Scenario('admin.lot_activity', 'GET', const('/api/admin/lot-activity'), token='admin'),
+        Scenario('admin.lot_details', 'GET', const('/api/admin/lot-details/{lot_id}?per_page=100'), token='admin'),
+        Scenario('admin.edit_lot', 'PUT', lambda state, i: (f"/api/admin/edit-lot/{state['lot_id']}",
+                                                            {'price': 10 + i % 2}), token='admin'),
+        Scenario('admin.get_cache_stats', 'GET', const('/api/admin/cache-stats'), token='admin'),
+        Scenario('admin.get_metrics', 'GET', const('/api/admin/metrics'), token='admin'),
+        Scenario('admin.list_profiles', 'GET', const('/api/admin/profiles'), token='admin', share=0.1,
+                 setup=_prepare_profiles),
+        Scenario('admin.get_profile', 'GET', take('profiles', '/api/admin/profiles/{}?limit=20'), token='admin',
+                 share=0.1),
+        Scenario('admin.allocator_status', 'GET', const('/api/admin/allocator'), token='admin', share=0.1),
+        Scenario('admin.allocator_rebuild', 'POST', const('/api/admin/allocator/rebuild'), token='admin', share=0.1),
+        # common
+        Scenario('common.availability_stream', 'GET',
+                 lambda state, i: (f"/api/lots/availability/stream?jwt={state['tokens']['user']}", None), stream=True),
+    ]
+
+
+def run_scenario(client, scenario, state, count, concurrency):
+    """Send `count` requests from `concurrency` threads; returns the result row."""
+    if scenario.setup:
+        scenario.setup(state, client)
+    count = max(2, int(count * scenario.share)) // 2 * 2
+    headers = _auth(state, scenario.token) if scenario.token else None
+    planned = [scenario.build(state, i) for i in range(count)]
+    if any(url is None for url, _ in planned):
+        return None
+    for url, body in planned[:scenario.warmup]:
+        client.request(scenario.method, url, headers=headers, json=body, stream=scenario.stream)
+    latencies, errors, sizes = [], {}, []
+    lock = threading.Lock()
+    cursor = iter(range(count))
+
+    def work():
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            url, body = planned[i]
+            started = time.perf_counter()
+            status, data = client.request(scenario.method, url, headers=headers, json=body, stream=scenario.stream)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                sizes.append(len(data))
+                if status in scenario.expect:
+                    if scenario.record:
+                        scenario.record(state, data)
+                else:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=work) for _ in range(min(concurrency, count))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': count,
+        'rps': count / wall,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_bytes': sum(sizes) / len(sizes),
+        'errors': errors,
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Endpoints that regressed against `baseline`, with a reason each."""
+    regressions = []
+    for endpoint, row in results.items():
+        base = baseline.get(endpoint)
+        if base is None:
+            continue
+        if row['errors'] and not base['errors']:
+            regressions.append((endpoint, f"now failing: {row['errors']}"))
+        # The p95 of a handful of requests is just the slowest one; judge those by the median
+        key = 'p95_ms' if row['requests'] >= 50 else 'p50_ms'
+        if row[key] > base[key] * (1 + tolerance) and row[key] - base[key] > min_delta_ms:
+            regressions.append((endpoint, f"{key[:3]} {base[key]:.2f}ms -> {row[key]:.2f}ms"))
+        # Throughput as wall time per request, so sub-millisecond jitter doesn't count
+        if row['rps'] < base['rps'] / (1 + tolerance) and 1000 / row['rps'] - 1000 / base['rps'] > min_delta_ms:
+            regressions.append((endpoint, f"throughput {base['rps']:.0f} -> {row['rps']:.0f} req/s"))
+    return regressions
+
+
+def memory_celery_config():
+    """CELERY_CONFIG that queues tasks in memory, so deletions and exports can be triggered without Redis or a worker."""
+    from backend.config import Config
+    return {**Config.CELERY_CONFIG, 'broker_url': 'memory://', 'result_backend': 'cache+memory://'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='dataset from benchmarks.generate_data (in-process runs)')
+    parser.add_argument('--url', help='base URL of a running server instead of the test client')
+    parser.add_argument('--password', default='password', help='password the dataset was generated with')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--only', nargs='+', help='endpoint names (or prefixes such as user.) to run')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response cache (in process)')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--baseline', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='ignore latency changes (p95, time per request) smaller than this')
+    args = parser.parse_args(argv)
+
+    state = {}
+    if args.url:
+        client = HttpClient(args.url)
+        app = None
+    else:
+        db_path = scratch_db_path('load-test.db')
+        if args.db:
+            # The run books, registers and creates lots; keep the dataset itself untouched
+            shutil.copyfile(args.db, db_path)
+        else:
+            from .generate_data import SCALES, generate
+            print(f"No --db given; generating a small dataset in {db_path}")
+            generate(db_path, password=args.password, log=lambda line: None, **SCALES['small'])
+        overrides = {'EXPORT_DIR': os.path.join(os.path.dirname(os.path.abspath(db_path)), 'exports'),
+                     'PROFILE_DIR': os.path.join(os.path.dirname(os.path.abspath(db_path)), 'profiles'),
+                     'CELERY_CONFIG': memory_celery_config()}
+        if args.no_cache:
+            overrides['CACHE_TYPE'] = 'NullCache'
+        app = make_app(db_path, **overrides)
+        client = FlaskClient(app)
+
+        def write_export(user_id):
+            from backend.exports import write_user_export
+            with app.app_context():
+                write_user_export(user_id)
+        state['write_export'] = write_export
+
+    login(client, state, args.password)
+    _prepare_lots(state, client)
+
+    plan = scenarios(args.password)
+    if app is not None:
+        driven = {scenario.endpoint for scenario in plan}
+        missing = sorted(
+            rule.endpoint for rule in app.url_map.iter_rules()
+            if '.' in rule.endpoint and rule.endpoint not in driven and rule.endpoint not in NOT_DRIVEN
+        )
+        if missing:
+            print(f"Routes without a scenario: {', '.join(missing)}")
+    if args.only:
+        plan = [s for s in plan if any(s.endpoint == name or s.endpoint.startswith(name) for name in args.only)]
+
+    print(f"{'endpoint':<32}{'reqs':>6}{'req/s':>9}{'p50':>11}{'p95':>11}{'p99':>11}{'bytes':>9}  errors")
+    results = {}
+    started = time.perf_counter()
+    for scenario in plan:
+        row = run_scenario(client, scenario, state, args.requests, args.concurrency)
+        if row is None:
+            print(f"{scenario.endpoint:<32}  skipped (nothing to request)")
+            continue
+        results[scenario.endpoint] = row
+        print(f"{scenario.endpoint:<32}{row['requests']:>6}{row['rps']:>9.1f}{row['p50_ms']:>9.2f}ms"
+              f"{row['p95_ms']:>9.2f}ms{row['p99_ms']:>9.2f}ms{row['mean_bytes']:>9.0f}  {row['errors'] or '-'}")
+    total = sum(row['requests'] for row in results.values())
+    print(f"{total} requests in {time.perf_counter() - started:.1f}s")
+
+    failed = [endpoint for endpoint, row in results.items() if row['errors']]
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'requests': args.requests, 'concurrency': args.concurrency, 'results': results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance, args.min_delta_ms)
+        for endpoint, reason in regressions:
+            print(f"REGRESSION {endpoint}: {reason}")
+        print("FAIL" if regressions else f"PASS (within {args.tolerance:.0%} of the baseline)")
+    elif failed:
+        print(f"FAIL: errors on {', '.join(failed)}")
+    return 1 if regressions or (failed and not args.baseline) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
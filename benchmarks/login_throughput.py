@@ -0,0 +1,164 @@
+"""
+Login throughput across password hash settings.
+
+For each PASSWORD_HASH_METHOD, every benchmark user gets a hash made with
+that method and --clients threads log in as fast as they can for --seconds,
+once with hashing on the request threads (PASSWORD_HASH_WORKERS=0) and once
+on the bounded pool (--workers, --queue). Meanwhile a probe thread keeps
+fetching GET /api/user/lots to show what the logins do to other routes.
+Reports logins/sec, login latency, 503s from a full queue and the probe's
+latency.
+
+Finally users holding a hash of an older method log in once and the test
+checks that their stored hashes were upgraded, and users holding a hash of
+a stronger method check that theirs were kept.
+
+    python -m benchmarks.login_throughput --clients 16 --seconds 5
+    python -m benchmarks.login_throughput --methods pbkdf2:sha256:600000 scrypt:32768:8:1 --workers 4
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+from werkzeug.security import generate_password_hash
+from backend.extensions import db
+from backend.models import User
+from .common import auth_header, make_app, percentile, scratch_db_path, seed_lot, seed_users
+
+PASSWORD = 'password'
+DEFAULT_METHODS = ['pbkdf2:sha256:260000', 'pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1']
+
+
+def set_hashes(method, emails=None):
+    """Give every user (or the given ones) a fresh hash of PASSWORD made with `method`."""
+    query = User.query
+    if emails is not None:
+        query = query.filter(User.email.in_(emails))
+    query.update({User.pwd_hash: generate_password_hash(PASSWORD, method)}, synchronize_session=False)
+    db.session.commit()
+
+
+def run_variant(db_path, method, workers, queue, clients, seconds, probe_headers):
+    app = make_app(db_path, SPOT_ALLOCATOR_ENABLED=False, PASSWORD_HASH_METHOD=method,
+                   PASSWORD_HASH_WORKERS=workers, PASSWORD_HASH_QUEUE=queue)
+    with app.app_context():
+        set_hashes(method)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    statuses = Counter()
+    latencies, probe_latencies = [], []
+
+    def login_loop(email):
+        client = app.test_client()
+        mine = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[response.status_code] += 1
+            if response.status_code == 200:
+                mine.append(elapsed)
+            elif response.status_code == 503:
+                # Back off as a client honouring Retry-After would
+                stop.wait(float(response.headers.get('Retry-After', 1)))
+        with lock:
+            latencies.extend(mine)
+
+    def probe_loop():
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = client.get('/api/user/lots', headers=probe_headers)
+            probe_latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login_loop, args=(f'bench{i}@example.com',)) for i in range(clients)]
+    threads.append(threading.Thread(target=probe_loop))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    probe_latencies.sort()
+    mode = f'pool={workers}' if workers else 'inline'
+    errors = sum(n for code, n in statuses.items() if code not in (200, 503))
+    print(f"  {method:<24}{mode:<9}{statuses[200] / elapsed:>8.1f} logins/s"
+          f"{percentile(latencies, 50) * 1000:>8.0f}ms p50{percentile(latencies, 95) * 1000:>8.0f}ms p95"
+          f"{statuses[503]:>7} x503{errors:>5} err"
+          f"   probe{percentile(probe_latencies, 50) * 1000:>7.1f}ms p50"
+          f"{percentile(probe_latencies, 95) * 1000:>7.1f}ms p95")
+    return errors == 0 and statuses[200] > 0
+
+
+def check_rehash(db_path, old_method, new_method, users):
+    app = make_app(db_path, SPOT_ALLOCATOR_ENABLED=False, PASSWORD_HASH_METHOD=new_method)
+    emails = [f'bench{i}@example.com' for i in range(users)]
+    with app.app_context():
+        set_hashes(old_method, emails)
+    client = app.test_client()
+    for email in emails:
+        assert client.post('/api/auth/login', json={'email': email, 'password': PASSWORD}).status_code == 200
+    with app.app_context():
+        new_prefix = generate_password_hash('', new_method).split('$', 1)[0]
+        upgraded = User.query.filter(User.email.in_(emails), User.pwd_hash.like(new_prefix + '$%')).count()
+    for email in emails:
+        assert client.post('/api/auth/login', json={'email': email, 'password': PASSWORD}).status_code == 200
+    print(f"Rehash {old_method} -> {new_method}: {upgraded}/{users} upgraded at login")
+    return upgraded == users
+
+
+def check_no_downgrade(db_path, strong_method, configured_method, users):
+    app = make_app(db_path, SPOT_ALLOCATOR_ENABLED=False, PASSWORD_HASH_METHOD=configured_method)
+    emails = [f'bench{i}@example.com' for i in range(users)]
+    with app.app_context():
+        set_hashes(strong_method, emails)
+        before = dict(db.session.query(User.email, User.pwd_hash).filter(User.email.in_(emails)))
+    client = app.test_client()
+    for email in emails:
+        assert client.post('/api/auth/login', json={'email': email, 'password': PASSWORD}).status_code == 200
+    with app.app_context():
+        after = dict(db.session.query(User.email, User.pwd_hash).filter(User.email.in_(emails)))
+    kept = sum(before[email] == after[email] for email in emails)
+    print(f"No downgrade {strong_method} under {configured_method}: {kept}/{users} kept at login")
+    return kept == users
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--clients', type=int, default=16, help='threads logging in concurrently')
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration of each variant')
+    parser.add_argument('--workers', type=int, default=2, help='PASSWORD_HASH_WORKERS of the pool variant')
+    parser.add_argument('--queue', type=int, default=8, help='PASSWORD_HASH_QUEUE of the pool variant')
+    args = parser.parse_args(argv)
+
+    db_path = scratch_db_path()
+    app = make_app(db_path, create=True, SPOT_ALLOCATOR_ENABLED=False)
+    with app.app_context():
+        for i in range(20):
+            seed_lot(10, name=f'Lot {i}')
+        user_ids = seed_users(args.clients + 1)
+        probe_headers = auth_header(user_ids[-1])
+
+    print(f"{args.clients} login threads for {args.seconds:.0f}s per variant; probe = GET /api/user/lots")
+    ok = True
+    for method in args.methods:
+        for workers in (0, args.workers):
+            ok &= run_variant(db_path, method, workers, args.queue, args.clients, args.seconds, probe_headers)
+    ok &= check_rehash(db_path, 'pbkdf2:sha256:1000', args.methods[-1], min(args.clients, 5))
+    ok &= check_no_downgrade(db_path, 'scrypt:32768:8:1', 'pbkdf2:sha256:600000', min(args.clients, 5))
+    print('PASS' if ok else 'FAIL')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Lot provisioning benchmark: create a large lot through POST /api/lots, grow
+it and shrink it through PUT /api/admin/edit-lot/<id>, and compare creation
+with the previous one-ORM-object-per-spot loop. Afterwards each lot's spot
+ids are checked for contiguity and its counters against parking_spots.
+
+    python -m benchmarks.lot_provisioning --spots 10000
+    python -m benchmarks.lot_provisioning --spots 10000 --lots 3 --skip-orm
+"""
+import argparse
+import sys
+import time
+from sqlalchemy import case, func
+from backend.extensions import db
+from backend.models import ParkingLot, ParkingSpot
+from .common import auth_header, make_app, scratch_db_path
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28} {elapsed * 1000:9.1f} ms")
+    return result
+
+
+def orm_create(spots):
+    """The per-object loop create_lot used before bulk provisioning."""
+    lot = ParkingLot(prime_location_name='ORM Lot', price_per_hour=10.0, address='-', pin_code='000000',
+                     number_of_spots=spots, available_spots=spots, occupied_spots=0)
+    db.session.add(lot)
+    db.session.flush()
+    for _ in range(spots):
+        db.session.add(ParkingSpot(lot_id=lot.id))
+    db.session.commit()
+    return lot.id
+
+
+def check_lot(lot_id):
+    lot = db.session.get(ParkingLot, lot_id)
+    count, low, high, free = db.session.query(
+        func.count(ParkingSpot.id), func.min(ParkingSpot.id), func.max(ParkingSpot.id),
+        func.sum(case((ParkingSpot.status == 'A', 1), else_=0))
+    ).filter(ParkingSpot.lot_id == lot_id).one()
+    problems = []
+    if count != lot.number_of_spots:
+        problems.append(f"{count} spot rows but number_of_spots={lot.number_of_spots}")
+    if count and high - low + 1 != count:
+        problems.append(f"ids {low}..{high} are not contiguous for {count} spots")
+    if (free or 0) != lot.available_spots:
+        problems.append(f"{free} free rows but available_spots={lot.available_spots}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spots', type=int, default=10000)
+    parser.add_argument('--lots', type=int, default=2, help='lots created through the API')
+    parser.add_argument('--skip-orm', action='store_true', help='skip the per-object baseline')
+    args = parser.parse_args(argv)
+
+    app = make_app(scratch_db_path(), create=True)
+    client = app.test_client()
+    with app.app_context():
+        headers = auth_header('bench-admin', role='admin')
+
+    print(f"{args.lots} lot(s) of {args.spots} spots")
+    if not args.skip_orm:
+        with app.app_context():
+            timed('create (ORM loop)', lambda: orm_create(args.spots))
+
+    problems = []
+    for i in range(args.lots):
+        body = {'name': f'Garage {i}', 'price': 20, 'address': '-', 'pincode': '000000', 'spots': args.spots}
+        response = timed(f'create lot {i} (bulk)', lambda: client.post('/api/lots', json=body, headers=headers))
+        if response.status_code != 201:
+            print(f"FAIL: create returned {response.status_code}: {response.get_json()}")
+            return 1
+
+    with app.app_context():
+        lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)
+                   .filter(ParkingLot.prime_location_name.like('Garage %')).order_by(ParkingLot.id)]
+
+    grown, shrunk = args.spots + args.spots // 2, args.spots // 2
+    for lot_id in lot_ids:
+        for label, size in ((f'grow lot {lot_id} to {grown}', grown), (f'shrink lot {lot_id} to {shrunk}', shrunk)):
+            response = timed(label, lambda: client.put(f'/api/admin/edit-lot/{lot_id}',
+                                                       json={'spots': size}, headers=headers))
+            if response.status_code != 200:
+                print(f"FAIL: edit returned {response.status_code}: {response.get_json()}")
+                return 1
+
+    with app.app_context():
+        for lot_id in lot_ids:
+            problems += [f"lot {lot_id}: {p}" for p in check_lot(lot_id)]
+
+    for problem in problems:
+        print(f"  {problem}")
+    print("FAIL" if problems else "PASS")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Mail delivery benchmark: one SMTP connection per message (mail.send) versus
+the batched delivery layer (backend.mailer.send_messages), both against an
+in-process SMTP sink.
+
+    python -m benchmarks.mail_delivery --messages 2000 --connect-delay-ms 5
+    python -m benchmarks.mail_delivery --messages 500 --drop-every 40
+"""
+import argparse
+import logging
+import sys
+import time
+from flask_mail import Message
+from backend.extensions import mail
+from backend.mailer import send_messages
+from .common import make_app, scratch_db_path
+from .smtp_sink import SMTPSink
+
+
+def build_messages(count):
+    for i in range(count):
+        msg = Message("ParkBuddy - Book a Spot!", recipients=[f'bench{i}@example.com'])
+        msg.body = f"Hi Bench User {i},\n\nLooking for parking? Book a spot today.\n"
+        yield msg
+
+
+def run_single(count):
+    sent = 0
+    for msg in build_messages(count):
+        mail.send(msg)
+        sent += 1
+    return sent
+
+
+def run_batched(count, batch_size):
+    report = send_messages(build_messages(count), batch_size=batch_size)
+    return report.sent, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--connect-delay-ms', type=float, default=2.0,
+                        help='simulated connection setup cost per SMTP session')
+    parser.add_argument('--drop-every', type=int, default=0,
+                        help='sink closes each session after this many messages')
+    parser.add_argument('--skip-single', action='store_true', help='only run the batched path')
+    parser.add_argument('--verbose', action='store_true', help='log every batch')
+    args = parser.parse_args(argv)
+
+    with SMTPSink(connect_delay=args.connect_delay_ms / 1000.0, drop_every=args.drop_every) as sink:
+        app = make_app(scratch_db_path(), create=True, MAIL_SERVER=sink.host, MAIL_PORT=sink.port,
+                       MAIL_SUPPRESS_SEND=False)
+        app.logger.setLevel(logging.INFO if args.verbose else logging.WARNING)
+        ok = True
+        with app.app_context():
+            print(f"{args.messages} messages, connect delay {args.connect_delay_ms}ms, "
+                  f"drop every {args.drop_every or '-'}")
+
+            if not args.skip_single:
+                sink.reset()
+                started = time.perf_counter()
+                try:
+                    sent = run_single(args.messages)
+                except Exception as e:
+                    # The per-message path has no reconnect handling
+                    sent = sink.messages
+                    print(f"  single : stopped after {sent} messages: {e!r}")
+                elapsed = time.perf_counter() - started
+                print(f"  single : {sent} sent over {sink.connections} connection(s) "
+                      f"in {elapsed:.2f}s, {sent / elapsed:.1f} msg/s")
+                single_rate = sent / elapsed
+
+            sink.reset()
+            started = time.perf_counter()
+            sent, report = run_batched(args.messages, args.batch_size)
+            elapsed = time.perf_counter() - started
+            print(f"  batched: {sent} sent over {sink.connections} connection(s) "
+                  f"in {elapsed:.2f}s, {sent / elapsed:.1f} msg/s ({report})")
+            if not args.skip_single and single_rate:
+                print(f"  speedup: {sent / elapsed / single_rate:.1f}x")
+
+            if sink.messages != sent or report.failed:
+                ok = False
+                print(f"FAIL: sink received {sink.messages}, delivery layer reported {sent} sent, "
+                      f"{report.failed} failed")
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
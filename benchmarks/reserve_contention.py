@@ -0,0 +1,113 @@
+"""
+Contention benchmark for POST /api/user/reserve/<lot_id>.
+
+N concurrent clients (threads or processes, each with its own user) keep
+reserving spots in one lot until it reports full. Afterwards the database is
+checked for double bookings and for drift between the spot rows, the active
+reservations and the lot counters.
+
+    python -m benchmarks.reserve_contention --clients 16 --spots 2000
+    python -m benchmarks.reserve_contention --clients 8 --processes
+"""
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+from collections import Counter
+from sqlalchemy import func
+from backend.extensions import db
+from backend.models import ParkingLot, ParkingSpot, Reservation
+from .common import auth_header, make_app, scratch_db_path, seed_lot, seed_users
+
+
+def run_client(db_path, user_id, lot_id, start_event, results):
+    app = make_app(db_path)
+    client = app.test_client()
+    with app.app_context():
+        headers = auth_header(user_id)
+    outcomes = Counter()
+    start_event.wait()
+    while True:
+        response = client.post(f'/api/user/reserve/{lot_id}', headers=headers)
+        outcomes[response.status_code] += 1
+        # Stop once the lot is full (404) or on any unexpected failure
+        if response.status_code not in (200, 409):
+            break
+    results.put(dict(outcomes))
+
+
+def check_consistency(lot_id):
+    double_booked = db.session.query(Reservation.spot_id).filter(
+        Reservation.leaving_timestamp.is_(None)
+    ).group_by(Reservation.spot_id).having(func.count(Reservation.id) > 1).count()
+    active = Reservation.query.filter(Reservation.leaving_timestamp.is_(None)).count()
+    occupied_rows = ParkingSpot.query.filter_by(lot_id=lot_id, status='O').count()
+    lot = db.session.get(ParkingLot, lot_id)
+    return {
+        'double_booked_spots': double_booked,
+        'active_reservations': active,
+        'occupied_spot_rows': occupied_rows,
+        'lot_occupied_counter': lot.occupied_spots,
+        'lot_available_counter': lot.available_spots,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--spots', type=int, default=1000)
+    parser.add_argument('--processes', action='store_true', help='use processes instead of threads')
+    args = parser.parse_args(argv)
+
+    db_path = scratch_db_path()
+    app = make_app(db_path, create=True)
+    with app.app_context():
+        lot_id = seed_lot(args.spots)
+        user_ids = seed_users(args.clients)
+
+    if args.processes:
+        ctx = multiprocessing.get_context('fork')
+        start_event, results = ctx.Event(), ctx.Queue()
+        workers = [ctx.Process(target=run_client, args=(db_path, uid, lot_id, start_event, results))
+                   for uid in user_ids]
+    else:
+        import queue
+        start_event, results = threading.Event(), queue.Queue()
+        workers = [threading.Thread(target=run_client, args=(db_path, uid, lot_id, start_event, results))
+                   for uid in user_ids]
+
+    for worker in workers:
+        worker.start()
+    time.sleep(1.0)  # let every client build its app before the gun goes off
+    started = time.perf_counter()
+    start_event.set()
+    totals = Counter()
+    for _ in workers:
+        totals.update(results.get())
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+
+    with app.app_context():
+        report = check_consistency(lot_id)
+
+    mode = 'processes' if args.processes else 'threads'
+    print(f'{args.clients} {mode}, {args.spots} spots, {elapsed:.2f}s')
+    print(f'  reserved:          {totals[200]}')
+    print(f'  conflicts (409):   {totals[409]}')
+    print(f'  errors (5xx):      {sum(n for code, n in totals.items() if code >= 500)}')
+    print(f'  reservations/sec:  {totals[200] / elapsed:.1f}')
+    for key, value in report.items():
+        print(f'  {key + ":":<26}{value}')
+
+    ok = (report['double_booked_spots'] == 0
+          and totals[200] == args.spots
+          and report['active_reservations'] == report['occupied_spot_rows'] == report['lot_occupied_counter'] == args.spots
+          and report['lot_available_counter'] == 0)
+    print('PASS' if ok else 'FAIL')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Token check overhead of role_required. Calls a trivial role_required('user')
+view directly inside one request context (no WSGI or routing) and reports
+the time per call for each way of deciding whether the token is revoked:
+
+  claim-only   the JWT claim alone (the behaviour before the revocation set)
+  local-set    the in-process revocation set (REVOCATION_BACKEND=local)
+  redis-set    the Redis-backed set with its periodic version check
+               (only with --redis-url pointing at a running server)
+  db-lookup    a users.is_active query per request, for comparison
+
+The revocation set is filled with --blocked subjects first.
+
+    python -m benchmarks.revocation_overhead --calls 20000 --blocked 10000
+    python -m benchmarks.revocation_overhead --redis-url redis://localhost:6379/15
+"""
+import argparse
+import sys
+import time
+from flask_jwt_extended.default_callbacks import default_blocklist_callback
+from backend.extensions import db, jwt
+from backend.models import User
+from backend.revocation import _token_revoked, revocations
+from backend.routes.decorators import role_required
+from .common import auth_header, make_app, percentile, scratch_db_path, seed_users
+
+
+def _db_lookup(jwt_header, jwt_payload):
+    if jwt_payload.get('role') != 'user':
+        return False
+    active = db.session.query(User.is_active).filter(User.id == int(jwt_payload['sub'])).scalar()
+    return not active
+
+
+@role_required('user')
+def probe():
+    return 'ok'
+
+
+def time_calls(app, headers, calls, callback):
+    jwt._token_in_blocklist_callback = callback
+    durations = []
+    with app.test_request_context(headers=headers):
+        for _ in range(calls // 10):
+            probe()
+        for _ in range(calls):
+            started = time.perf_counter()
+            result = probe()
+            durations.append(time.perf_counter() - started)
+            assert result == 'ok', result
+        db.session.remove()
+    durations.sort()
+    return durations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--blocked', type=int, default=10000, help='subjects in the revocation set')
+    parser.add_argument('--redis-url', help='also time the Redis-backed set (its keys are overwritten)')
+    args = parser.parse_args(argv)
+
+    db_path = scratch_db_path()
+    app = make_app(db_path, create=True, SPOT_ALLOCATOR_ENABLED=False)
+    with app.app_context():
+        user_id = seed_users(1)[0]
+        headers = auth_header(user_id)
+        for i in range(args.blocked):
+            revocations.revoke('user', f'blocked-{i}')
+
+    variants = [('claim-only', app, default_blocklist_callback),
+                ('local-set', app, _token_revoked)]
+    if args.redis_url:
+        redis_app = make_app(db_path, SPOT_ALLOCATOR_ENABLED=False, REDIS_URL=args.redis_url,
+                             REVOCATION_BACKEND='redis')
+        with redis_app.app_context():
+            for i in range(args.blocked):
+                revocations.revoke('user', f'blocked-{i}')
+        variants.append(('redis-set', redis_app, _token_revoked))
+    variants.append(('db-lookup', app, _db_lookup))
+
+    original = jwt._token_in_blocklist_callback
+    baseline = None
+    print(f"{args.calls} role_required calls per variant, {args.blocked} revoked subjects")
+    try:
+        for label, variant_app, callback in variants:
+            durations = time_calls(variant_app, headers, args.calls, callback)
+            mean = sum(durations) / len(durations)
+            baseline = mean if baseline is None else baseline
+            print(f"  {label:<12}{mean * 1e6:>9.1f}us mean{percentile(durations, 50) * 1e6:>9.1f}us p50"
+                  f"{percentile(durations, 99) * 1e6:>9.1f}us p99{(mean - baseline) * 1e6:>+9.1f}us vs claim-only")
+    finally:
+        jwt._token_in_blocklist_callback = original
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Serving benchmark: the Werkzeug development server (what run.py starts)
+against gunicorn with gunicorn.conf.py, over HTTP on the main user routes.
+
+Each server runs as a subprocess on its own copy of the dataset, with an
+in-process cache, availability broker and revocation set and an in-memory
+Celery broker, so no Redis is needed; the in-process cache is per worker,
+so cached lists can lag behind bookings across gunicorn workers here.
+The routes are driven with the load test's scenarios at --concurrency and
+the requests per second of both servers are reported side by side.
+
+gunicorn.conf.py turns the per-process spot allocator off with more than
+one worker; with --workers above 1 gunicorn is also run with it forced on
+(gunicorn+alloc), to show what stale allocators cost the booking routes.
+
+    python -m benchmarks.serving --concurrency 16 --requests 400
+    python -m benchmarks.serving --db /tmp/parkbuddy-medium.db --workers 4 --threads 8
+"""
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from .common import scratch_db_path
+from .load_test import HttpClient, _prepare_lots, login, run_scenario, scenarios
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_ROUTES = ['user.get_lots', 'user.history', 'user.active_reservations', 'user.user_stats',
+               'user.reserve_api', 'user.release', 'auth.login']
+
+
+# Server variants: how each is started and the environment it gets on top of the shared one
+VARIANTS = {
+    'dev': {},
+    'gunicorn': {'SPOT_ALLOCATOR_ENABLED': None},   # gunicorn.conf.py decides
+    'gunicorn+alloc': {'SPOT_ALLOCATOR_ENABLED': 'true'},
+}
+
+
+def server_command(kind, port):
+    if kind == 'dev':
+        # run.py's server, without the debugger's reloader process
+        return [sys.executable, '-c',
+                f"from backend.app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    return [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'wsgi:app']
+
+
+def start_server(kind, port, db_path, args):
+    env = dict(
+        os.environ,
+        DATABASE_URL='sqlite:///' + db_path,
+        # What wsgi.py selects for gunicorn, so both servers use the same SQLite settings
+        SQLITE_PROFILE='production',
+        CACHE_TYPE='SimpleCache',
+        AVAILABILITY_BROKER='local',
+        REVOCATION_BACKEND='local',
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+        EXPORT_DIR=os.path.join(os.path.dirname(db_path), 'exports'),
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_ACCESS_LOG=os.devnull,
+        GUNICORN_LOG_LEVEL='warning',
+    )
+    for key, value in VARIANTS[kind].items():
+        if value is None:
+            env.pop(key, None)
+        else:
+            env[key] = value
+    log = open(os.path.join(os.path.dirname(db_path), f'{kind}.log'), 'w')
+    process = subprocess.Popen(server_command(kind, port), cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    client = HttpClient(f'http://127.0.0.1:{port}')
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{kind} server exited with {process.returncode}; see {log.name}")
+        try:
+            client.request('GET', '/api/auth/me')
+            return process, client
+        except Exception:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"{kind} server did not come up within 60s; see {log.name}")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def bench(kind, port, dataset, args):
+    db_path = scratch_db_path(f"serving-{kind.replace('+', '-')}.db")
+    shutil.copyfile(dataset, db_path)
+    process, client = start_server(kind, port, db_path, args)
+    try:
+        state = {}
+        login(client, state, args.password)
+        _prepare_lots(state, client)
+        plan = [s for s in scenarios(args.password) if s.endpoint in MAIN_ROUTES]
+        return {scenario.endpoint: run_scenario(client, scenario, state, args.requests, args.concurrency)
+                for scenario in plan}
+    finally:
+        stop_server(process)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='dataset from benchmarks.generate_data (default: a small generated one)')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--requests', type=int, default=400, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args(argv)
+
+    dataset = args.db
+    if dataset is None:
+        from .generate_data import SCALES, generate
+        dataset = scratch_db_path('serving-dataset.db')
+        print(f"No --db given; generating a small dataset in {dataset}")
+        generate(dataset, password=args.password, log=lambda line: None, **SCALES['small'])
+
+    kinds = ['dev', 'gunicorn'] + (['gunicorn+alloc'] if args.workers > 1 else [])
+    results = {kind: bench(kind, args.port, dataset, args) for kind in kinds}
+
+    print(f"{args.concurrency} concurrent clients, {args.requests} requests per route; "
+          f"gunicorn: {args.workers} workers x {args.threads} threads")
+    print(f"{'route':<28}" + ''.join(f"{kind + ' req/s':>22}{'p95':>10}" for kind in kinds) + "  errors")
+    ok = True
+    for endpoint in MAIN_ROUTES:
+        rows = {kind: results[kind].get(endpoint) for kind in kinds}
+        if not all(rows.values()):
+            continue
+        errors = {kind: row['errors'] for kind, row in rows.items() if row['errors']}
+        ok &= not errors
+        line = f"{endpoint:<28}{rows['dev']['rps']:>22.1f}{rows['dev']['p95_ms']:>8.1f}ms"
+        for kind in kinds[1:]:
+            speedup = f"({rows[kind]['rps'] / rows['dev']['rps']:.2f}x)"
+            line += f"{speedup:>9}{rows[kind]['rps']:>13.1f}{rows[kind]['p95_ms']:>8.1f}ms"
+        print(f"{line}  {errors or '-'}")
+    print('PASS' if ok else 'FAIL')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
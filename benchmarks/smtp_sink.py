@@ -0,0 +1,86 @@
+"""
+Minimal in-process SMTP server that accepts and counts messages.
+
+It speaks just enough SMTP for smtplib (EHLO/HELO, MAIL, RCPT, DATA, RSET,
+NOOP, QUIT). `connect_delay` adds a pause before the greeting to stand in for
+the TCP/TLS/AUTH setup a real relay costs, and `drop_every` closes the session
+after that many messages to exercise reconnect handling.
+"""
+import socketserver
+import threading
+import time
+
+
+class _SessionHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        sink = self.server.sink
+        if sink.connect_delay:
+            time.sleep(sink.connect_delay)
+        sink.record('connections')
+        self.reply('220 sink ESMTP ready')
+
+        in_data = False
+        in_session = 0
+        for raw in self.rfile:
+            line = raw.rstrip(b'\r\n')
+            if in_data:
+                if line == b'.':
+                    in_data = False
+                    in_session += 1
+                    sink.record('messages')
+                    self.reply('250 OK queued')
+                    if sink.drop_every and in_session >= sink.drop_every:
+                        return
+                continue
+
+            verb = line[:4].upper()
+            if verb in (b'EHLO', b'HELO'):
+                self.reply('250 sink')
+            elif verb in (b'MAIL', b'RCPT', b'RSET', b'NOOP'):
+                self.reply('250 OK')
+            elif verb == b'DATA':
+                in_data = True
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif verb == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    def __init__(self, host='127.0.0.1', port=0, connect_delay=0.0, drop_every=0):
+        self.connect_delay = connect_delay
+        self.drop_every = drop_every
+        self.connections = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _SessionHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def reset(self):
+        with self._lock:
+            self.connections = 0
+            self.messages = 0
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
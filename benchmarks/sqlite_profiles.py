@@ -0,0 +1,135 @@
+"""
+Mixed read/write benchmark for the SQLite engine profiles (SQLITE_PROFILE).
+
+For each profile a fresh database is seeded, then N worker processes (each
+with its own app, user and connection pool) run a mix of reads (lot list,
+history, active reservations, stats) and writes (reserve + release) for a
+fixed time. The response cache is disabled so every request hits SQLite.
+
+    python -m benchmarks.sqlite_profiles --workers 8 --seconds 10
+    python -m benchmarks.sqlite_profiles --profiles production --write-ratio 0.5
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+from collections import Counter
+from .common import auth_header, make_app, percentile, scratch_db_path, seed_lot, seed_users
+
+READS = ['/api/user/lots', '/api/user/reservations?limit=20', '/api/user/active-reservations', '/api/user/stats']
+
+
+def profile_app(db_path, profile, create=False):
+    # Leave engine options to the profile, and never answer from the cache
+    return make_app(db_path, create=create, SQLITE_PROFILE=profile,
+                    SQLALCHEMY_ENGINE_OPTIONS={}, CACHE_TYPE='NullCache')
+
+
+def run_worker(db_path, profile, user_id, lot_ids, seconds, write_ratio, seed, start_event, results):
+    app = profile_app(db_path, profile)
+    client = app.test_client()
+    with app.app_context():
+        headers = auth_header(user_id)
+    rng = random.Random(seed)
+    latencies = {'read': [], 'write': []}
+    errors = Counter()
+
+    def call(method, url):
+        try:
+            response = getattr(client, method)(url, headers=headers)
+        except Exception as e:
+            errors['database is locked' if 'locked' in str(e) else type(e).__name__] += 1
+            return None
+        if response.status_code >= 500:
+            errors[f'HTTP {response.status_code}'] += 1
+        return response
+
+    start_event.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if rng.random() < write_ratio:
+            response = call('post', f'/api/user/reserve/{rng.choice(lot_ids)}')
+            if response is not None and response.status_code == 200:
+                call('post', f"/api/user/release/{response.get_json()['reservation_id']}")
+            kind = 'write'
+        else:
+            call('get', rng.choice(READS))
+            kind = 'read'
+        latencies[kind].append(time.perf_counter() - started)
+    results.put((latencies, dict(errors)))
+
+
+def run_profile(profile, args):
+    db_path = scratch_db_path(f'{profile}.db')
+    app = profile_app(db_path, profile, create=True)
+    with app.app_context():
+        lot_ids = [seed_lot(args.spots, name=f'Lot {i}') for i in range(args.lots)]
+        user_ids = seed_users(args.workers)
+
+    ctx = multiprocessing.get_context('fork')
+    start_event = ctx.Event()
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=run_worker, args=(db_path, profile, user_id, lot_ids, args.seconds,
+                                             args.write_ratio, i, start_event, results))
+        for i, user_id in enumerate(user_ids)
+    ]
+    for worker in workers:
+        worker.start()
+    # Give every worker time to build its app before the clock starts
+    time.sleep(1.0)
+    start_event.set()
+
+    reads, writes, errors = [], [], Counter()
+    for _ in workers:
+        latencies, worker_errors = results.get()
+        reads += latencies['read']
+        writes += latencies['write']
+        errors.update(worker_errors)
+    for worker in workers:
+        worker.join()
+
+    reads.sort()
+    writes.sort()
+    return {
+        'profile': profile,
+        'ops_per_sec': (len(reads) + len(writes)) / args.seconds,
+        'reads_per_sec': len(reads) / args.seconds,
+        'writes_per_sec': len(writes) / args.seconds,
+        'read_p50': percentile(reads, 50) * 1000,
+        'read_p95': percentile(reads, 95) * 1000,
+        'write_p50': percentile(writes, 50) * 1000,
+        'write_p95': percentile(writes, 95) * 1000,
+        'errors': dict(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of operations that reserve + release')
+    parser.add_argument('--lots', type=int, default=4)
+    parser.add_argument('--spots', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    print(f"{args.workers} workers, {args.seconds:.0f}s per profile, {args.write_ratio:.0%} writes")
+    rows = [run_profile(profile, args) for profile in args.profiles]
+
+    print(f"{'profile':<12}{'ops/s':>9}{'reads/s':>9}{'writes/s':>9}"
+          f"{'read p50':>10}{'read p95':>10}{'write p50':>11}{'write p95':>11}  errors")
+    for row in rows:
+        print(f"{row['profile']:<12}{row['ops_per_sec']:>9.1f}{row['reads_per_sec']:>9.1f}{row['writes_per_sec']:>9.1f}"
+              f"{row['read_p50']:>8.1f}ms{row['read_p95']:>8.1f}ms{row['write_p50']:>9.1f}ms{row['write_p95']:>9.1f}ms"
+              f"  {row['errors'] or '-'}")
+    if len(rows) > 1 and rows[0]['ops_per_sec']:
+        for row in rows[1:]:
+            print(f"{row['profile']} vs {rows[0]['profile']}: {row['ops_per_sec'] / rows[0]['ops_per_sec']:.2f}x throughput")
+    return 1 if any(row['errors'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+gunicorn settings for ParkBuddy: gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker is a process with its own thread pool (gthread). Every open
+availability stream holds one of those threads for as long as the page
+stays open, so a worker serves at most AVAILABILITY_MAX_STREAMS of them (a
+quarter of GUNICORN_THREADS unless set) and refuses the rest with a 503,
+after which the pages poll instead. For more live pages run a second
+gunicorn for /api/lots/availability/stream alone, routed there by the
+proxy, with more threads per worker; sync workers would be taken over by a
+single stream.
+
+The app is built once in the master and forked into the workers
+(GUNICORN_PRELOAD), which then drop the pooled database connections they
+inherited. `kill -HUP <master>` replaces the workers gracefully: new ones
+start, old ones finish their requests within GUNICORN_GRACEFUL_TIMEOUT.
+With preloading on they fork from the app already in the master, so
+deploying new code takes `kill -USR2` (start a new master) followed by
+`kill -TERM` to the old one, or GUNICORN_PRELOAD=false.
+
+The spot allocator (backend/allocator.py) is a per-process cache of free
+spots. With several workers each copy misses the spots the others free and
+still holds the ones they took, so bookings keep hitting stale spots and
+falling back to SQL. It is therefore off by default when GUNICORN_WORKERS
+is above 1; setting SPOT_ALLOCATOR_ENABLED explicitly overrides that.
+benchmarks/serving.py measures both.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ['true', '1', 't']
+
+# Read by backend.config when the app is loaded, which happens after this file
+if workers > 1:
+    os.environ.setdefault('SPOT_ALLOCATOR_ENABLED', 'false')
+# Leaves most threads free for ordinary requests
+os.environ.setdefault('AVAILABILITY_MAX_STREAMS', str(max(1, threads // 4)))
+
+# gthread workers heartbeat from their main loop, so this doesn't cut open streams
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then; the jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # With preload_app the engines (and their pools) were created in the master
+    app = getattr(server.app, 'callable', None)
+    if app is not None:
+        from backend.app import dispose_engines
+        dispose_engines(app)
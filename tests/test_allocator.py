@@ -0,0 +1,29 @@
+"""The allocator admin endpoints leave a disabled allocator off."""
+from backend.allocator import spot_allocator
+from backend.testing import auth_header, make_app, seed_lot
+
+
+def test_rebuild_refused_when_disabled(tmp_path):
+    app = make_app(str(tmp_path / 'allocator.db'), create=True, SPOT_ALLOCATOR_ENABLED=False)
+    with app.app_context():
+        seed_lot(5)
+        admin = auth_header('admin', role='admin')
+    client = app.test_client()
+
+    assert client.post('/api/admin/allocator/rebuild', headers=admin).status_code == 409
+    assert client.get('/api/admin/allocator', headers=admin).get_json()['ready'] is False
+    with app.app_context():
+        assert not spot_allocator.ready
+
+
+def test_rebuild_when_enabled(tmp_path):
+    app = make_app(str(tmp_path / 'allocator.db'), create=True)
+    with app.app_context():
+        seed_lot(5)
+        admin = auth_header('admin', role='admin')
+    client = app.test_client()
+
+    response = client.post('/api/admin/allocator/rebuild', headers=admin)
+    assert response.status_code == 200
+    assert client.get('/api/admin/allocator', headers=admin).get_json() == {
+        'ready': True, 'stats': response.get_json()['stats'], 'mismatches': {}}
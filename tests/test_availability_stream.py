@@ -0,0 +1,35 @@
+"""Availability streams are capped per process; past the cap the route answers 503."""
+from backend.live import lot_availability
+from backend.testing import auth_header, make_app, seed_lot
+
+
+def test_streams_past_the_cap_are_refused(tmp_path):
+    app = make_app(str(tmp_path / 'streams.db'), create=True, AVAILABILITY_MAX_STREAMS=2, AVAILABILITY_RETRY_AFTER=45)
+    with app.app_context():
+        seed_lot(5)
+        token = auth_header('1')['Authorization'].split()[1]
+        broker = lot_availability.broker
+    client = app.test_client()
+    url = f'/api/lots/availability/stream?jwt={token}'
+
+    streams = [client.get(url, buffered=False) for _ in range(2)]
+    for stream in streams:
+        assert stream.status_code == 200
+        assert next(stream.response).startswith(b'retry: 3000\nevent: snapshot\n')
+    assert broker.subscribers == 2
+
+    refused = client.get(url)
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '45'
+    assert refused.get_json()['retry_after'] == 45
+    assert broker.stats['rejected'] == 1
+    assert broker.subscribers == 2
+
+    # A closed stream frees its slot
+    streams[0].close()
+    assert broker.subscribers == 1
+    reopened = client.get(url, buffered=False)
+    assert reopened.status_code == 200
+    reopened.close()
+    streams[1].close()
+    assert broker.subscribers == 0
@@ -0,0 +1,41 @@
+"""The CSV export task ends in FAILURE when the export or its email fails."""
+import pytest
+from backend import tasks
+from backend.mailer import DeliveryReport
+from backend.testing import make_app, seed_users
+
+
+@pytest.fixture
+def user_id(tmp_path):
+    app = make_app(str(tmp_path / 'exports.db'), create=True, EXPORT_DIR=str(tmp_path / 'exports'))
+    with app.app_context():
+        return seed_users(1)[0]
+
+
+def mail_report(monkeypatch, sent=0, failed=0):
+    report = DeliveryReport()
+    report.sent, report.failed = sent, failed
+    monkeypatch.setattr(tasks, 'send_messages', lambda messages: list(messages) and report)
+
+
+def test_export_succeeds_when_mailed(user_id, monkeypatch):
+    mail_report(monkeypatch, sent=1)
+    result = tasks.export_user_csv.apply(args=[user_id])
+    assert result.state == 'SUCCESS'
+    assert result.result == 'CSV exported for user bench0@example.com'
+
+
+def test_undelivered_mail_fails_the_task(user_id, monkeypatch):
+    mail_report(monkeypatch, failed=1)
+    result = tasks.export_user_csv.apply(args=[user_id])
+    assert result.state == 'FAILURE'
+    assert 'not delivered' in str(result.result)
+
+
+def test_export_error_fails_the_task(user_id, monkeypatch):
+    def broken(user_id):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(tasks, 'write_user_export', broken)
+    result = tasks.export_user_csv.apply(args=[user_id])
+    assert result.state == 'FAILURE'
+    assert isinstance(result.result, OSError)
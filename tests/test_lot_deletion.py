@@ -0,0 +1,66 @@
+"""Background lot deletion: a run that fails partway can be queued again with a second DELETE."""
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.exc import OperationalError
+from backend import tasks
+from backend.extensions import db
+from backend.models import ParkingLot, ParkingSpot, Reservation
+from backend.testing import auth_header, make_app, seed_lot, seed_users
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    app = make_app(str(tmp_path / 'deletion.db'), create=True, CACHE_TYPE='NullCache', LOT_DELETE_CHUNK_SIZE=10)
+    with app.app_context():
+        lot = seed_lot(50)
+        user = auth_header(seed_users(1)[0])
+        admin = auth_header('admin', role='admin')
+    client = app.test_client()
+    # Some history, all of it completed
+    for _ in range(5):
+        res_id = client.post(f'/api/user/reserve/{lot}', headers=user).get_json()['reservation_id']
+        client.post(f'/api/user/release/{res_id}', headers=user)
+    queued = []
+    monkeypatch.setattr(tasks.delete_lot, 'delay',
+                        lambda lot_id: queued.append(lot_id) or SimpleNamespace(id=f'task-{len(queued)}'))
+    return app, client, admin, lot, queued
+
+
+def test_failed_deletion_is_queued_again(site, monkeypatch):
+    app, client, admin, lot, queued = site
+    assert client.delete(f'/api/lots/{lot}', headers=admin).status_code == 202
+
+    # The first run loses the database after a few spot chunks
+    chunks = []
+    real_chunk = tasks.delete_spot_chunk
+
+    def flaky_chunk(lot_id, chunk_size):
+        chunks.append(lot_id)
+        if len(chunks) == 3:
+            raise OperationalError('DELETE FROM parking_spots', {}, Exception('database is locked'))
+        return real_chunk(lot_id, chunk_size)
+
+    monkeypatch.setattr(tasks, 'delete_spot_chunk', flaky_chunk)
+    with app.app_context():
+        with pytest.raises(OperationalError):
+            tasks.delete_lot.run(lot)
+        lot_row = db.session.get(ParkingLot, lot)
+        assert lot_row is not None and not lot_row.is_active
+        assert 0 < ParkingSpot.query.filter_by(lot_id=lot).count() < 50
+
+    # Still hidden from the lot lists, but a second DELETE queues it again
+    response = client.delete(f'/api/lots/{lot}', headers=admin)
+    assert response.status_code == 202
+    assert queued == [lot, lot]
+
+    with app.app_context():
+        tasks.delete_lot.run(lot)
+        assert db.session.get(ParkingLot, lot) is None
+        assert ParkingSpot.query.filter_by(lot_id=lot).count() == 0
+        assert Reservation.query.count() == 0
+    assert client.delete(f'/api/lots/{lot}', headers=admin).status_code == 404
+
+
+def test_deletion_retries_on_operational_errors():
+    assert OperationalError in tasks.delete_lot.autoretry_for
+    assert tasks.delete_lot.acks_late
@@ -0,0 +1,99 @@
+"""Batched delivery in backend/mailer.py against a fake SMTP connection."""
+import smtplib
+import pytest
+from flask import Flask
+from flask_mail import Message
+from backend import mailer
+
+
+class FakeConnection:
+    """Stands in for flask_mail's Connection; `failures` maps a recipient to the errors its sends raise, in turn."""
+
+    def __init__(self, server):
+        self.server = server
+        self.host = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.server.closes += 1
+
+    def send(self, msg):
+        self.server.sends += 1
+        errors = self.server.failures.get(msg.recipients[0])
+        if errors:
+            raise errors.pop(0)
+        self.server.delivered.append(msg.recipients[0])
+
+
+class FakeServer:
+    def __init__(self, **failures):
+        self.failures = {recipient: list(errors) for recipient, errors in failures.items()}
+        self.connects = self.sends = self.closes = 0
+        self.delivered = []
+
+    def connect(self):
+        self.connects += 1
+        return FakeConnection(self)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    with app.app_context():
+        yield app
+
+
+def messages(*recipients):
+    return [Message('Hi', sender='parkbuddy@example.com', recipients=[r], body='-') for r in recipients]
+
+
+def deliver(monkeypatch, server, recipients, batch_size=10):
+    monkeypatch.setattr(mailer, '_connect', server.connect)
+    return mailer.send_messages(messages(*recipients), batch_size=batch_size)
+
+
+def test_refused_recipient_is_not_retried(app, monkeypatch):
+    server = FakeServer(**{'bad@example.com': [
+        smtplib.SMTPRecipientsRefused({'bad@example.com': (550, b'No such user')})]})
+    report = deliver(monkeypatch, server, ['a@example.com', 'bad@example.com', 'b@example.com'])
+
+    assert (report.sent, report.failed, report.reconnects) == (2, 1, 0)
+    assert server.connects == 1
+    assert server.sends == 3
+    assert server.delivered == ['a@example.com', 'b@example.com']
+
+
+@pytest.mark.parametrize('error', [
+    smtplib.SMTPSenderRefused(553, b'Sender rejected', 'parkbuddy@example.com'),
+    smtplib.SMTPDataError(554, b'Message rejected'),
+])
+def test_rejected_message_keeps_the_session(app, monkeypatch, error):
+    server = FakeServer(**{'bad@example.com': [error]})
+    report = deliver(monkeypatch, server, ['bad@example.com', 'a@example.com'])
+
+    assert (report.sent, report.failed, report.reconnects) == (1, 1, 0)
+    assert server.connects == 1
+
+
+@pytest.mark.parametrize('error', [
+    smtplib.SMTPServerDisconnected('Connection unexpectedly closed'),
+    ConnectionResetError(104, 'Connection reset by peer'),
+])
+def test_lost_session_is_reopened_and_the_message_retried(app, monkeypatch, error):
+    server = FakeServer(**{'a@example.com': [error]})
+    report = deliver(monkeypatch, server, ['a@example.com', 'b@example.com'])
+
+    assert (report.sent, report.failed, report.reconnects) == (2, 0, 1)
+    assert server.connects == 2
+    assert server.delivered == ['a@example.com', 'b@example.com']
+
+
+def test_message_fails_after_one_reconnect(app, monkeypatch):
+    dropped = smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+    server = FakeServer(**{'a@example.com': [dropped, dropped]})
+    report = deliver(monkeypatch, server, ['a@example.com', 'b@example.com'])
+
+    assert (report.sent, report.failed, report.reconnects) == (1, 1, 2)
+    assert server.delivered == ['b@example.com']
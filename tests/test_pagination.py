@@ -0,0 +1,45 @@
+"""Malformed page arguments are answered with 400 and a fixed message, not a parser's error text."""
+import pytest
+from backend.pagination import encode_cursor
+from backend.testing import auth_header, make_app, seed_users
+
+BAD_CURSORS = {
+    'not-base64': '%%%',
+    'not-json': 'bm90IGpzb24',  # not json
+    'wrong-shape': encode_cursor(1, 2, 3),
+    'not-a-list': 'MTI',  # 12
+    'bad-value': encode_cursor('yesterday', 5),
+    'timestamp-not-a-string': encode_cursor(12, 5),
+}
+
+
+@pytest.fixture(scope='module')
+def site(tmp_path_factory):
+    app = make_app(str(tmp_path_factory.mktemp('pagination') / 'pages.db'), create=True, CACHE_TYPE='NullCache')
+    with app.app_context():
+        user = auth_header(seed_users(1)[0])
+        admin = auth_header('admin', role='admin')
+    return app.test_client(), user, admin
+
+
+@pytest.mark.parametrize('cursor', list(BAD_CURSORS.values()), ids=list(BAD_CURSORS))
+def test_history_rejects_bad_cursor(site, cursor):
+    client, user, admin = site
+    response = client.get(f'/api/user/reservations?cursor={cursor}', headers=user)
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': "Invalid cursor"}
+
+
+@pytest.mark.parametrize('cursor', list(BAD_CURSORS.values()), ids=list(BAD_CURSORS))
+def test_user_list_rejects_bad_cursor(site, cursor):
+    client, user, admin = site
+    response = client.get(f'/api/admin/users?cursor={cursor}', headers=admin)
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': "Invalid cursor"}
+
+
+def test_bad_limit_keeps_its_message(site):
+    client, user, admin = site
+    response = client.get('/api/user/reservations?limit=0', headers=user)
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': "limit must be between 1 and 200"}
@@ -0,0 +1,187 @@
+"""
+Query plan regression check. Runs every endpoint (and the background tasks)
+against a seeded scratch database, captures the SQL each one issues and
+runs EXPLAIN QUERY PLAN on every statement. A scenario fails if one of its
+statements scans a table it isn't allowed to below.
+
+    python -m pytest tests/test_query_plans.py
+    python -m pytest tests/test_query_plans.py -k dashboard -rA    # plans of one scenario
+"""
+from contextlib import contextmanager
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import event
+from backend import tasks
+from backend.exports import iter_export_rows
+from backend.extensions import db
+from backend.routing import read_routing
+from backend.testing import auth_header, make_app, seed_lot, seed_users
+
+# Full scans that are intended, keyed by scenario and either the table or
+# the whole scan detail (such as 'reservations USING INDEX ix_name').
+ALLOWED_SCANS = {
+    ('user_lots', 'parking_lots'): "the lot list returns every lot",
+    ('admin_lots', 'parking_lots'): "the lot list returns every lot",
+    ('dashboard', 'parking_lots'): "the dashboard summarises every lot",
+    ('lot_activity', 'parking_lots'): "one activity row per lot",
+    ('daily_reminders', 'parking_lots'): "users without a reservation get the lot with most free spots",
+    ('monthly_reports', 'parking_lots'): "the report covers every lot",
+    ('create_lot', 'seq'): "recursive counter CTE used to insert spots",
+    ('grow_lot', 'seq'): "recursive counter CTE used to insert spots",
+    ('allocator_status', 'parking_spots'): "compares every free spot with the allocator",
+    ('allocator_rebuild', 'parking_spots'): "reloads every free spot",
+    ('admin_users_blocked', 'users'): "keyset pages walk the users table by primary key",
+    ('daily_reminders', 'users'): "every active user gets a reminder",
+    ('monthly_reports', 'admins'): "every admin gets the report",
+    ('dashboard', 'reservations USING INDEX ix_reservations_parking_timestamp'):
+        "walks the index newest first and stops at LIMIT 5",
+    ('daily_reminders', 'reservations USING INDEX ix_reservations_open'):
+        "the partial index holds only open reservations",
+}
+
+
+def _reserve_and_release(site):
+    res_id = site.client.post(f'/api/user/reserve/{site.lot}', headers=site.user).get_json()['reservation_id']
+    site.client.post(f'/api/user/release/{res_id}', headers=site.user)
+
+
+def _delete_lot(site):
+    site.client.delete(f'/api/lots/{site.spare_lot}', headers=site.admin)
+    tasks.delete_lot.run(site.spare_lot)
+
+
+# Run in this order: later scenarios see the bookings and edits of earlier ones
+SCENARIOS = {
+    'user_lots': lambda site: site.client.get('/api/user/lots', headers=site.user),
+    'reserve': lambda site: site.client.post(f'/api/user/reserve/{site.lot}', headers=site.other),
+    'reserve_and_release': _reserve_and_release,
+    'history': lambda site: site.client.get('/api/user/reservations?limit=5', headers=site.user),
+    'history_next_page': lambda site: site.client.get(
+        f'/api/user/reservations?limit=2&cursor={site.history_cursor}', headers=site.user),
+    'history_filtered': lambda site: site.client.get(
+        f'/api/user/reservations?status=completed&lot_id={site.lot}&from=2000-01-01', headers=site.user),
+    'active_reservations': lambda site: site.client.get('/api/user/active-reservations', headers=site.user),
+    'user_stats': lambda site: site.client.get('/api/user/stats', headers=site.user),
+    'admin_lots': lambda site: site.client.get('/api/lots', headers=site.admin),
+    'admin_lot': lambda site: site.client.get(f'/api/lots/{site.lot}', headers=site.admin),
+    'dashboard': lambda site: site.client.get('/api/admin/dashboard-stats', headers=site.admin),
+    'lot_details': lambda site: site.client.get(f'/api/admin/lot-details/{site.lot}?per_page=50',
+                                                headers=site.admin),
+    'lot_details_occupied': lambda site: site.client.get(f'/api/admin/lot-details/{site.lot}?status=O',
+                                                         headers=site.admin),
+    'lot_activity': lambda site: site.client.get('/api/admin/lot-activity', headers=site.admin),
+    'admin_users': lambda site: site.client.get(f'/api/admin/users?limit=5&cursor={site.users_cursor}',
+                                                headers=site.admin),
+    'admin_users_blocked': lambda site: site.client.get('/api/admin/users?status=blocked', headers=site.admin),
+    'user_details': lambda site: site.client.get(f'/api/admin/user-details/{site.users[0]}', headers=site.admin),
+    'block_user': lambda site: site.client.post(f'/api/admin/block-user/{site.users[-1]}', headers=site.admin),
+    'create_lot': lambda site: site.client.post('/api/lots', headers=site.admin, json={
+        'name': 'New', 'price': 5, 'address': '-', 'pincode': '0', 'spots': 50}),
+    'grow_lot': lambda site: site.client.put(f'/api/admin/edit-lot/{site.lot}', json={'spots': 260},
+                                             headers=site.admin),
+    'shrink_lot': lambda site: site.client.put(f'/api/admin/edit-lot/{site.lot}', json={'spots': 220},
+                                               headers=site.admin),
+    'allocator_status': lambda site: site.client.get('/api/admin/allocator', headers=site.admin),
+    'allocator_rebuild': lambda site: site.client.post('/api/admin/allocator/rebuild', headers=site.admin),
+    'export_rows': lambda site: list(iter_export_rows(site.users[0], 100)),
+    'daily_reminders': lambda site: tasks.send_daily_reminders.run(),
+    'monthly_reports': lambda site: tasks.send_monthly_reports.run(),
+    'delete_lot': _delete_lot,
+}
+
+
+class StatementLog:
+    def __init__(self, *engines):
+        self.statements = []
+        self.recording = False
+        for engine in engines:
+            if engine is not None:
+                event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.recording and not executemany:
+            self.statements.append((statement, parameters))
+
+    @contextmanager
+    def capture(self):
+        self.statements = []
+        self.recording = True
+        try:
+            yield self
+        finally:
+            self.recording = False
+
+
+def plan_of(statement, parameters):
+    conn = db.engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ())
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def full_scans(plan):
+    """The 'SCAN ...' details of a plan (table scans and whole-index walks), without the prefix."""
+    return [detail[len('SCAN '):] for detail in plan
+            if detail.startswith('SCAN ') and not detail.startswith('SCAN CONSTANT ROW')]
+
+
+def allowed(label, scan):
+    return (label, scan.split()[0]) in ALLOWED_SCANS or (label, scan) in ALLOWED_SCANS
+
+
+@pytest.fixture(scope='module')
+def site(tmp_path_factory):
+    # No response cache, so every request reaches the database
+    app = make_app(str(tmp_path_factory.mktemp('query-plans') / 'plans.db'), create=True, CACHE_TYPE='NullCache')
+    client = app.test_client()
+    with app.app_context():
+        lots = [seed_lot(200, name=f'Lot {i}') for i in range(3)]
+        users = seed_users(40)
+        admin = auth_header('bench-admin', role='admin')
+        user_headers = [auth_header(user_id) for user_id in users]
+
+    # History: every user parks and leaves a few times, half keep a spot
+    for i, headers in enumerate(user_headers):
+        for _ in range(3):
+            res_id = client.post(f'/api/user/reserve/{lots[i % 2]}', headers=headers).get_json()['reservation_id']
+            client.post(f'/api/user/release/{res_id}', headers=headers)
+        if i % 2:
+            client.post(f'/api/user/reserve/{lots[i % 2]}', headers=headers)
+
+    with pytest.MonkeyPatch.context() as patch, app.app_context():
+        # Nothing is sent: delivery and the Celery queue are stubbed out
+        patch.setattr(tasks, 'send_messages', lambda messages: list(messages))
+        patch.setattr(tasks.delete_lot, 'delay', lambda lot_id: SimpleNamespace(id='plan-check'))
+        yield SimpleNamespace(
+            client=client, lot=lots[0], spare_lot=lots[2], users=users,
+            admin=admin, user=user_headers[0], other=user_headers[2],
+            history_cursor=client.get('/api/user/reservations?limit=2',
+                                      headers=user_headers[0]).get_json()['next_cursor'],
+            users_cursor=client.get('/api/admin/users?limit=5', headers=admin).get_json()['next_cursor'],
+            # @read_only views and tasks run on the read engine
+            log=StatementLog(db.engine, read_routing.engine),
+        )
+
+
+@pytest.mark.parametrize('label', list(SCENARIOS))
+def test_no_unexpected_scans(site, label):
+    with site.log.capture():
+        SCENARIOS[label](site)
+
+    seen, report, unexpected = set(), [], set()
+    for statement, parameters in site.log.statements:
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb not in ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH') or statement in seen:
+            continue
+        seen.add(statement)
+        plan = plan_of(statement, parameters)
+        report.append(' '.join(statement.split())[:160])
+        report.extend(f'    {detail}' for detail in plan)
+        unexpected.update(scan for scan in full_scans(plan) if not allowed(label, scan))
+
+    print('\n'.join(report))
+    assert seen, f"{label} issued no SQL"
+    assert not unexpected, f"unexpected SCAN {', '.join(sorted(unexpected))}:\n" + '\n'.join(report)
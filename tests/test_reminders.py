@@ -0,0 +1,52 @@
+"""The daily reminder task against a scratch database in SQLite's default (rollback journal) mode."""
+import sqlite3
+import pytest
+from backend import tasks
+from backend.testing import auth_header, make_app, seed_lot, seed_users
+
+USERS = 2500    # more than one REMINDER_BATCH_SIZE of recipients
+
+
+@pytest.fixture
+def site(tmp_path):
+    db_path = str(tmp_path / 'reminders.db')
+    app = make_app(db_path, create=True, SQLITE_PROFILE='default', CACHE_TYPE='NullCache')
+    with app.app_context():
+        lot = seed_lot(20)
+        users = seed_users(USERS)
+        headers = [auth_header(user_id) for user_id in users[:12]]
+    client = app.test_client()
+    # A few users keep a spot, some of them two
+    for i, user in enumerate(headers):
+        for _ in range(2 if i % 4 == 0 else 1 if i % 2 == 0 else 0):
+            client.post(f'/api/user/reserve/{lot}', headers=user)
+    return app, db_path, users
+
+
+def test_reminders_leave_the_database_writable_while_mail_goes_out(site, monkeypatch):
+    app, db_path, users = site
+    sent, write_errors = [], []
+
+    def send_messages(messages):
+        # Stands in for the SMTP run: another connection writes every 100 messages
+        for msg in messages:
+            sent.append(msg.recipients[0])
+            if len(sent) % 100:
+                continue
+            writer = sqlite3.connect(db_path, timeout=0)
+            try:
+                writer.execute("UPDATE users SET full_name = full_name WHERE id = ?", (users[0],))
+                writer.commit()
+            except sqlite3.OperationalError as e:
+                write_errors.append(str(e))
+            finally:
+                writer.close()
+        return 'sent'
+
+    monkeypatch.setattr(tasks, 'send_messages', send_messages)
+    with app.app_context():
+        result = tasks.send_daily_reminders.run()
+
+    assert write_errors == []
+    assert sorted(sent) == sorted(f'bench{i}@example.com' for i in range(USERS))
+    assert f'(6 reservation reminders, {USERS - 6} lot suggestions)' in result
@@ -0,0 +1,94 @@
+"""Blocking a user when the shared revocation set can't be written."""
+import pytest
+from backend.extensions import db
+from backend.models import User
+from backend.revocation import REVOKED_KEY, VERSION_KEY
+from backend.testing import auth_header, make_app, seed_users
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        if self.redis.down:
+            raise ConnectionError('Redis is unreachable')
+        return [getattr(self.redis, name)(*args) for name, args in self.calls]
+
+
+class FakeRedis:
+    """Enough of redis.Redis for RevocationSet; every command fails while `down` is set."""
+
+    def __init__(self):
+        self.members, self.version, self.down = set(), 0, False
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def get(self, key):
+        if self.down:
+            raise ConnectionError('Redis is unreachable')
+        return str(self.version).encode() if key == VERSION_KEY else None
+
+    def sadd(self, key, *members):
+        self.members.update(members)
+
+    def srem(self, key, *members):
+        self.members.difference_update(members)
+
+    def smembers(self, key):
+        return {m.encode() for m in self.members} if key == REVOKED_KEY else set()
+
+    def delete(self, key):
+        self.members.clear()
+
+    def incr(self, key):
+        self.version += 1
+        return self.version
+
+
+@pytest.fixture
+def site(tmp_path):
+    app = make_app(str(tmp_path / 'revocation.db'), create=True, CACHE_TYPE='NullCache')
+    redis = FakeRedis()
+    app.extensions['revocation'].redis = redis
+    with app.app_context():
+        user_id = seed_users(1)[0]
+        user, admin = auth_header(user_id), auth_header('admin', role='admin')
+    return app, app.test_client(), redis, user_id, user, admin
+
+
+def is_active(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).is_active
+
+
+def test_block_fails_when_the_set_cant_be_written(site):
+    app, client, redis, user_id, user, admin = site
+    redis.down = True
+
+    response = client.post(f'/api/admin/block-user/{user_id}', headers=admin)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert is_active(app, user_id)
+
+    redis.down = False
+    assert client.get('/api/user/lots', headers=user).status_code == 200
+    assert client.post(f'/api/admin/block-user/{user_id}', headers=admin).status_code == 200
+    assert not is_active(app, user_id)
+    assert redis.members == {f'user:{user_id}'}
+    assert client.get('/api/user/lots', headers=user).status_code == 401
+
+
+def test_unblock_fails_when_the_set_cant_be_written(site):
+    app, client, redis, user_id, user, admin = site
+    assert client.post(f'/api/admin/block-user/{user_id}', headers=admin).status_code == 200
+    redis.down = True
+
+    assert client.post(f'/api/admin/block-user/{user_id}', headers=admin).status_code == 503
+    assert not is_active(app, user_id)
+    assert redis.members == {f'user:{user_id}'}
@@ -0,0 +1,10 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+
+# Production SQLite settings (WAL and tuned pragmas) unless the environment
+# picks a profile; read by backend.config on import, so set it first
+os.environ.setdefault('SQLITE_PROFILE', 'production')
+
+from backend.app import create_app
+
+app = create_app()